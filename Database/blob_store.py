@@ -0,0 +1,188 @@
+import gzip
+import os
+import threading
+import sys
+from abc import ABC, abstractmethod
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from resources.db_config import PDF_BLOB_STORE, PDF_BLOB_ROOT, AZURE_STORAGE_CONNECTION_STRING, PDF_BLOB_CONTAINER
+from Utils.logger_config import logger
+
+_pdf_blob_store = None
+_pdf_blob_store_lock = threading.Lock()
+
+
+class BlobStore(ABC):
+    """
+    Stores binary objects under string keys, keeping large payloads out of Cosmos DB documents.
+    """
+
+    name = None
+
+    @abstractmethod
+    def put(self, key, data):
+        """
+        Stores an object, replacing any existing object with the same key.
+
+        :param key: Object key, e.g. "1159010/confirmation_42.pdf".
+        :param data: The object content.
+        """
+
+    @abstractmethod
+    def get(self, key):
+        """
+        Reads an object.
+
+        :param key: Object key.
+        :return: The object content, or None if it does not exist.
+        """
+
+    @abstractmethod
+    def delete(self, key):
+        """
+        Deletes an object if it exists.
+
+        :param key: Object key.
+        """
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Blob store backed by a local directory, for development and testing.
+    """
+
+    name = "local"
+
+    def __init__(self, root=PDF_BLOB_ROOT):
+        """
+        Initializes the store.
+
+        :param root: Directory holding the objects.
+        """
+        self.root = os.path.abspath(root)
+
+    def _path(self, key):
+        """
+        Maps a key to a file path inside the root directory.
+
+        :param key: Object key.
+        :return: Absolute file path.
+        :raises ValueError: If the key would escape the root directory.
+        """
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f"Invalid blob key {key!r}")
+        return path
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as blob_file:
+            blob_file.write(data)
+        os.replace(temp_path, path)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as blob_file:
+                return blob_file.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class AzureBlobStore(BlobStore):
+    """
+    Blob store backed by an Azure Blob Storage container.
+
+    Requires the azure-storage-blob package, which is only imported when this store is used.
+    """
+
+    name = "azure"
+
+    def __init__(self, connection_string=AZURE_STORAGE_CONNECTION_STRING, container_name=PDF_BLOB_CONTAINER):
+        """
+        Connects to the container, creating it if it does not exist.
+
+        :param connection_string: Azure Storage account connection string.
+        :param container_name: Name of the blob container.
+        """
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import BlobServiceClient
+
+        service = BlobServiceClient.from_connection_string(connection_string)
+        self.container = service.get_container_client(container_name)
+        try:
+            self.container.create_container()
+        except ResourceExistsError:
+            pass
+
+    def put(self, key, data):
+        self.container.upload_blob(key, data, overwrite=True)
+
+    def get(self, key):
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            return self.container.download_blob(key).readall()
+        except ResourceNotFoundError:
+            return None
+
+    def delete(self, key):
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            self.container.delete_blob(key)
+        except ResourceNotFoundError:
+            pass
+
+
+def compress_blob(data, compression):
+    """
+    Compresses an object before it is stored.
+
+    :param data: The object content.
+    :param compression: "gzip" or None.
+    :return: The stored bytes.
+    """
+    if compression is None:
+        return bytes(data)
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)  # Fixed mtime keeps identical PDFs byte-identical
+    raise ValueError(f"Unsupported compression {compression!r}")
+
+
+def decompress_blob(data, compression):
+    """
+    Reverses compress_blob.
+
+    :param data: The stored bytes.
+    :param compression: The compression recorded when the object was stored.
+    :return: The original object content.
+    """
+    if compression is None:
+        return data
+    if compression == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"Unsupported compression {compression!r}")
+
+
+def get_pdf_blob_store():
+    """
+    Returns the process-wide blob store for PDFs, configured by PDF_BLOB_STORE in db_config.
+
+    :return: BlobStore object.
+    """
+    global _pdf_blob_store
+    with _pdf_blob_store_lock:
+        if _pdf_blob_store is None:
+            if PDF_BLOB_STORE == "azure":
+                _pdf_blob_store = AzureBlobStore()
+            elif PDF_BLOB_STORE == "local":
+                _pdf_blob_store = LocalBlobStore()
+            else:
+                raise ValueError(f"Unknown PDF blob store {PDF_BLOB_STORE!r}")
+            logger.info(f"Using the {_pdf_blob_store.name} blob store for PDFs.")
+        return _pdf_blob_store
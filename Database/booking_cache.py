@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from resources.db_config import BOOKING_CACHE_SIZE, BOOKING_CACHE_TTL
+from Utils.logger_config import logger
+
+_booking_cache = None
+_booking_cache_lock = threading.Lock()
+
+
+class BookingCache:
+    """
+    Bounded in-memory cache of booking documents with least-recently-used eviction and a time to live.
+
+    Lookups read through the cache: a miss loads the document from Cosmos DB
+    and keeps it for ttl seconds. Writes made through this process invalidate
+    the entry straight away; the TTL bounds how long a change made by another
+    process can go unseen.
+    """
+
+    def __init__(self, max_size=BOOKING_CACHE_SIZE, ttl=BOOKING_CACHE_TTL, clock=time.monotonic):
+        """
+        Initializes an empty cache.
+
+        :param max_size: Maximum number of bookings kept (0 disables caching).
+        :param ttl: Seconds a cached booking stays valid.
+        :param clock: Function returning the current time in seconds.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # Key -> (expiry time, document), least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """
+        Returns a cached document.
+
+        :param key: Cache key, e.g. (campground_id, booking_id).
+        :return: The document, or None if it is not cached or has expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, document = entry
+            if expires <= self.clock():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return document
+
+    def put(self, key, document):
+        """
+        Caches a document, evicting the least recently used ones beyond max_size.
+
+        :param key: Cache key.
+        :param document: The document to cache.
+        """
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (self.clock() + self.ttl, document)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, load):
+        """
+        Returns a cached document, loading and caching it on a miss.
+
+        :param key: Cache key.
+        :param load: Function returning the document, or None if it does not exist (not cached).
+        :return: The document, or None.
+        """
+        document = self.get(key)
+        if document is None:
+            document = load()
+            if document is not None:
+                self.put(key, document)
+        return document
+
+    def invalidate(self, key):
+        """
+        Drops a document from the cache, e.g. after it was updated or deleted.
+
+        :param key: Cache key.
+        """
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """
+        Drops every cached document.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """
+        Returns the cache metrics.
+
+        :return: Dictionary with the size, capacity, hit/miss counts, hit rate, expirations, evictions and invalidations.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+def get_booking_cache():
+    """
+    Returns the process-wide booking cache, sized by BOOKING_CACHE_SIZE and BOOKING_CACHE_TTL in db_config.
+
+    :return: BookingCache object.
+    """
+    global _booking_cache
+    with _booking_cache_lock:
+        if _booking_cache is None:
+            _booking_cache = BookingCache()
+            logger.info(f"Caching up to {_booking_cache.max_size} bookings for {_booking_cache.ttl}s.")
+        return _booking_cache
@@ -1,12 +1,17 @@
-import uuid
 import sys
 import os
 import base64
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from azure.cosmos import exceptions
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from resources.db_config import get_cosmos_client  # Use Cosmos DB connection from db_config.py
-from Utils.logger_config import logger
+from resources.db_config import get_cosmos_container, PDF_BLOB_COMPRESSION, CAMPGROUND_ID  # Use the shared Cosmos DB client from db_config.py
+from Database.blob_store import get_pdf_blob_store, compress_blob, decompress_blob
+from Database.name_index import get_booking_name_index
+from Database.booking_cache import get_booking_cache
+from Utils.logger_config import logger, booking_logger
 from models.booking import Booking
 from tenacity import retry, wait_fixed, stop_after_attempt
 # Function to connect to Cosmos DB (now using db_config.py)
@@ -22,14 +27,16 @@ def connect_to_cosmos(container_name):
     :return: The function `connect_to_cosmos` is returning the container client for the specified
     container name in the Cosmos DB.
     """
-    client = get_cosmos_client()  # Get the client first
-    database = client.get_database_client('CampsiteBookingsDB' )  # Then get the database
-    container = database.get_container_client(container_name)  # Finally, get the container
+    container = get_cosmos_container(container_name)  # Cached container from the shared client
     logger.info(f"Connected to Cosmos DB container '{container_name}' successfully.")
     return container
 
 
-@retry(wait=wait_fixed(2), stop=stop_after_attempt(3))
+# Request timeout, throttling and service unavailable: worth retrying the same request
+TRANSIENT_STATUS_CODES = (408, 429, 503)
+
+
+@retry(wait=wait_fixed(2), stop=stop_after_attempt(3), reraise=True)
 # Function to insert booking into Cosmos DB
 def insert_booking_to_cosmos(container, booking_data):
     booking_id = booking_data.get('booking_id')
@@ -37,34 +44,191 @@ def insert_booking_to_cosmos(container, booking_data):
         logger.error("Booking data is missing the 'booking_id'. Skipping insertion.")
         return False  # Indicate failure
 
+    # The id is derived from booking_id, so an existing booking comes back as a conflict instead of needing a query.
+    # The document is a copy, so the caller's booking_data is left as it was.
+    document = {**booking_data, **booking_document_keys(booking_id, booking_data.get('campground_id'))}
     try:
-        query = "SELECT * FROM c WHERE c.booking_id = @booking_id"
-        parameters = [{"name": "@booking_id", "value": booking_id}]
-        existing_booking = list(container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
-
-        if existing_booking:
-            logger.info(f"Booking with ID {booking_id} already exists in Cosmos DB. Skipping insertion.")
-            return False  # Indicate that the booking was skipped
-        else:
-            booking_data['id'] = str(uuid.uuid4())  # Generate unique item ID
-            container.create_item(booking_data)  # Insert new booking
-            logger.info(f"Booking {booking_id} inserted into Cosmos DB successfully.")
-            return True  # Indicate success
+        container.create_item(document)  # Insert new booking
+        booking_logger.info("Booking %s inserted into Cosmos DB successfully.", booking_id)
+        index_booking_names([document])
+        return True  # Indicate success
+    except exceptions.CosmosResourceExistsError:
+        booking_logger.info("Booking with ID %s already exists in Cosmos DB. Skipping insertion.", booking_id)
+        index_booking_names([document])  # Already stored, make sure it is searchable
+        return True  # Already stored, e.g. when a run is retried
     except exceptions.CosmosHttpResponseError as e:
         logger.error(f"HTTP error while inserting booking {booking_id}: {e.status_code} {e.message}")
+        if e.status_code in TRANSIENT_STATUS_CODES:
+            raise  # Let @retry try again; the error reaches the caller once the attempts run out
         return False  # Indicate failure
     except Exception as e:
         logger.error(f"Error inserting booking {booking_id}: {e}")
         return False  # Indicate failure
 
+def index_booking_names(documents):
+    """
+    Adds stored booking documents to the local customer name index.
+
+    A failure is logged and never fails the Cosmos DB write; rebuild the index to recover.
+
+    :param documents: Booking documents with booking_id, customer_name and campground_id.
+    :return: Number of bookings indexed.
+    """
+    try:
+        return get_booking_name_index().add_many(
+            (document.get('booking_id'), document.get('customer_name'), document.get('campground_id'))
+            for document in documents)
+    except Exception as e:
+        logger.warning(f"Could not update the booking name index: {e}")
+        return 0
+
+
+def booking_document_id(booking_id):
+    """
+    Returns the deterministic Cosmos DB item id for a booking.
+
+    :param booking_id: The ID of the booking.
+    :return: The item id as a string.
+    """
+    return str(booking_id)
+
+
+def booking_partition_key(campground_id=None):
+    """
+    Returns the partition key value for a booking or PDF document.
+
+    :param campground_id: The campground ID (defaults to CAMPGROUND_ID).
+    :return: The partition key value.
+    """
+    return campground_id if campground_id is not None else CAMPGROUND_ID
+
+
+def booking_document_keys(booking_id, campground_id=None):
+    """
+    Returns the id and partition key fields every booking document carries.
+
+    :param booking_id: The ID of the booking.
+    :param campground_id: The campground ID (defaults to CAMPGROUND_ID).
+    :return: Dictionary with 'id' and 'campground_id'.
+    """
+    return {'id': booking_document_id(booking_id), 'campground_id': booking_partition_key(campground_id)}
+
+
+def booking_cache_key(booking_id, campground_id=None):
+    """
+    Returns the booking cache key of a booking.
+
+    :param booking_id: The ID of the booking.
+    :param campground_id: The campground ID (defaults to CAMPGROUND_ID).
+    :return: Tuple of (partition key, item id).
+    """
+    return booking_partition_key(campground_id), booking_document_id(booking_id)
+
+
+def read_booking_document(container, booking_id, campground_id=None):
+    """
+    Reads a booking document with a point read (id plus partition key) instead of a query.
+
+    :param container: The Cosmos DB container.
+    :param booking_id: The ID of the booking.
+    :param campground_id: The campground ID (defaults to CAMPGROUND_ID).
+    :return: The booking document, or None if it does not exist.
+    :raises CosmosHttpResponseError: For errors other than the booking not existing.
+    """
+    try:
+        return container.read_item(item=booking_document_id(booking_id), partition_key=booking_partition_key(campground_id))
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+
+
+def _create_booking_document(container, booking_data):
+    """
+    Creates a single booking document, treating an id conflict as an already-stored booking.
+
+    :param container: The Cosmos DB container.
+    :param booking_data: Booking data with a deterministic 'id'.
+    :return: Tuple of (status, request charge) where status is 'inserted', 'skipped' or 'failed'.
+    """
+    charges = []
+
+    def record_charge(headers, _result):
+        charges.append(float(headers.get('x-ms-request-charge', 0)))
+
+    booking_id = booking_data.get('booking_id')
+    try:
+        container.create_item(booking_data, response_hook=record_charge)
+        return 'inserted', sum(charges)
+    except exceptions.CosmosResourceExistsError as e:
+        booking_logger.info("Booking with ID %s already exists in Cosmos DB. Skipping insertion.", booking_id)
+        headers = getattr(e, 'headers', None) or {}
+        return 'skipped', float(headers.get('x-ms-request-charge', 0))
+    except exceptions.CosmosHttpResponseError as e:
+        logger.error(f"HTTP error while inserting booking {booking_id}: {e.status_code} {e.message}")
+        return 'failed', sum(charges)
+    except Exception as e:
+        logger.error(f"Error inserting booking {booking_id}: {e}")
+        return 'failed', sum(charges)
+
+
+# Function to insert many bookings into Cosmos DB
+def bulk_insert_bookings_to_cosmos(container, bookings_data, batch_size=100, max_concurrency=8):
+    """
+    Inserts a batch of bookings into Cosmos DB without a per-booking existence query.
+
+    Each document gets an id derived from its booking_id, so a booking that was
+    already stored comes back as a conflict and is counted as skipped.
+
+    :param container: The Cosmos DB container.
+    :param bookings_data: List of booking data dictionaries (e.g. from create_booking_data).
+    :param batch_size: Number of documents written per batch.
+    :param max_concurrency: Maximum number of writes in flight at once.
+    :return: Dictionary with inserted, skipped and failed counts, the failed booking IDs, total request charge
+             and elapsed time.
+    """
+    totals = {'inserted': 0, 'skipped': 0, 'failed': 0, 'failed_ids': [], 'request_charge': 0.0, 'elapsed_seconds': 0.0}
+
+    documents = []
+    for booking_data in bookings_data:
+        if not booking_data.get('booking_id'):
+            logger.error("Booking data is missing the 'booking_id'. Skipping insertion.")
+            totals['failed'] += 1
+            continue
+        documents.append(dict(booking_data, **booking_document_keys(booking_data['booking_id'], booking_data.get('campground_id'))))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for batch_start in range(0, len(documents), batch_size):
+            batch = documents[batch_start:batch_start + batch_size]
+            batch_started = time.perf_counter()
+            results = list(executor.map(lambda document: _create_booking_document(container, document), batch))
+
+            batch_charge = sum(charge for _, charge in results)
+            for document, (status, _) in zip(batch, results):
+                totals[status] += 1
+                if status == 'failed':
+                    totals['failed_ids'].append(document['booking_id'])
+            index_booking_names(document for document, (status, _) in zip(batch, results) if status != 'failed')
+            totals['request_charge'] += batch_charge
+            logger.info(f"Cosmos DB batch {batch_start // batch_size + 1}: {len(batch)} bookings written "
+                        f"in {time.perf_counter() - batch_started:.3f}s ({batch_charge:.2f} RU).")
+
+    totals['elapsed_seconds'] = time.perf_counter() - started
+    logger.info(f"Bulk insert into Cosmos DB: {totals['inserted']} inserted, {totals['skipped']} skipped, "
+                f"{totals['failed']} failed, {totals['request_charge']:.2f} RU in {totals['elapsed_seconds']:.3f}s.")
+    return totals
+
+
 # Function to update booking in Cosmos DB
 @retry(wait=wait_fixed(2), stop=stop_after_attempt(3))
-def update_booking_in_cosmos(container, booking_id, update_data):
+def update_booking_in_cosmos(container, booking_id, update_data, campground_id=None):
     try:
-        booking = container.read_item(item=booking_id, partition_key=booking_id)
+        booking = container.read_item(item=booking_document_id(booking_id), partition_key=booking_partition_key(campground_id))
         booking.update(update_data)
         container.replace_item(item=booking['id'], body=booking)
+        get_booking_cache().invalidate(booking_cache_key(booking_id, campground_id))
         logger.info(f"Booking with ID {booking_id} updated successfully in Cosmos DB.")
+        if 'customer_name' in update_data:
+            index_booking_names([booking])
     except exceptions.CosmosResourceNotFoundError:
         logger.error(f"Booking with ID {booking_id} not found.")
     except Exception as e:
@@ -72,10 +236,12 @@ def update_booking_in_cosmos(container, booking_id, update_data):
 
 # Function to delete booking from Cosmos DB
 @retry(wait=wait_fixed(2), stop=stop_after_attempt(3))
-def delete_booking_from_cosmos(container, booking_id):
+def delete_booking_from_cosmos(container, booking_id, campground_id=None):
     try:
-        container.delete_item(item=booking_id, partition_key=booking_id)
+        container.delete_item(item=booking_document_id(booking_id), partition_key=booking_partition_key(campground_id))
+        get_booking_cache().invalidate(booking_cache_key(booking_id, campground_id))
         logger.info(f"Booking with ID {booking_id} deleted successfully.")
+        get_booking_name_index().remove(booking_id, booking_partition_key(campground_id))
     except exceptions.CosmosResourceNotFoundError:
         logger.error(f"Booking with ID {booking_id} not found.")
     except Exception as e:
@@ -94,6 +260,66 @@ def fetch_cosmos_bookings(container):
         return []
 
 
+# Columns shown on the bookings list page
+BOOKING_LIST_FIELDS = ('booking_id', 'customer_name', 'arrival_date', 'num_campsites', 'campsite_id', 'total_cost')
+
+# Function to fetch one page of bookings from Cosmos DB
+def fetch_cosmos_bookings_page(container, page_size=50, continuation_token=None, campground_id=None,
+                               fields=BOOKING_LIST_FIELDS):
+    """
+    Fetches one page of bookings, projecting only the listed fields.
+
+    The query is scoped to the campground's partition and Cosmos DB stops after
+    page_size items, so the cost of a page does not depend on how many bookings exist.
+
+    :param container: The Cosmos DB Bookings container.
+    :param page_size: Maximum number of bookings on the page.
+    :param continuation_token: Token returned with the previous page (None for the first page).
+    :param campground_id: The campground ID (defaults to CAMPGROUND_ID).
+    :param fields: Booking fields to return.
+    :return: Tuple of (list of booking dictionaries, continuation token for the next page or None).
+    """
+    try:
+        query = "SELECT " + ", ".join(f"c.{field}" for field in fields) + " FROM c"
+        pager = container.query_items(query=query, partition_key=booking_partition_key(campground_id),
+                                      max_item_count=page_size).by_page(continuation_token)
+        items = list(next(pager, []))
+        logger.info(f"Fetched a page of {len(items)} bookings.")
+        return items, pager.continuation_token
+    except exceptions.CosmosHttpResponseError as e:
+        logger.error(f"Error fetching bookings: {e}")
+        return [], None
+
+
+# Function to fetch the campsites already allocated to stored bookings
+def fetch_campsite_allocations(container, since_date=None):
+    """
+    Fetches the campsites allocated to bookings arriving on or after a date.
+
+    Only the fields needed to rebuild campsite availability are projected.
+
+    :param container: The Cosmos DB container.
+    :param since_date: Earliest arrival date to include ('YYYY-MM-DD' string or date; None fetches every allocation).
+    :return: List of (arrival_date, list of campsite numbers) tuples, or None if the query failed.
+    """
+    try:
+        query = ("SELECT c.arrival_date, c.campsite_id, c.campsite_allocations FROM c "
+                 "WHERE IS_DEFINED(c.campsite_id) AND NOT IS_NULL(c.campsite_id)")
+        parameters = []
+        if since_date is not None:
+            if not isinstance(since_date, str):
+                since_date = since_date.strftime('%Y-%m-%d')
+            query += " AND c.arrival_date >= @since_date"
+            parameters.append({"name": "@since_date", "value": since_date})
+        items = container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True)
+        allocations = [(item['arrival_date'], item.get('campsite_allocations') or [item['campsite_id']]) for item in items]
+        logger.info(f"Fetched {len(allocations)} stored campsite allocations arriving from {since_date or 'any date'}.")
+        return allocations
+    except exceptions.CosmosHttpResponseError as e:
+        logger.error(f"Error fetching campsite allocations: {e}")
+        return None
+
+
 # Function to insert a PDF for booking
 def upsert_booking_pdf_to_cosmos(container, pdf_path, booking_id, campground_id):
     """
@@ -105,21 +331,57 @@ def upsert_booking_pdf_to_cosmos(container, pdf_path, booking_id, campground_id)
     :param campground_id: The campground ID (partition key).
     """
     try:
-        # Read the PDF file, convert it to base64 to make it JSON serializable
         with open(pdf_path, 'rb') as pdf_file:
-            pdf_data = base64.b64encode(pdf_file.read()).decode('utf-8')  # Encode and convert to string
+            pdf_bytes = pdf_file.read()
+    except Exception as e:
+        logger.error(f"Error reading PDF {pdf_path} for booking {booking_id}: {e}")
+        return False
+    return upsert_booking_pdf_bytes_to_cosmos(container, pdf_bytes, booking_id, campground_id, os.path.basename(pdf_path))
+
+
+def upsert_booking_pdf_bytes_to_cosmos(container, pdf_bytes, booking_id, campground_id, filename=None, content_hash=None,
+                                       blob_store=None, compression=PDF_BLOB_COMPRESSION):
+    """
+    Stores a PDF rendered in memory in the blob store and upserts its metadata into Cosmos DB.
+
+    The Cosmos DB document only records where the PDF lives, its sizes and hashes,
+    so the PDF itself never inflates the document or its RU charge.
+
+    :param container: The Cosmos DB container.
+    :param pdf_bytes: The PDF content (bytes, bytearray or memoryview).
+    :param booking_id: The ID of the booking.
+    :param campground_id: The campground ID (partition key).
+    :param filename: File name stored with the PDF (defaults to confirmation_<booking_id>.pdf).
+    :param content_hash: Optional hash of the fields the PDF was rendered from, stored for fetch_booking_pdf_hash.
+    :param blob_store: BlobStore holding the PDF (defaults to get_pdf_blob_store()).
+    :param compression: Compression applied before storing ("gzip" or None).
+    """
+    filename = filename or f"confirmation_{booking_id}.pdf"
+    try:
+        blob_store = blob_store or get_pdf_blob_store()
+        stored_bytes = compress_blob(pdf_bytes, compression)
+        blob_key = f"{campground_id}/{filename}" + (".gz" if compression == "gzip" else "")
+        blob_store.put(blob_key, stored_bytes)  # Store the PDF first so the metadata never points at a missing blob
 
-        # Create the PDF document for Cosmos DB
+        # Create the PDF metadata document for Cosmos DB
         pdf_document = {
-            'id': str(booking_id),  # Unique identifier for the document
-            'campground_id': campground_id,  # Partition key
-            'pdf_data': pdf_data,  # Encoded PDF data
-            'filename': os.path.basename(pdf_path)
+            'id': booking_document_id(booking_id),  # Unique identifier for the document
+            'campground_id': booking_partition_key(campground_id),  # Partition key
+            'filename': filename,
+            'blob_store': blob_store.name,
+            'blob_key': blob_key,
+            'compression': compression,
+            'size': len(pdf_bytes),
+            'stored_size': len(stored_bytes),
+            'sha256': hashlib.sha256(pdf_bytes).hexdigest()
         }
+        if content_hash is not None:
+            pdf_document['content_hash'] = content_hash
 
         # Perform the upsert operation in Cosmos DB
         container.upsert_item(pdf_document)
-        logger.info(f"PDF {pdf_path} upserted successfully for booking {booking_id}.")
+        logger.info(f"PDF {filename} stored as {blob_key} ({len(stored_bytes)} of {len(pdf_bytes)} bytes) "
+                    f"for booking {booking_id}.")
         return True
 
     except exceptions.CosmosHttpResponseError as e:
@@ -129,32 +391,108 @@ def upsert_booking_pdf_to_cosmos(container, pdf_path, booking_id, campground_id)
         logger.error(f"Error upserting PDF for booking {booking_id}: {e}")
         return False
 
-def find_booking_by_id(booking_id, cosmos_client):
+
+def fetch_booking_pdf(container, booking_id, campground_id, blob_store=None):
+    """
+    Retrieves a booking's PDF using its metadata document in Cosmos DB.
+
+    Documents written before PDFs moved to the blob store still carry the PDF
+    inline as base64 and are decoded directly.
+
+    :param container: The Cosmos DB container holding the PDF metadata.
+    :param booking_id: The ID of the booking.
+    :param campground_id: The campground ID (partition key).
+    :param blob_store: BlobStore holding the PDF (defaults to get_pdf_blob_store()).
+    :return: The PDF content as bytes, or None if it was not found or failed its integrity check.
+    """
+    try:
+        pdf_document = container.read_item(item=booking_document_id(booking_id), partition_key=booking_partition_key(campground_id))
+        if 'pdf_data' in pdf_document:
+            return base64.b64decode(pdf_document['pdf_data'])
+
+        stored_bytes = (blob_store or get_pdf_blob_store()).get(pdf_document['blob_key'])
+        if stored_bytes is None:
+            logger.error(f"PDF blob {pdf_document['blob_key']} for booking {booking_id} is missing.")
+            return None
+        pdf_bytes = decompress_blob(stored_bytes, pdf_document.get('compression'))
+        if hashlib.sha256(pdf_bytes).hexdigest() != pdf_document.get('sha256'):
+            logger.error(f"PDF blob {pdf_document['blob_key']} for booking {booking_id} failed its integrity check.")
+            return None
+        return pdf_bytes
+    except exceptions.CosmosResourceNotFoundError:
+        logger.warning(f"No PDF found for booking {booking_id}.")
+        return None
+    except Exception as e:
+        logger.error(f"Error fetching PDF for booking {booking_id}: {e}")
+        return None
+
+def fetch_booking_pdf_hash(container, booking_id, campground_id):
+    """
+    Returns the content hash stored with a booking's PDF metadata.
+
+    :param container: The Cosmos DB container holding the PDFs.
+    :param booking_id: The ID of the booking.
+    :param campground_id: The campground ID (partition key).
+    :return: The stored content hash, or None if there is no PDF or it was stored without one.
     """
-    Retrieves a booking from Cosmos DB by its booking ID.
+    try:
+        # The metadata document is small, so a point read is cheaper than a projected query
+        pdf_document = read_booking_document(container, booking_id, campground_id)
+        return pdf_document.get('content_hash') if pdf_document else None
+    except exceptions.CosmosHttpResponseError as e:
+        logger.error(f"HTTP error while reading the PDF hash for booking {booking_id}: {e.status_code} {e.message}")
+        return None
+    except Exception as e:
+        logger.error(f"Error reading the PDF hash for booking {booking_id}: {e}")
+        return None
+
+
+def migrate_booking_document_ids(container):
+    """
+    Rewrites booking documents stored with random ids so they follow the booking_id-derived id scheme.
+
+    Documents inserted before the scheme was introduced can only be found by
+    query; after this one-off migration every booking is reachable by point read.
+    The booking cache entry of each migrated booking is invalidated.
+
+    :param container: The Cosmos DB Bookings container.
+    :return: Number of documents migrated.
+    """
+    migrated = 0
+    query = "SELECT * FROM c WHERE IS_DEFINED(c.booking_id) AND c.id != ToString(c.booking_id)"
+    for document in list(container.query_items(query=query, enable_cross_partition_query=True)):
+        old_id, old_partition_key = document['id'], document.get('campground_id')
+        try:
+            container.upsert_item(dict(document, **booking_document_keys(document['booking_id'], old_partition_key)))
+            container.delete_item(item=old_id, partition_key=old_partition_key)
+            migrated += 1
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Error migrating booking {document['booking_id']}: {e.status_code} {e.message}")
+        finally:
+            # A copy cached before the migration still carries the old random id; drop it even
+            # when only the upsert went through
+            get_booking_cache().invalidate(booking_cache_key(document['booking_id'], old_partition_key))
+    logger.info(f"Migrated {migrated} booking documents to booking_id-derived ids.")
+    return migrated
+
+def find_booking_by_id(booking_id, cosmos_client, campground_id=None):
+    """
+    Retrieves a booking by its booking ID, from the booking cache or else Cosmos DB.
 
     :param booking_id: The ID of the booking to retrieve.
-    :param cosmos_client: The Cosmos DB client connection.
+    :param cosmos_client: The Cosmos DB Bookings container (a shared one is used if None).
+    :param campground_id: The campground ID (defaults to CAMPGROUND_ID).
     :return: The booking object if found, otherwise None.
     """
     try:
-        # Connect to the Cosmos DB container for bookings
-        container = connect_to_cosmos("Bookings")  
-
-        # Define the query to find the booking by its ID
-        query = "SELECT * FROM c WHERE c.booking_id = @booking_id"
-        parameters = [{"name": "@booking_id", "value": booking_id}]
-        
-        # Execute the query
-        items = list(container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=True
-        ))
-
-        if items:
+        # Serve recently read bookings from memory; on a miss, point read by id and partition key
+        item = get_booking_cache().get_or_load(
+            booking_cache_key(booking_id, campground_id),
+            lambda: read_booking_document(cosmos_client or connect_to_cosmos("Bookings"), booking_id, campground_id))
+
+        if item:
             logger.info(f"Booking with ID {booking_id} found.")
-            return Booking.from_dict(items[0])  # Convert dictionary to Booking object
+            return Booking.from_dict(item)  # Convert dictionary to Booking object
         else:
             logger.warning(f"No booking found with ID {booking_id}.")
             return None
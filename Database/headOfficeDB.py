@@ -1,5 +1,5 @@
-from Utils.logger_config import logger
-from resources.db_config import get_sql_connection
+from Utils.logger_config import logger, booking_logger
+from resources.db_config import head_office_pool
 import pyodbc
 import uuid
 
@@ -7,12 +7,13 @@ import uuid
 # Function to connect to the Head Office SQL database
 def connect_to_head_office():
     """
-    Connects to the Head Office SQL database using the get_sql_connection function from db_config.py.
+    Checks out a connection to the Head Office SQL database from the shared pool in db_config.py.
+    Calling close() on the connection returns it to the pool.
 
     :return: Connection object to the Head Office SQL database or None if connection fails.
     """
     try:
-        conn = get_sql_connection()  # Get the connection from db_config
+        conn = head_office_pool.acquire()  # Reuse a pooled connection where possible
         logger.info("Connected to Head Office SQL database successfully.")
         return conn
 
@@ -29,36 +30,70 @@ def connect_to_head_office():
         return None
 
 
+# Query used to fetch a campground's bookings along with customer names
+FETCH_BOOKINGS_QUERY = """
+    SELECT 
+        b.booking_id, 
+        b.customer_id, 
+        b.booking_date, 
+        b.arrival_date, 
+        b.campground_id, 
+        b.campsite_size, 
+        b.num_campsites, 
+        CONCAT(c.first_name, ' ', c.last_name) AS customer_name
+    FROM 
+        camping.booking b
+    JOIN 
+        camping.customers c ON b.customer_id = c.customer_id
+    WHERE 
+        b.campground_id = ?
+"""
+
+# Restricts FETCH_BOOKINGS_QUERY to bookings newer than a watermark, oldest first
+INCREMENTAL_FETCH_CLAUSE = """
+        AND b.booking_id > ?
+    ORDER BY 
+        b.booking_id
+"""
+
+# Orders a full fetch oldest first, so a stream cut short still covers every booking up to the last one read
+FULL_FETCH_CLAUSE = """
+    ORDER BY 
+        b.booking_id
+"""
+
+
+# SQL Server accepts at most 2100 parameters per statement
+MAX_QUERY_PARAMETERS = 2000
+
+
+def _fetch_bookings_statement(campground_id, since_booking_id, ordered=False):
+    """
+    Builds the booking fetch query and its parameters.
+
+    :param campground_id: The campground ID to filter bookings by.
+    :param since_booking_id: Only include bookings with a greater booking_id (None for all bookings).
+    :param ordered: If True, a full fetch is ordered by booking_id as well (an incremental fetch always is).
+    :return: Tuple of (query, parameters).
+    """
+    if since_booking_id is None:
+        return FETCH_BOOKINGS_QUERY + (FULL_FETCH_CLAUSE if ordered else ""), (campground_id,)
+    return FETCH_BOOKINGS_QUERY + INCREMENTAL_FETCH_CLAUSE, (campground_id, since_booking_id)
+
+
 # Function to fetch bookings from the Head Office SQL database
-def fetch_bookings(conn, campground_id=1):
+def fetch_bookings(conn, campground_id=1, since_booking_id=None):
     """
     Fetches bookings from the head office camping.booking table and includes customer names.
     
     :param conn: The connection object to the SQL database.
     :param campground_id: The campground ID to filter bookings by.
+    :param since_booking_id: Only fetch bookings with a greater booking_id (None fetches every booking).
     :return: A list of booking records or an empty list if an error occurs.
     """
-    query = """
-        SELECT 
-            b.booking_id, 
-            b.customer_id, 
-            b.booking_date, 
-            b.arrival_date, 
-            b.campground_id, 
-            b.campsite_size, 
-            b.num_campsites, 
-            CONCAT(c.first_name, ' ', c.last_name) AS customer_name
-        FROM 
-            camping.booking b
-        JOIN 
-            camping.customers c ON b.customer_id = c.customer_id
-        WHERE 
-            b.campground_id = ?;
-    """
-    
     try:
         with conn.cursor() as cursor:
-            cursor.execute(query, (campground_id,))
+            cursor.execute(*_fetch_bookings_statement(campground_id, since_booking_id))
             rows = cursor.fetchall()
             logger.info(f"Fetched {len(rows)} bookings from the Head Office database for campground {campground_id}.")
             return rows
@@ -72,6 +107,102 @@ def fetch_bookings(conn, campground_id=1):
         return []
 
 
+# Function to fetch specific bookings from the Head Office SQL database
+def fetch_bookings_by_ids(conn, booking_ids, campground_id=1):
+    """
+    Fetches the given bookings (with customer names), a chunk of IDs per query.
+
+    :param conn: The connection object to the SQL database.
+    :param booking_ids: List of booking IDs.
+    :param campground_id: The campground ID to filter bookings by.
+    :return: A list of booking records or an empty list if an error occurs.
+    """
+    rows = []
+    try:
+        with conn.cursor() as cursor:
+            for start in range(0, len(booking_ids), MAX_QUERY_PARAMETERS):
+                chunk = list(booking_ids[start:start + MAX_QUERY_PARAMETERS])
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(FETCH_BOOKINGS_QUERY + f" AND b.booking_id IN ({placeholders}) ORDER BY b.booking_id",
+                               [campground_id, *chunk])
+                rows.extend(cursor.fetchall())
+        logger.info(f"Fetched {len(rows)} of {len(booking_ids)} requested bookings from the Head Office database.")
+        return rows
+
+    except pyodbc.DatabaseError as de:
+        logger.error(f"Database error fetching bookings by ID from Head Office SQL database: {de}")
+        return []
+
+    except Exception as ex:
+        logger.error(f"An unexpected error occurred while fetching bookings by ID: {ex}")
+        return []
+
+
+# Function to find the earliest arrival among the bookings to fetch
+def fetch_earliest_arrival_date(conn, campground_id=1, since_booking_id=None):
+    """
+    Finds the earliest arrival date of a campground's bookings without fetching them.
+
+    :param conn: The connection object to the SQL database.
+    :param campground_id: The campground ID to filter bookings by.
+    :param since_booking_id: Only consider bookings with a greater booking_id (None considers every booking).
+    :return: The earliest arrival date, or None if there are no such bookings or an error occurs.
+    """
+    query = "SELECT MIN(b.arrival_date) FROM camping.booking b WHERE b.campground_id = ?"
+    params = [campground_id]
+    if since_booking_id is not None:
+        query += " AND b.booking_id > ?"
+        params.append(since_booking_id)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    except pyodbc.DatabaseError as de:
+        logger.error(f"Database error fetching the earliest arrival date from Head Office SQL database: {de}")
+        return None
+
+    except Exception as ex:
+        logger.error(f"An unexpected error occurred while fetching the earliest arrival date: {ex}")
+        return None
+
+
+# Function to stream bookings from the Head Office SQL database
+def stream_bookings(conn, campground_id=1, arraysize=1000, since_booking_id=None):
+    """
+    Streams bookings from the head office camping.booking table, fetching arraysize rows at a time.
+
+    Only one chunk of rows is held in memory, so tables of any size can be processed.
+    The cursor stays open until the generator is exhausted or closed, so the connection
+    should not be used for anything else meanwhile. Rows come oldest booking_id first.
+
+    :param conn: The connection object to the SQL database.
+    :param campground_id: The campground ID to filter bookings by.
+    :param arraysize: Number of rows fetched per round trip.
+    :param since_booking_id: Only fetch bookings with a greater booking_id (None fetches every booking).
+    :return: Generator of booking records; stops early (after logging) if an error occurs.
+    """
+    fetched = 0
+    try:
+        with conn.cursor() as cursor:
+            cursor.arraysize = arraysize
+            cursor.execute(*_fetch_bookings_statement(campground_id, since_booking_id, ordered=True))
+            while True:
+                rows = cursor.fetchmany(arraysize)
+                if not rows:
+                    break
+                fetched += len(rows)
+                yield from rows
+        logger.info(f"Streamed {fetched} bookings from the Head Office database for campground {campground_id}.")
+
+    except pyodbc.DatabaseError as de:
+        logger.error(f"Database error streaming bookings from Head Office SQL database after {fetched} rows: {de}")
+
+    except Exception as ex:
+        logger.error(f"An unexpected error occurred while streaming bookings after {fetched} rows: {ex}")
+
+
 # Function to update the campground_id of a specific booking in the camping.booking table
 def update_booking_campground(conn, booking_id, new_campground_id):
     """
@@ -89,7 +220,7 @@ def update_booking_campground(conn, booking_id, new_campground_id):
         with conn.cursor() as cursor:
             cursor.execute(query, (new_campground_id, booking_id))
             conn.commit()
-            logger.info(f"Booking {booking_id} updated with new campground ID {new_campground_id} successfully.")
+            booking_logger.info("Booking %s updated with new campground ID %s successfully.", booking_id, new_campground_id)
             return True
 
     except pyodbc.DatabaseError as de:
@@ -100,13 +231,39 @@ def update_booking_campground(conn, booking_id, new_campground_id):
         logger.error(f"An unexpected error occurred while updating booking {booking_id}: {ex}")
         return False
 
+# Statement used to insert processed bookings into the Head Office database
+INSERT_BOOKING_QUERY = """
+    INSERT INTO camping.booking (id, booking_id, customer_name, arrival_date, departure_date, campsite_number, rate_per_night)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _booking_insert_params(new_id, booking_data):
+    """
+    Builds the INSERT_BOOKING_QUERY parameters for a booking.
+
+    :param new_id: The unique ID for the new booking record.
+    :param booking_data: The booking data to insert.
+    :return: Tuple of query parameters.
+    """
+    return (
+        new_id,
+        booking_data.get('booking_id'),
+        booking_data.get('customer_name'),
+        booking_data.get('arrival_date'),
+        booking_data.get('departure_date'),
+        booking_data.get('campsite_number'),
+        booking_data.get('rate_per_night')
+    )
+
+
 def insert_booking_to_head_office(head_office_conn, booking_data):
     """
     Inserts a booking record into the Head Office database.
 
     :param head_office_conn: Connection to the Head Office database (using pyodbc).
     :param booking_data: The booking data to insert.
-    :return: True if the booking was successfully inserted, False otherwise.
+    :return: True if the booking is stored (inserted now or already present), False if the insert failed.
     """
     booking_id = booking_data.get('booking_id')
     if not booking_id:
@@ -123,31 +280,19 @@ def insert_booking_to_head_office(head_office_conn, booking_data):
         existing_booking_count = cursor.fetchone()[0]
 
         if existing_booking_count > 0:
-            logger.info(f"Booking with ID {booking_id} already exists in Head Office database. Skipping insertion.")
-            return False  # Indicate that the booking was skipped
+            booking_logger.info("Booking with ID %s already exists in Head Office database. Skipping insertion.", booking_id)
+            return True  # Already stored, e.g. when a run is retried
         else:
             # Generate a new unique ID for the booking record
             new_id = str(uuid.uuid4())
 
             # Insert the booking into the Head Office database
-            insert_query = """
-                INSERT INTO camping.booking (id, booking_id, customer_name, arrival_date, departure_date, campsite_number, rate_per_night)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """
-            cursor.execute(insert_query, (
-                new_id,
-                booking_data.get('booking_id'),
-                booking_data.get('customer_name'),
-                booking_data.get('arrival_date'),
-                booking_data.get('departure_date'),
-                booking_data.get('campsite_number'),
-                booking_data.get('rate_per_night')
-            ))
+            cursor.execute(INSERT_BOOKING_QUERY, _booking_insert_params(new_id, booking_data))
 
             # Commit the transaction to save changes
             head_office_conn.commit()
 
-            logger.info(f"Booking {booking_id} inserted into Head Office database successfully.")
+            booking_logger.info("Booking %s inserted into Head Office database successfully.", booking_id)
             return True  # Indicate success
 
     except pyodbc.DatabaseError as e:
@@ -158,3 +303,74 @@ def insert_booking_to_head_office(head_office_conn, booking_data):
         return False  # Indicate failure
     finally:
         cursor.close()  # Ensure the cursor is closed after use
+
+
+def insert_bookings_to_head_office(head_office_conn, bookings_data):
+    """
+    Inserts a batch of booking records into the Head Office database in one transaction.
+
+    Existing booking IDs are looked up with a few IN queries rather than one query
+    per booking, and the new rows are sent with a single fast executemany.
+
+    :param head_office_conn: Connection to the Head Office database (using pyodbc).
+    :param bookings_data: List of booking data dictionaries to insert.
+    :return: Dictionary with inserted, skipped and failed counts and the failed booking IDs.
+    """
+    counts = {'inserted': 0, 'skipped': 0, 'failed': 0, 'failed_ids': []}
+
+    pending = {}
+    for booking_data in bookings_data:
+        booking_id = booking_data.get('booking_id')
+        if not booking_id:
+            logger.error("Booking data is missing the 'booking_id'. Skipping insertion.")
+            counts['failed'] += 1
+        elif booking_id in pending:
+            counts['skipped'] += 1  # Duplicate within the batch
+        else:
+            pending[booking_id] = booking_data
+    if not pending:
+        return counts
+
+    cursor = None
+    new_ids = None
+    try:
+        cursor = head_office_conn.cursor()
+
+        # Find which bookings already exist, a chunk of IDs at a time
+        booking_ids = list(pending)
+        existing_ids = set()
+        for start in range(0, len(booking_ids), MAX_QUERY_PARAMETERS):
+            chunk = booking_ids[start:start + MAX_QUERY_PARAMETERS]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(f"SELECT booking_id FROM camping.booking WHERE booking_id IN ({placeholders})", chunk)
+            existing_ids.update(row[0] for row in cursor.fetchall())
+
+        new_ids = [booking_id for booking_id in pending if booking_id not in existing_ids]
+        rows = [_booking_insert_params(str(uuid.uuid4()), pending[booking_id]) for booking_id in new_ids]
+        counts['skipped'] += len(pending) - len(rows)
+
+        if rows:
+            cursor.fast_executemany = True
+            cursor.executemany(INSERT_BOOKING_QUERY, rows)
+        head_office_conn.commit()  # One commit for the whole batch
+        counts['inserted'] = len(rows)
+
+        logger.info(f"Batch insert into Head Office database: {counts['inserted']} inserted, "
+                    f"{counts['skipped']} skipped, {counts['failed']} failed.")
+        return counts
+
+    except pyodbc.DatabaseError as e:
+        head_office_conn.rollback()
+        counts['failed_ids'] = list(pending) if new_ids is None else new_ids
+        counts['failed'] += len(counts['failed_ids'])
+        logger.error(f"Database error while batch inserting bookings into Head Office database: {str(e)}")
+        return counts
+    except Exception as e:
+        head_office_conn.rollback()
+        counts['failed_ids'] = list(pending) if new_ids is None else new_ids
+        counts['failed'] += len(counts['failed_ids'])
+        logger.error(f"Error batch inserting bookings into Head Office database: {str(e)}")
+        return counts
+    finally:
+        if cursor is not None:
+            cursor.close()  # Ensure the cursor is closed after use
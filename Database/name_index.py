@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import threading
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from resources.db_config import BOOKING_NAME_INDEX_PATH
+from Utils.logger_config import logger
+
+_booking_name_index = None
+_booking_name_index_lock = threading.Lock()
+
+# Shortest search term the trigram index can answer; shorter terms scan the local table instead
+MIN_TRIGRAM_LENGTH = 3
+
+
+class BookingNameIndex:
+    """
+    Local SQLite index of customer name -> booking, used to search bookings by name.
+
+    Searching Cosmos DB by name needs a cross-partition CONTAINS scan whose
+    cost grows with the container. The index keeps one row per booking and a
+    case-insensitive FTS5 trigram index over the names, so a prefix or
+    substring search is an index lookup and the bookings it finds are then
+    fetched with point reads.
+    """
+
+    def __init__(self, path=BOOKING_NAME_INDEX_PATH):
+        """
+        Opens (and if needed creates) the index database.
+
+        :param path: Path of the SQLite file, or ":memory:".
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()  # Bulk inserts update the index from several threads
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS booking_names (
+                id INTEGER PRIMARY KEY,
+                campground_id INTEGER NOT NULL,
+                booking_id INTEGER NOT NULL,
+                customer_name TEXT NOT NULL,
+                UNIQUE (campground_id, booking_id)
+            );
+        """)
+        self.trigram = self._create_trigram_index()
+
+    def _create_trigram_index(self):
+        """
+        Creates the FTS5 trigram index and the triggers keeping it in step with booking_names.
+
+        :return: True if the index is available, False if this SQLite build lacks FTS5 trigrams.
+        """
+        try:
+            self.conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS booking_names_fts USING fts5(
+                    customer_name, content='booking_names', content_rowid='id', tokenize='trigram'
+                );
+                CREATE TRIGGER IF NOT EXISTS booking_names_ai AFTER INSERT ON booking_names BEGIN
+                    INSERT INTO booking_names_fts(rowid, customer_name) VALUES (new.id, new.customer_name);
+                END;
+                CREATE TRIGGER IF NOT EXISTS booking_names_ad AFTER DELETE ON booking_names BEGIN
+                    INSERT INTO booking_names_fts(booking_names_fts, rowid, customer_name)
+                    VALUES ('delete', old.id, old.customer_name);
+                END;
+                CREATE TRIGGER IF NOT EXISTS booking_names_au AFTER UPDATE ON booking_names BEGIN
+                    INSERT INTO booking_names_fts(booking_names_fts, rowid, customer_name)
+                    VALUES ('delete', old.id, old.customer_name);
+                    INSERT INTO booking_names_fts(rowid, customer_name) VALUES (new.id, new.customer_name);
+                END;
+            """)
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite {sqlite3.sqlite_version} has no FTS5 trigram tokenizer, "
+                           f"name searches will scan the local index table: {e}")
+            return False
+
+    def add(self, booking_id, customer_name, campground_id):
+        """
+        Adds a booking to the index, or updates its name if it is already indexed.
+
+        :param booking_id: The ID of the booking.
+        :param customer_name: The customer name.
+        :param campground_id: The campground (partition) the booking is stored in.
+        :return: True if the index was updated, False otherwise.
+        """
+        return self.add_many([(booking_id, customer_name, campground_id)]) == 1
+
+    def add_many(self, entries):
+        """
+        Adds several bookings to the index in one transaction.
+
+        :param entries: Iterable of (booking_id, customer_name, campground_id) tuples.
+        :return: Number of bookings indexed.
+        """
+        rows = [(campground_id, booking_id, customer_name) for booking_id, customer_name, campground_id in entries
+                if booking_id and customer_name]
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany("""
+                    INSERT INTO booking_names (campground_id, booking_id, customer_name) VALUES (?, ?, ?)
+                    ON CONFLICT (campground_id, booking_id) DO UPDATE SET customer_name = excluded.customer_name
+                    WHERE customer_name != excluded.customer_name
+                """, rows)
+            return len(rows)
+        except sqlite3.Error as e:
+            logger.error(f"Error updating the booking name index: {e}")
+            return 0
+
+    def remove(self, booking_id, campground_id):
+        """
+        Removes a booking from the index.
+
+        :param booking_id: The ID of the booking.
+        :param campground_id: The campground (partition) the booking is stored in.
+        :return: True if the booking was indexed, False otherwise.
+        """
+        try:
+            with self.lock, self.conn:
+                cursor = self.conn.execute("DELETE FROM booking_names WHERE campground_id = ? AND booking_id = ?",
+                                           (campground_id, booking_id))
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"Error removing booking {booking_id} from the name index: {e}")
+            return False
+
+    def search(self, term, limit=50):
+        """
+        Finds bookings whose customer name contains a search term, ignoring case.
+
+        Names starting with the term are returned first.
+
+        :param term: Part of a customer name.
+        :param limit: Maximum number of bookings returned.
+        :return: List of (booking_id, campground_id) tuples.
+        """
+        term = term.strip()
+        if not term:
+            return []
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        if self.trigram and len(term) >= MIN_TRIGRAM_LENGTH:
+            query = """
+                SELECT b.booking_id, b.campground_id FROM booking_names_fts f
+                JOIN booking_names b ON b.id = f.rowid
+                WHERE booking_names_fts MATCH ?
+                ORDER BY b.customer_name LIKE ? ESCAPE '\\' DESC, b.customer_name, b.booking_id
+                LIMIT ?
+            """
+            parameters = ('"' + term.replace('"', '""') + '"', escaped + '%', limit)
+        else:
+            query = """
+                SELECT booking_id, campground_id FROM booking_names
+                WHERE customer_name LIKE ? ESCAPE '\\'
+                ORDER BY customer_name LIKE ? ESCAPE '\\' DESC, customer_name, booking_id
+                LIMIT ?
+            """
+            parameters = ('%' + escaped + '%', escaped + '%', limit)
+        with self.lock:
+            return [tuple(row) for row in self.conn.execute(query, parameters)]
+
+    def count(self):
+        """
+        Returns the number of indexed bookings.
+
+        :return: Number of rows in the index.
+        """
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM booking_names").fetchone()[0]
+
+    def rebuild(self, container):
+        """
+        Replaces the index with the names of every booking stored in Cosmos DB.
+
+        Run once to build the index for bookings stored before it existed, or to
+        resynchronise a machine whose index file was lost.
+
+        :param container: The Cosmos DB Bookings container.
+        :return: Number of bookings indexed.
+        """
+        query = ("SELECT c.booking_id, c.customer_name, c.campground_id FROM c "
+                 "WHERE IS_DEFINED(c.booking_id) AND IS_DEFINED(c.customer_name)")
+        entries = [(item['booking_id'], item['customer_name'], item.get('campground_id'))
+                   for item in container.query_items(query=query, enable_cross_partition_query=True)]
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM booking_names")
+        indexed = self.add_many(entries)
+        logger.info(f"Rebuilt the booking name index with {indexed} bookings.")
+        return indexed
+
+    def close(self):
+        """
+        Closes the index database.
+        """
+        with self.lock:
+            self.conn.close()
+
+
+def get_booking_name_index():
+    """
+    Returns the process-wide booking name index, stored at BOOKING_NAME_INDEX_PATH in db_config.
+
+    :return: BookingNameIndex object.
+    """
+    global _booking_name_index
+    with _booking_name_index_lock:
+        if _booking_name_index is None:
+            _booking_name_index = BookingNameIndex()
+            logger.info(f"Using the booking name index at {_booking_name_index.path}.")
+        return _booking_name_index
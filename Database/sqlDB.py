@@ -3,19 +3,20 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from Utils.logger_config import logger
-from resources.db_config import get_sql_connection_local  # Importing the local SQL connection function
+from resources.db_config import local_sql_pool  # Shared pool of local SQL connections
 
 def connect_to_sql():
     """
-    Connects to the local SQL Server database using the `get_sql_connection_local()` function.
+    Checks out a connection to the local SQL Server database from the shared pool.
+    Calling close() on the connection returns it to the pool.
     
     :return: Connection object if successful, or None if connection fails.
     """
     try:
-        conn = get_sql_connection_local()  # Using the local SQL connection function
+        conn = local_sql_pool.acquire()  # Reuse a pooled connection where possible
         logger.info("Connected to Local SQL database successfully.")
         return conn  # Return the connection object
-    except pyodbc.Error as e:
+    except (pyodbc.Error, TimeoutError) as e:
         logger.error(f"Error connecting to Local SQL database: {e}")
         return None  # Return None if the connection fails
 
@@ -89,10 +90,163 @@ def create_tables(cursor):
         cursor.execute(create_customers_table)
         cursor.execute(create_booking_table)
         cursor.execute(create_summary_table)
+        cursor.execute(CREATE_SYNC_WATERMARK_TABLE)
+        cursor.execute(CREATE_SYNC_RETRY_TABLE)
         logger.info("Tables created successfully.")
     except pyodbc.Error as e:
         logger.error(f"Error creating tables: {e}")
 
+# Table holding the last Head Office booking processed for each campground
+CREATE_SYNC_WATERMARK_TABLE = """
+IF OBJECT_ID('camping.sync_watermark', 'U') IS NULL
+BEGIN
+    CREATE TABLE camping.sync_watermark (
+        campground_id INT NOT NULL PRIMARY KEY,
+        last_booking_id INT NOT NULL,
+        last_booking_date DATE NULL,
+        updated_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+    );
+END
+"""
+
+def get_sync_watermark(conn, campground_id):
+    """
+    Reads the ID of the last Head Office booking processed for a campground.
+
+    :param conn: Connection to the local SQL database.
+    :param campground_id: The Head Office campground ID.
+    :return: The last processed booking_id, or None if no sync has been recorded (or on error).
+    """
+    try:
+        cursor = conn.cursor()
+        cursor.execute(CREATE_SYNC_WATERMARK_TABLE)
+        cursor.execute("SELECT last_booking_id FROM camping.sync_watermark WHERE campground_id = ?", (campground_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] if row else None
+    except pyodbc.Error as e:
+        logger.error(f"Error reading sync watermark for campground {campground_id}: {e}")
+        return None
+
+def update_sync_watermark(conn, campground_id, last_booking_id, last_booking_date=None):
+    """
+    Records the ID (and booking date) of the last Head Office booking processed for a campground.
+
+    :param conn: Connection to the local SQL database.
+    :param campground_id: The Head Office campground ID.
+    :param last_booking_id: The highest booking_id processed.
+    :param last_booking_date: The latest booking_date processed (optional).
+    :return: True if the watermark was saved, False otherwise.
+    """
+    query = """
+    MERGE camping.sync_watermark AS target
+    USING (SELECT ? AS campground_id, ? AS last_booking_id, ? AS last_booking_date) AS source
+    ON target.campground_id = source.campground_id
+    WHEN MATCHED THEN
+        UPDATE SET last_booking_id = source.last_booking_id,
+                   last_booking_date = source.last_booking_date,
+                   updated_at = SYSUTCDATETIME()
+    WHEN NOT MATCHED THEN
+        INSERT (campground_id, last_booking_id, last_booking_date)
+        VALUES (source.campground_id, source.last_booking_id, source.last_booking_date);
+    """
+    try:
+        cursor = conn.cursor()
+        cursor.execute(CREATE_SYNC_WATERMARK_TABLE)
+        cursor.execute(query, (campground_id, last_booking_id, last_booking_date))
+        conn.commit()
+        cursor.close()
+        logger.info(f"Sync watermark for campground {campground_id} set to booking {last_booking_id}.")
+        return True
+    except pyodbc.Error as e:
+        logger.error(f"Error updating sync watermark for campground {campground_id}: {e}")
+        return False
+
+# Table holding the Head Office bookings a sync run fetched but could not store, to be fetched again next run
+CREATE_SYNC_RETRY_TABLE = """
+IF OBJECT_ID('camping.sync_retry', 'U') IS NULL
+BEGIN
+    CREATE TABLE camping.sync_retry (
+        campground_id INT NOT NULL,
+        booking_id INT NOT NULL,
+        reason VARCHAR(50) NOT NULL,
+        attempts INT NOT NULL DEFAULT 1,
+        updated_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        PRIMARY KEY (campground_id, booking_id)
+    );
+END
+"""
+
+# Largest number of booking IDs sent in one statement
+MAX_RETRY_PARAMETERS = 2000
+
+# Runs a booking may fail in before it is no longer retried; it stays in camping.sync_retry for inspection
+MAX_SYNC_RETRY_ATTEMPTS = 5
+
+def get_sync_retries(conn, campground_id, max_attempts=MAX_SYNC_RETRY_ATTEMPTS):
+    """
+    Reads the IDs of the Head Office bookings earlier runs could not store.
+
+    :param conn: Connection to the local SQL database.
+    :param campground_id: The Head Office campground ID.
+    :param max_attempts: Bookings that already failed this many runs are left out.
+    :return: List of booking IDs, or None on error.
+    """
+    try:
+        cursor = conn.cursor()
+        cursor.execute(CREATE_SYNC_RETRY_TABLE)
+        cursor.execute("SELECT booking_id, attempts FROM camping.sync_retry WHERE campground_id = ? ORDER BY booking_id",
+                       (campground_id,))
+        rows = cursor.fetchall()
+        cursor.close()
+        booking_ids = [row[0] for row in rows if row[1] < max_attempts]
+        if len(booking_ids) < len(rows):
+            logger.warning(f"{len(rows) - len(booking_ids)} bookings of campground {campground_id} failed "
+                           f"{max_attempts} runs and are no longer retried; see camping.sync_retry.")
+        return booking_ids
+    except pyodbc.Error as e:
+        logger.error(f"Error reading sync retries for campground {campground_id}: {e}")
+        return None
+
+def update_sync_retries(conn, campground_id, failed, resolved):
+    """
+    Records the bookings a run could not store and forgets the retried ones that are now stored, in one transaction.
+
+    :param conn: Connection to the local SQL database.
+    :param campground_id: The Head Office campground ID.
+    :param failed: Dictionary of booking_id -> reason ('cosmos', 'head_office' or 'invalid').
+    :param resolved: Iterable of retried booking IDs that were stored this run.
+    :return: True if the retry list was saved, False otherwise.
+    """
+    upsert = """
+    MERGE camping.sync_retry AS target
+    USING (SELECT ? AS campground_id, ? AS booking_id, ? AS reason) AS source
+    ON target.campground_id = source.campground_id AND target.booking_id = source.booking_id
+    WHEN MATCHED THEN
+        UPDATE SET reason = source.reason, attempts = target.attempts + 1, updated_at = SYSUTCDATETIME()
+    WHEN NOT MATCHED THEN
+        INSERT (campground_id, booking_id, reason) VALUES (source.campground_id, source.booking_id, source.reason);
+    """
+    resolved = list(resolved)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(CREATE_SYNC_RETRY_TABLE)
+        if failed:
+            cursor.executemany(upsert, [(campground_id, booking_id, reason) for booking_id, reason in failed.items()])
+        for start in range(0, len(resolved), MAX_RETRY_PARAMETERS):
+            chunk = resolved[start:start + MAX_RETRY_PARAMETERS]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(f"DELETE FROM camping.sync_retry WHERE campground_id = ? AND booking_id IN ({placeholders})",
+                           [campground_id, *chunk])
+        conn.commit()
+        cursor.close()
+        logger.info(f"Sync retries for campground {campground_id}: {len(failed)} to retry, {len(resolved)} resolved.")
+        return True
+    except pyodbc.Error as e:
+        conn.rollback()
+        logger.error(f"Error updating sync retries for campground {campground_id}: {e}")
+        return False
+
 def execute_sql_file(cursor, file_path):
     """
     Executes an SQL script from a file.
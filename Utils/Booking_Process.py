@@ -1,42 +1,50 @@
 from datetime import timedelta
-from Database.cosmosDB import insert_booking_to_cosmos
-from Database.headOfficeDB import insert_booking_to_head_office, connect_to_head_office
-from models.campsite import allocate_campsite
+from Database.cosmosDB import insert_booking_to_cosmos, bulk_insert_bookings_to_cosmos
+from Database.headOfficeDB import insert_booking_to_head_office, insert_bookings_to_head_office, connect_to_head_office
+from models.campsite import allocate_campsites, AvailabilityIndex
 from models.booking import create_booking_data, Booking
 from Utils.confirm_booking import generate_booking_confirmation
-from Utils.logger_config import logger
+from Utils.confirmation_renderer import ConfirmationRenderer
+from Utils.batch_allocation import allocate_bookings_batch
+from Utils.logger_config import logger, booking_logger
 
 
-def allocate_and_confirm_booking(booking, campsites, campground_id):
+def allocate_and_confirm_booking(booking, campsites, campground_id, index=None, renderer=None):
     """
-    Allocates a campsite for the booking and generates a confirmation.
+    Allocates the booking's campsites (all or none) and generates a confirmation.
 
     :param booking: The Booking object to process.
     :param campsites: List of Campsite objects available for allocation.
     :param campground_id: The ID of the campground to assign to the booking.
-    :return: The allocated campsite object if successful, None otherwise.
+    :param index: Optional AvailabilityIndex over the campsites.
+    :param renderer: Optional ConfirmationRenderer; the confirmation is rendered in the background instead of inline.
+    :return: List of allocated campsite objects if successful, None otherwise.
     """
     try:
         # Adjust the booking dates to start on Saturday
         adjusted_start_date = Booking.adjust_to_saturday(booking.arrival_date)
         adjusted_end_date = adjusted_start_date + timedelta(days=7)
 
-        logger.info(f"Attempting to allocate Booking {booking.booking_id} from {adjusted_start_date} to {adjusted_end_date}.")
+        booking_logger.info("Attempting to allocate Booking %s from %s to %s.", booking.booking_id, adjusted_start_date, adjusted_end_date)
 
-        # Allocate a campsite for the booking
-        allocated_campsite = allocate_campsite(campsites, adjusted_start_date, adjusted_end_date, booking)
+        # Allocate num_campsites campsites of the requested size for the booking
+        allocated_campsites = allocate_campsites(campsites, adjusted_start_date, adjusted_end_date, booking, index)
 
-        if allocated_campsite:
+        if allocated_campsites:
             # Update booking with the allocated campsite information
+            site_numbers = [campsite.site_number for campsite in allocated_campsites]
             booking.campground_id = campground_id
-            booking.update_campsite_info(allocated_campsite.site_number, allocated_campsite.rate_per_night)
+            booking.update_campsite_info(site_numbers[0], allocated_campsites[0].rate_per_night, site_numbers)
 
             # Generate a confirmation PDF for the booking
-            generate_booking_confirmation(booking)
-            logger.info(f"Booking {booking.booking_id} successfully allocated to Campsite {allocated_campsite.site_number}.")
-            return allocated_campsite
+            if renderer is not None:
+                renderer.submit(booking)
+            else:
+                generate_booking_confirmation(booking)
+            booking_logger.info("Booking %s successfully allocated to Campsite(s) %s.", booking.booking_id, site_numbers)
+            return allocated_campsites
         else:
-            logger.warning(f"No available campsites for Booking {booking.booking_id}.")
+            booking_logger.warning("No available campsites for Booking %s.", booking.booking_id)
             return None
     except Exception as e:
         logger.error(f"Error allocating or confirming Booking {booking.booking_id}: {e}")
@@ -45,22 +53,34 @@ def allocate_and_confirm_booking(booking, campsites, campground_id):
 
 def insert_booking_to_db(cosmos_conn,head_conn, booking):
     """
-    Inserts a booking record into Cosmos DB.
+    Inserts a booking record into Cosmos DB, then into the Head Office database.
 
     :param cosmos_conn: Connection to Cosmos DB.
+    :param head_conn: Connection to the Head Office database.
     :param booking: The Booking object to insert.
+    :return: None if the booking is stored in both databases, otherwise the name of the
+             database that failed ('cosmos' or 'head_office').
     """
     try:
         booking_data = create_booking_data(booking)
-        insert_booking_to_cosmos(cosmos_conn, booking_data)
-        logger.info(f"Booking {booking.booking_id} inserted into Cosmos DB successfully.")
-        insert_booking_to_head_office(head_conn, booking_data)
-        logger.info(f"Booking {booking.booking_id} inserted into Head Office database successfully.")
+        if not insert_booking_to_cosmos(cosmos_conn, booking_data):
+            return 'cosmos'
+        booking_logger.info("Booking %s inserted into Cosmos DB successfully.", booking.booking_id)
     except Exception as e:
         logger.error(f"Error inserting Booking {booking.booking_id} into Cosmos DB: {e}")
+        return 'cosmos'
+    try:
+        if not insert_booking_to_head_office(head_conn, booking_data):
+            return 'head_office'
+        booking_logger.info("Booking %s inserted into Head Office database successfully.", booking.booking_id)
+        return None
+    except Exception as e:
+        logger.error(f"Error inserting Booking {booking.booking_id} into Head Office database: {e}")
+        return 'head_office'
 
 
-def process_single_booking(booking, campsites, cosmos_conn, head_conn,campground_id):
+def process_single_booking(booking, campsites, cosmos_conn, head_conn,campground_id, index=None, summary=None,
+                           renderer=None, progress=None):
     """
     Processes a single booking by allocating a campsite, generating a confirmation, and inserting into Cosmos DB.
 
@@ -68,32 +88,118 @@ def process_single_booking(booking, campsites, cosmos_conn, head_conn,campground
     :param campsites: List of available Campsite objects.
     :param cosmos_conn: Connection to Cosmos DB.
     :param campground_id: The ID of the campground.
+    :param index: Optional AvailabilityIndex over the campsites.
+    :param summary: Optional RunningSummary updated with the outcome of the allocation.
+    :param renderer: Optional ConfirmationRenderer used to render the confirmation in the background.
+    :param progress: Optional SyncProgress told whether the booking was stored.
     """
     if not isinstance(booking, Booking):
         logger.error(f"Invalid booking type: {type(booking)}. Skipping.")
         return
 
-    logger.info(f"Processing Booking {booking.booking_id}...")
+    booking_logger.info("Processing Booking %s...", booking.booking_id)
 
-    # Allocate a campsite and generate confirmation
-    allocated_campsite = allocate_and_confirm_booking(booking, campsites, campground_id)
+    # Allocate the campsites and generate confirmation
+    allocated_campsites = allocate_and_confirm_booking(booking, campsites, campground_id, index, renderer)
+    if summary is not None:
+        summary.record(booking)
 
-    if allocated_campsite:
+    if allocated_campsites:
         # Insert booking into Cosmos DB if allocation and confirmation were successful
-        insert_booking_to_db(cosmos_conn,head_conn, booking)
-        
+        failed_in = insert_booking_to_db(cosmos_conn,head_conn, booking)
     else:
-        logger.warning(f"Booking {booking.booking_id} could not be processed due to lack of availability.")
+        failed_in = 'unallocated'
+        booking_logger.warning("Booking %s could not be processed due to lack of availability.", booking.booking_id)
+    if progress is not None:
+        progress.record(booking, failed_in is None, failed_in)
 
 
-def process_bookings(bookings, campsites, cosmos_conn,head_conn, campground_id):
+def process_bookings(bookings, campsites, cosmos_conn,head_conn, campground_id, summary=None, pdf_workers=None,
+                     progress=None):
     """
     Processes a list of bookings by allocating campsites, generating confirmations, and inserting into Cosmos DB.
 
-    :param bookings: List of Booking objects.
+    :param bookings: Iterable of Booking objects (a list or a stream such as stream_and_prepare_bookings).
+    :param campsites: List of Campsite objects available for allocation.
+    :param cosmos_conn: Connection to Cosmos DB.
+    :param campground_id: The ID of the campground.
+    :param summary: Optional RunningSummary updated as each booking is allocated.
+    :param pdf_workers: Optional number of processes rendering confirmations in the background
+                        (None renders each confirmation inline).
+    :param progress: Optional SyncProgress told whether each booking was stored.
+    """
+    # Build the availability index once so each allocation avoids scanning every campsite
+    index = AvailabilityIndex(campsites)
+    if pdf_workers is None:
+        for booking in bookings:
+            process_single_booking(booking, campsites, cosmos_conn, head_conn, campground_id, index, summary,
+                                   progress=progress)
+        return
+
+    with ConfirmationRenderer(pdf_workers) as renderer:
+        for booking in bookings:
+            process_single_booking(booking, campsites, cosmos_conn, head_conn, campground_id, index, summary, renderer,
+                                   progress)
+
+
+def process_bookings_batch(bookings, campsites, cosmos_conn, head_conn, campground_id, summary=None, pdf_workers=None,
+                           progress=None):
+    """
+    Processes a list of bookings by solving the allocation for every arrival week first,
+    then generating confirmations and inserting the allocated bookings into the databases.
+
+    :param bookings: Iterable of Booking objects.
     :param campsites: List of Campsite objects available for allocation.
     :param cosmos_conn: Connection to Cosmos DB.
+    :param head_conn: Connection to the Head Office database.
     :param campground_id: The ID of the campground.
+    :param summary: Optional RunningSummary updated with every booking once the allocation is solved.
+    :param pdf_workers: Optional number of processes rendering confirmations while the database writes run
+                        (None renders each confirmation inline).
+    :param progress: Optional SyncProgress told whether each booking was stored.
+    :return: Report dictionary with allocation counts, allocation rate and elapsed time.
     """
+    bookings = list(bookings)  # The allocation is solved over every booking, and the list is walked again below
+    allocated_bookings, report = allocate_bookings_batch(bookings, campsites, campground_id)
+    if summary is not None:
+        for booking in bookings:
+            summary.record(booking)
+
+    renderer = ConfirmationRenderer(pdf_workers) if pdf_workers is not None else None
+    for booking in allocated_bookings:
+        try:
+            if renderer is not None:
+                renderer.submit(booking)
+            else:
+                generate_booking_confirmation(booking)
+        except Exception as e:
+            logger.error(f"Error confirming Booking {booking.booking_id}: {e}")
+
+    try:
+        # Write all allocated bookings to Cosmos DB in one bulk pass
+        bookings_data = [create_booking_data(booking) for booking in allocated_bookings]
+        report['cosmos'] = bulk_insert_bookings_to_cosmos(cosmos_conn, bookings_data)
+
+        # Stage the bookings stored in Cosmos DB into the Head Office database with one commit
+        cosmos_failed = set(report['cosmos']['failed_ids'])
+        report['head_office'] = insert_bookings_to_head_office(
+            head_conn, [booking_data for booking_data in bookings_data if booking_data['booking_id'] not in cosmos_failed])
+        head_office_failed = set(report['head_office']['failed_ids'])
+    finally:
+        if renderer is not None:
+            report['confirmations'] = renderer.close()
+
+    allocated_ids = {booking.booking_id for booking in allocated_bookings}
     for booking in bookings:
-        process_single_booking(booking, campsites, cosmos_conn, head_conn, campground_id)
+        if booking.booking_id not in allocated_ids:
+            failed_in = 'unallocated'
+            booking_logger.warning("Booking %s could not be processed due to lack of availability.", booking.booking_id)
+        elif booking.booking_id in cosmos_failed:
+            failed_in = 'cosmos'
+        elif booking.booking_id in head_office_failed:
+            failed_in = 'head_office'
+        else:
+            failed_in = None
+        if progress is not None:
+            progress.record(booking, failed_in is None, failed_in)
+    return report
@@ -0,0 +1,111 @@
+import time
+from datetime import timedelta
+from models.booking import Booking
+from models.campsite import AvailabilityIndex, allocate_campsites
+from Utils.logger_config import logger
+
+
+def booking_priority(booking):
+    """
+    Sort key for bookings competing for the same week: larger bookings first, then earliest booking date.
+
+    :param booking: The Booking object.
+    :return: A tuple usable as a sort key.
+    """
+    return (-(booking.num_campsites or 1), booking.booking_date, booking.booking_id)
+
+
+def group_bookings_by_week(bookings):
+    """
+    Groups bookings by the Saturday their stay starts on.
+
+    :param bookings: List of Booking objects.
+    :return: Dictionary of week start date -> list of Booking objects.
+    """
+    weeks = {}
+    for booking in bookings:
+        week_start = Booking.adjust_to_saturday(booking.arrival_date)
+        weeks.setdefault(week_start, []).append(booking)
+    return weeks
+
+
+def select_bookings_for_capacity(bookings, capacity):
+    """
+    Chooses which bookings of one size to accept for one week.
+
+    Every booking in the group needs the same seven days from the same pool, so
+    this is a 0/1 knapsack over the number of free sites: fill as many sites as
+    possible and, among equally full packings, prefer bookings earlier in
+    priority order.
+
+    :param bookings: List of Booking objects, already sorted by priority.
+    :param capacity: Number of free campsites of that size for the week.
+    :return: List of accepted Booking objects, in priority order.
+    """
+    demands = [booking.num_campsites or 1 for booking in bookings]
+    if sum(demands) <= capacity:
+        return list(bookings)  # Everything fits, no need to solve
+
+    # best[i][c]: most sites that bookings[i:] can fill with c free sites
+    best = [[0] * (capacity + 1) for _ in range(len(bookings) + 1)]
+    for i in range(len(bookings) - 1, -1, -1):
+        demand = demands[i]
+        row, next_row = best[i], best[i + 1]
+        for c in range(capacity + 1):
+            skip = next_row[c]
+            take = demand + next_row[c - demand] if demand <= c else -1
+            row[c] = take if take > skip else skip
+
+    accepted = []
+    remaining = capacity
+    for i, booking in enumerate(bookings):
+        demand = demands[i]
+        if demand <= remaining and demand + best[i + 1][remaining - demand] == best[i][remaining]:
+            accepted.append(booking)
+            remaining -= demand
+    return accepted
+
+
+def allocate_bookings_batch(bookings, campsites, campground_id, index=None):
+    """
+    Allocates a whole fetch of bookings at once, solving each arrival week before any side effects run.
+
+    :param bookings: List of Booking objects (e.g. from fetch_and_prepare_bookings).
+    :param campsites: List of Campsite objects available for allocation.
+    :param campground_id: The ID of the campground to assign to allocated bookings.
+    :param index: Optional AvailabilityIndex over the campsites; one is built if not supplied.
+    :return: Tuple of (list of allocated Booking objects, report dictionary).
+    """
+    started = time.perf_counter()
+    if index is None:
+        index = AvailabilityIndex(campsites)
+
+    allocated = []
+    for week_start, week_bookings in sorted(group_bookings_by_week(bookings).items()):
+        week_end = week_start + timedelta(days=7)
+
+        bookings_by_size = {}
+        for booking in sorted(week_bookings, key=booking_priority):
+            bookings_by_size.setdefault(booking.campsite_size, []).append(booking)
+
+        for size, size_bookings in bookings_by_size.items():
+            capacity = len(index.available_campsites(week_start, week_end, size))
+            for booking in select_bookings_for_capacity(size_bookings, capacity):
+                allocated_campsites = allocate_campsites(campsites, week_start, week_end, booking, index)
+                if allocated_campsites:
+                    site_numbers = [campsite.site_number for campsite in allocated_campsites]
+                    booking.campground_id = campground_id
+                    booking.update_campsite_info(site_numbers[0], allocated_campsites[0].rate_per_night, site_numbers)
+                    allocated.append(booking)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        'total_bookings': len(bookings),
+        'allocated_bookings': len(allocated),
+        'rejected_bookings': len(bookings) - len(allocated),
+        'allocation_rate': len(allocated) / len(bookings) if bookings else 0.0,
+        'elapsed_seconds': elapsed
+    }
+    logger.info(f"Batch allocation: {report['allocated_bookings']}/{report['total_bookings']} bookings allocated "
+                f"({report['allocation_rate']:.1%}) in {elapsed:.3f}s.")
+    return allocated, report
@@ -0,0 +1,183 @@
+import queue
+import threading
+import time
+from datetime import timedelta
+from Database.cosmosDB import insert_booking_to_cosmos
+from Database.headOfficeDB import insert_booking_to_head_office
+from models.booking import create_booking_data, Booking
+from models.campsite import AvailabilityIndex, allocate_campsites
+from Utils.confirm_booking import generate_booking_confirmation
+from Utils.logger_config import logger, booking_logger
+
+_STOP = object()  # Sentinel telling a stage worker to exit
+
+
+class PipelineStage:
+    """
+    A pool of worker threads reading from a bounded queue.
+
+    Each worker runs the handler on a booking and then passes it to the next
+    stage. Because every queue is bounded, a slow stage makes the stages before
+    it block on put(), so memory stays flat no matter how many bookings flow through.
+
+    A handler fails by raising or by returning False (the database insert
+    functions report failures that way). A failed booking stops at a required
+    stage; an optional stage counts the failure and passes the booking on.
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=100, next_stage=None, required=True, on_result=None):
+        """
+        Initializes the stage.
+
+        :param name: Name of the stage, used in logs and the report.
+        :param handler: Function called with each booking; returning False marks the booking as failed.
+        :param workers: Number of worker threads.
+        :param queue_size: Maximum number of bookings waiting in the stage.
+        :param next_stage: Optional PipelineStage that receives each booking afterwards.
+        :param required: If True, a booking that fails here is not passed to the next stage.
+        :param on_result: Optional function called with each booking and whether the handler succeeded.
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.next_stage = next_stage
+        self.required = required
+        self.on_result = on_result
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.threads = []
+        self.processed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Starts the worker threads."""
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{number + 1}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, booking):
+        """
+        Queues a booking for the stage, blocking while the queue is full.
+
+        :param booking: The Booking object.
+        """
+        self.queue.put(booking)
+
+    def close(self):
+        """Waits for the queued bookings to be handled and stops the workers."""
+        for _ in self.threads:
+            self.queue.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+    def _run(self):
+        """Worker loop: handle bookings until the stop sentinel arrives."""
+        while True:
+            booking = self.queue.get()
+            if booking is _STOP:
+                break
+            try:
+                succeeded = self.handler(booking) is not False
+                if not succeeded:
+                    logger.error(f"{self.name} stage failed for Booking {booking.booking_id}.")
+            except Exception as e:
+                succeeded = False
+                logger.error(f"Error in {self.name} stage for Booking {booking.booking_id}: {e}")
+            with self.lock:
+                if succeeded:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+            if self.on_result is not None:
+                self.on_result(booking, succeeded)
+            if self.next_stage is not None and (succeeded or not self.required):
+                self.next_stage.put(booking)
+
+
+def process_bookings_pipelined(bookings, campsites, cosmos_conn, head_conn, campground_id,
+                               pdf_workers=4, cosmos_workers=8, queue_size=100, summary=None, progress=None):
+    """
+    Processes bookings with allocation on the calling thread and the I/O stages running concurrently.
+
+    Allocation stays single-threaded and in input order, so the same bookings get
+    the same campsites as process_bookings. Allocated bookings then flow through
+    confirmation, Cosmos DB and Head Office stages, each with its own workers.
+    A booking whose Cosmos DB insert fails is not sent to Head Office.
+    The Head Office stage has a single worker because a pyodbc connection must
+    not be shared between threads.
+
+    :param bookings: Iterable of Booking objects.
+    :param campsites: List of Campsite objects available for allocation.
+    :param cosmos_conn: Connection to Cosmos DB.
+    :param head_conn: Connection to the Head Office database.
+    :param campground_id: The ID of the campground.
+    :param pdf_workers: Number of confirmation (PDF render and upload) workers.
+    :param cosmos_workers: Number of Cosmos DB insert workers.
+    :param queue_size: Maximum number of bookings waiting in each stage.
+    :param summary: Optional RunningSummary updated as each booking is allocated.
+    :param progress: Optional SyncProgress told whether each booking was stored.
+    :return: Report dictionary with per-stage counts, elapsed time and throughput.
+    """
+    started = time.perf_counter()
+    index = AvailabilityIndex(campsites)
+
+    def record_head_office(booking, succeeded):
+        if progress is not None:
+            progress.record(booking, succeeded, None if succeeded else 'head_office')
+
+    def record_cosmos(booking, succeeded):
+        if progress is not None and not succeeded:
+            progress.record(booking, False, 'cosmos')  # Successes are recorded once Head Office has the booking
+
+    head_office_stage = PipelineStage(
+        "head-office", lambda booking: insert_booking_to_head_office(head_conn, create_booking_data(booking)),
+        workers=1, queue_size=queue_size, on_result=record_head_office)
+    cosmos_stage = PipelineStage(
+        "cosmos", lambda booking: insert_booking_to_cosmos(cosmos_conn, create_booking_data(booking)),
+        workers=cosmos_workers, queue_size=queue_size, next_stage=head_office_stage, on_result=record_cosmos)
+    # A missing confirmation can be regenerated later, so it does not keep the booking out of the databases
+    confirmation_stage = PipelineStage(
+        "confirmation", lambda booking: generate_booking_confirmation(booking) is not None,
+        workers=pdf_workers, queue_size=queue_size, next_stage=cosmos_stage, required=False)
+    stages = [confirmation_stage, cosmos_stage, head_office_stage]
+
+    for stage in stages:
+        stage.start()
+
+    total = allocated = 0
+    try:
+        for booking in bookings:
+            total += 1
+            adjusted_start_date = Booking.adjust_to_saturday(booking.arrival_date)
+            adjusted_end_date = adjusted_start_date + timedelta(days=7)
+            allocated_campsites = allocate_campsites(campsites, adjusted_start_date, adjusted_end_date, booking, index)
+            if allocated_campsites:
+                site_numbers = [campsite.site_number for campsite in allocated_campsites]
+                booking.campground_id = campground_id
+                booking.update_campsite_info(site_numbers[0], allocated_campsites[0].rate_per_night, site_numbers)
+            if summary is not None:
+                summary.record(booking)  # Record before the booking is handed to the worker threads
+            if allocated_campsites:
+                allocated += 1
+                confirmation_stage.put(booking)  # Blocks while the confirmation stage is saturated
+            else:
+                booking_logger.warning("Booking %s could not be processed due to lack of availability.", booking.booking_id)
+                if progress is not None:
+                    progress.record(booking, False, 'unallocated')
+    finally:
+        # Drain the stages in order so every allocated booking reaches every stage
+        for stage in stages:
+            stage.close()
+
+    elapsed = time.perf_counter() - started
+    report = {
+        'total_bookings': total,
+        'allocated_bookings': allocated,
+        'elapsed_seconds': elapsed,
+        'bookings_per_second': total / elapsed if elapsed else 0.0,
+        'stages': {stage.name: {'processed': stage.processed, 'failed': stage.failed} for stage in stages}
+    }
+    logger.info(f"Pipelined processing: {allocated}/{total} bookings allocated in {elapsed:.3f}s "
+                f"({report['bookings_per_second']:.1f} bookings/s).")
+    return report
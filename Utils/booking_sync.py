@@ -0,0 +1,259 @@
+import itertools
+import threading
+from datetime import datetime, timedelta
+from Database.cosmosDB import fetch_campsite_allocations
+from Database.headOfficeDB import stream_bookings, fetch_bookings_by_ids, fetch_earliest_arrival_date
+from Database.sqlDB import get_sync_watermark, update_sync_watermark, get_sync_retries, update_sync_retries
+from models.booking import Booking
+from models.occupancy import OccupancyCalendar
+from Utils.manage_campsite import seed_campsite_allocations
+from Utils.logger_config import logger
+
+# Reasons a booking was not stored that another run can fix; other failures (e.g. 'unallocated') are final
+RETRY_REASONS = ('cosmos', 'head_office', 'invalid')
+
+
+class SyncProgress:
+    """
+    Tracks what happened to each booking of a sync run.
+
+    Every fetched booking passes through track() and every processing path
+    reports whether it was stored. Bookings that hit a storage failure (a
+    failed Cosmos DB or Head Office write) or could not be read are kept for
+    the retry list, so moving the watermark past them never loses them.
+    A booking without a free campsite is final: fetching it again would not
+    find one either, so it is counted but not retried.
+    """
+
+    def __init__(self, retry_ids=(), summary=None):
+        """
+        Initializes the progress of a run.
+
+        :param retry_ids: IDs of bookings earlier runs could not store, fetched again by this run.
+        :param summary: Optional RunningSummary told which bookings are settled and will not be recorded again.
+        """
+        self.retry_ids = set(retry_ids)
+        self.summary = summary
+        self.since_booking_id = None
+        self.fetched = 0
+        self.recorded = 0
+        self.max_booking_id = None
+        self.latest_booking_date = None
+        self.failed = {}  # booking_id -> reason the booking was not stored, for bookings worth retrying
+        self.unallocated = 0  # Bookings with no free campsite, not retried
+        self.resolved = set()  # Retried bookings stored by this run
+        self.lock = threading.Lock()
+
+    def track(self, bookings):
+        """
+        Passes bookings through while noting the highest booking_id and booking date fetched.
+
+        :param bookings: Iterable of Booking objects.
+        :return: Generator of the same Booking objects.
+        """
+        for booking in bookings:
+            self.fetched += 1
+            if self.max_booking_id is None or booking.booking_id > self.max_booking_id:
+                self.max_booking_id = booking.booking_id
+            if self.latest_booking_date is None or booking.booking_date > self.latest_booking_date:
+                self.latest_booking_date = booking.booking_date
+            yield booking
+
+    def record(self, booking, stored, reason=None):
+        """
+        Records the outcome of one booking.
+
+        :param booking: The Booking object.
+        :param stored: True if the booking is stored in Cosmos DB and Head Office.
+        :param reason: Why the booking was not stored: RETRY_REASONS are retried next run, anything
+                       else (e.g. 'unallocated') is final.
+        """
+        retry = not stored and reason in RETRY_REASONS
+        with self.lock:
+            self.recorded += 1
+            if reason == 'unallocated':
+                self.unallocated += 1
+            if retry:
+                self.failed[booking.booking_id] = reason
+            else:
+                self.failed.pop(booking.booking_id, None)
+                if booking.booking_id in self.retry_ids:
+                    self.resolved.add(booking.booking_id)
+        if not retry and self.summary is not None:
+            self.summary.settle(booking.booking_id)
+
+    def record_unreadable(self, booking_id):
+        """
+        Records a fetched row that could not be converted into a Booking, so it is retried next run.
+
+        :param booking_id: The booking_id of the row.
+        """
+        with self.lock:
+            self.failed[booking_id] = 'invalid'
+
+
+def stream_and_prepare_bookings(head_office_conn, campground_id=1, arraysize=1000, since_booking_id=None, progress=None):
+    """
+    Streams raw booking records from Head Office and converts them into Booking objects one at a time.
+
+    :param head_office_conn: Connection to the Head Office database.
+    :param campground_id: The Head Office campground ID to stream bookings for.
+    :param arraysize: Number of rows fetched from the database per round trip.
+    :param since_booking_id: Only stream bookings with a greater booking_id (None streams every booking).
+    :param progress: Optional SyncProgress told about rows that cannot be converted, so they are retried.
+    :return: Generator of Booking objects.
+    """
+    for record in stream_bookings(head_office_conn, campground_id, arraysize=arraysize, since_booking_id=since_booking_id):
+        try:
+            yield Booking.from_db_record(record)
+        except Exception as e:
+            booking_id = getattr(record, 'booking_id', None)
+            logger.error(f"Error processing booking record {booking_id}: {e}")
+            if progress is not None and booking_id is not None:
+                progress.record_unreadable(booking_id)
+
+
+def fetch_bookings_to_sync(head_office_conn, sql_conn, campground_id=1, full_resync=False, progress=None,
+                           stream_conn=None, arraysize=1000):
+    """
+    Fetches the Head Office bookings that have not been processed yet.
+
+    The last processed booking_id is kept in the local SQL database, so a normal
+    run only fetches bookings created since the previous run, plus the bookings
+    earlier runs could not store. The new bookings are streamed a chunk at a
+    time rather than loaded into a list, so memory stays flat however many there are.
+
+    :param head_office_conn: Connection to the Head Office database.
+    :param sql_conn: Connection to the local SQL database holding the watermark (None forces a full fetch).
+    :param campground_id: The Head Office campground ID to fetch bookings for.
+    :param full_resync: If True, ignore the watermark and fetch every booking.
+    :param progress: Optional SyncProgress; it is given the watermark and the IDs being retried.
+    :param stream_conn: Optional second Head Office connection to stream over, so head_office_conn stays
+                        free for inserts while the stream is open (defaults to head_office_conn).
+    :param arraysize: Number of rows fetched from the database per round trip.
+    :return: Tuple of (generator of Booking objects, watermark used or None for a full fetch,
+             earliest arrival date of the fetched bookings or None for a full fetch).
+    """
+    since_booking_id = None
+    retry_ids = []
+    if sql_conn is not None:
+        retry_ids = get_sync_retries(sql_conn, campground_id) or []
+        if not full_resync:
+            since_booking_id = get_sync_watermark(sql_conn, campground_id)
+    if progress is not None:
+        progress.since_booking_id = since_booking_id
+        progress.retry_ids = set(retry_ids)
+
+    if since_booking_id is None:
+        logger.info("Full sync: streaming every booking from Head Office.")
+        return stream_and_prepare_bookings(stream_conn or head_office_conn, campground_id, arraysize,
+                                           progress=progress), None, None
+
+    # Retried bookings are few, so they are fetched up front; the new ones are streamed after them
+    retry_bookings = []
+    if retry_ids:
+        for record in fetch_bookings_by_ids(head_office_conn, retry_ids, campground_id):
+            try:
+                retry_bookings.append(Booking.from_db_record(record))
+            except Exception as e:
+                booking_id = getattr(record, 'booking_id', None)
+                logger.error(f"Error processing booking record {booking_id}: {e}")
+                if progress is not None and booking_id is not None:
+                    progress.record_unreadable(booking_id)
+
+    arrivals = [booking.arrival_date.date() for booking in retry_bookings]
+    earliest_new_arrival = fetch_earliest_arrival_date(head_office_conn, campground_id, since_booking_id)
+    if isinstance(earliest_new_arrival, datetime):
+        earliest_new_arrival = earliest_new_arrival.date()
+    if earliest_new_arrival is not None:
+        arrivals.append(earliest_new_arrival)
+
+    logger.info(f"Incremental sync: streaming bookings newer than booking {since_booking_id} "
+                f"after {len(retry_bookings)} left to retry.")
+    bookings = itertools.chain(retry_bookings, stream_and_prepare_bookings(
+        stream_conn or head_office_conn, campground_id, arraysize, since_booking_id, progress))
+    return bookings, since_booking_id, min(arrivals, default=None)
+
+
+def restore_existing_allocations(campsites, cosmos_conn, earliest_arrival):
+    """
+    Seeds the campsites with allocations stored by earlier runs that could clash with the new bookings.
+
+    Needed for incremental runs: the new bookings must not be given campsites
+    that earlier bookings already hold.
+
+    :param campsites: List of Campsite objects.
+    :param cosmos_conn: Connection to the Cosmos DB Bookings container.
+    :param earliest_arrival: Earliest arrival date of the bookings about to be allocated
+                             (as returned by fetch_bookings_to_sync; None seeds nothing).
+    :return: Number of campsite periods seeded.
+    """
+    if earliest_arrival is None:
+        return 0
+    allocations = fetch_campsite_allocations(cosmos_conn, earliest_arrival - timedelta(days=7))
+    if allocations is None:
+        logger.warning("Stored allocations could not be read; new bookings may be given campsites that are already taken.")
+        return 0
+    return seed_campsite_allocations(campsites, allocations)
+
+
+def refresh_occupancy_calendar(campsites, cosmos_conn, path, full_resync=False):
+    """
+    Brings the cached occupancy calendar up to date after a sync run and saves it.
+
+    The campsites of an incremental run only hold this run's allocations (plus
+    the recent ones seeded by restore_existing_allocations), so they are marked
+    into the saved calendar instead of replacing it. A full resync, or a run
+    without a saved calendar, rebuilds it from every allocation stored in
+    Cosmos DB. If those cannot be read the saved file is left as it is; it is
+    never replaced by a partial view.
+
+    :param campsites: List of Campsite objects after the run.
+    :param cosmos_conn: Connection to the Cosmos DB Bookings container.
+    :param path: Path of the calendar cache file.
+    :param full_resync: If True, rebuild from the stored allocations even when a saved calendar exists.
+    :return: The updated OccupancyCalendar, or None if it could not be rebuilt.
+    """
+    calendar = None if full_resync else OccupancyCalendar.load(path)
+    if calendar is None:
+        allocations = fetch_campsite_allocations(cosmos_conn)
+        if allocations is None:
+            logger.error(f"Stored allocations could not be read; keeping the occupancy calendar at {path} as it is.")
+            return None
+        calendar = OccupancyCalendar([(campsite.site_number, campsite.size) for campsite in campsites])
+        calendar.mark_allocations(allocations)
+    else:
+        calendar.mark_campsites(campsites)
+    calendar.save(path)
+    return calendar
+
+
+def save_sync_watermark(sql_conn, campground_id, progress):
+    """
+    Advances the watermark past the bookings fetched by this run.
+
+    The bookings that were not stored are saved to the retry list first, and
+    the watermark only moves once that succeeded, so no booking is skipped.
+    If some fetched bookings never had their outcome recorded (the run was cut
+    short), the watermark stays where it was and the whole range is fetched again.
+
+    :param sql_conn: Connection to the local SQL database.
+    :param campground_id: The Head Office campground ID.
+    :param progress: SyncProgress of the run.
+    :return: True if the retry list and watermark were saved, False if there was nothing to save or saving failed.
+    """
+    if progress.max_booking_id is None or sql_conn is None:
+        return False
+    if progress.recorded < progress.fetched:
+        logger.error(f"Only {progress.recorded} of {progress.fetched} fetched bookings were processed; "
+                     f"keeping the sync watermark so they are fetched again.")
+        return False
+    if progress.unallocated:
+        logger.warning(f"{progress.unallocated} bookings had no free campsite and will not be retried.")
+    if progress.failed:
+        logger.warning(f"{len(progress.failed)} bookings were not stored and will be retried next run.")
+    if not update_sync_retries(sql_conn, campground_id, progress.failed, progress.resolved):
+        return False
+    if progress.since_booking_id is not None and progress.max_booking_id <= progress.since_booking_id:
+        return True  # Only retried bookings were fetched, the watermark stays where it is
+    return update_sync_watermark(sql_conn, campground_id, progress.max_booking_id, progress.latest_booking_date.date())
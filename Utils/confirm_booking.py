@@ -1,7 +1,21 @@
+import hashlib
+import json
 import os
 from fpdf import FPDF
-from Database.cosmosDB import connect_to_cosmos, upsert_booking_pdf_to_cosmos
-from Utils.logger_config import logger
+from Database.cosmosDB import connect_to_cosmos, upsert_booking_pdf_to_cosmos, upsert_booking_pdf_bytes_to_cosmos, \
+    fetch_booking_pdf_hash
+from Utils.logger_config import logger, booking_logger
+from Utils.pdf_template import cached_template
+
+# Default directory for confirmation PDFs kept on disk
+PDF_DIRECTORY = "pdfs"
+
+# Variable fields of the BookingPDFGenerator layout, also hashed to key cached confirmations
+# (pdf_generator.CONFIRMATION_FIELDS belongs to PDFGenerator's layout, which also prints the total cost)
+BOOKING_CONFIRMATION_FIELDS = ('booking_id', 'customer_name', 'arrival_date', 'campsite_size', 'num_campsites')
+
+# Bump when the confirmation layout changes so every cached PDF is regenerated
+CONFIRMATION_LAYOUT_VERSION = 1
 
 def ensure_directory_exists(directory):
     """
@@ -11,9 +25,9 @@ def ensure_directory_exists(directory):
     """
     if not os.path.exists(directory):
         os.makedirs(directory)
-        logger.info(f"Directory {directory} created.")
+        logger.info("Directory %s created.", directory)
     else:
-        logger.info(f"Directory {directory} already exists.")
+        booking_logger.debug("Directory %s already exists.", directory)  # Checked for every confirmation
 
 
 class BookingPDFGenerator:
@@ -29,10 +43,26 @@ class BookingPDFGenerator:
         """
         self.booking = booking
 
-    def create_pdf(self):
+    def fields(self):
         """
-        Create a PDF object using FPDF for the given booking details.
+        Returns the booking details printed on the confirmation.
+
+        :return: Dictionary of field -> value, keyed by BOOKING_CONFIRMATION_FIELDS.
+        """
+        return {
+            'booking_id': self.booking.booking_id,
+            'customer_name': self.booking.customer_name,
+            'arrival_date': self.booking.arrival_date.strftime('%Y-%m-%d'),
+            'campsite_size': self.booking.campsite_size,
+            'num_campsites': self.booking.num_campsites
+        }
+
+    @staticmethod
+    def build_pdf(fields):
+        """
+        Lays out a confirmation with FPDF.
 
+        :param fields: Dictionary of field -> value, keyed by BOOKING_CONFIRMATION_FIELDS.
         :return: An FPDF object representing the generated PDF.
         """
         pdf = FPDF()
@@ -40,29 +70,55 @@ class BookingPDFGenerator:
         pdf.add_page()
 
         pdf.set_font("Arial", "B", 12)
-        pdf.cell(200, 10, txt=f"Booking Confirmation - {self.booking.customer_name}", ln=True, align="C")
+        pdf.cell(200, 10, txt=f"Booking Confirmation - {fields['customer_name']}", ln=True, align="C")
 
         pdf.set_font("Arial", "", 12)
-        pdf.cell(200, 10, txt=f"Booking ID: {self.booking.booking_id}", ln=True)
-        pdf.cell(200, 10, txt=f"Customer Name: {self.booking.customer_name}", ln=True)
-        pdf.cell(200, 10, txt=f"Arrival Date: {self.booking.arrival_date.strftime('%Y-%m-%d')}", ln=True)
-        pdf.cell(200, 10, txt=f"Campsite Size: {self.booking.campsite_size}", ln=True)
-        pdf.cell(200, 10, txt=f"Number of Sites Booked: {self.booking.num_campsites}", ln=True)
+        pdf.cell(200, 10, txt=f"Booking ID: {fields['booking_id']}", ln=True)
+        pdf.cell(200, 10, txt=f"Customer Name: {fields['customer_name']}", ln=True)
+        pdf.cell(200, 10, txt=f"Arrival Date: {fields['arrival_date']}", ln=True)
+        pdf.cell(200, 10, txt=f"Campsite Size: {fields['campsite_size']}", ln=True)
+        pdf.cell(200, 10, txt=f"Number of Sites Booked: {fields['num_campsites']}", ln=True)
 
         return pdf
 
-    def save_pdf(self, directory):
+    def create_pdf(self):
+        """
+        Create a PDF object using FPDF for the given booking details.
+
+        :return: An FPDF object representing the generated PDF.
+        """
+        return self.build_pdf(self.fields())
+
+    def render_bytes(self):
+        """
+        Renders the PDF into memory, filling the cached confirmation template when it is available.
+
+        :return: The PDF content as bytes.
+        """
+        template = cached_template('confirmation', self.build_pdf, BOOKING_CONFIRMATION_FIELDS)
+        if template is not None:
+            return template.render(self.fields())
+
+        pdf_data = self.create_pdf().output(dest='S')
+        if isinstance(pdf_data, str):
+            pdf_data = pdf_data.encode('latin-1')  # PyFPDF 1.7 returns the document as a latin-1 string
+        return bytes(pdf_data)
+
+    def save_pdf(self, directory, pdf_bytes=None):
         """
         Saves the generated PDF to the specified directory.
 
         :param directory: The directory where the PDF will be saved.
+        :param pdf_bytes: PDF content already rendered by render_bytes (optional; rendered here if not given).
         :return: The file path of the saved PDF.
         """
         ensure_directory_exists(directory)
         file_path = os.path.join(directory, f"confirmation_{self.booking.booking_id}.pdf")
-        pdf = self.create_pdf()
-        pdf.output(file_path)
-        logger.info(f"PDF saved at {file_path}")
+        if pdf_bytes is None:
+            pdf_bytes = self.render_bytes()
+        with open(file_path, 'wb') as pdf_file:
+            pdf_file.write(pdf_bytes)
+        booking_logger.info("PDF saved at %s", file_path)
         return file_path
 
 
@@ -76,24 +132,152 @@ def insert_pdf_to_cosmos(file_path, booking):
     try:
         cosmos_container = connect_to_cosmos("PDFs")
         upsert_booking_pdf_to_cosmos(cosmos_container, file_path, booking.booking_id, booking.campground_id)
-        logger.info(f"Successfully inserted PDF {file_path} into Cosmos DB for booking {booking.booking_id}.")
+        booking_logger.info("Successfully inserted PDF %s into Cosmos DB for booking %s.", file_path, booking.booking_id)
     except Exception as e:
         logger.error(f"Failed to insert PDF into Cosmos DB: {e}")
         raise
 
-def generate_booking_confirmation(booking):
+
+def insert_pdf_bytes_to_cosmos(pdf_bytes, booking, content_hash=None):
     """
-    Generates a booking confirmation PDF and inserts it into Cosmos DB.
+    Inserts a PDF rendered in memory into Cosmos DB.
+
+    :param pdf_bytes: The PDF content.
+    :param booking: The booking object to associate with the PDF.
+    :param content_hash: Optional confirmation_hash of the booking, stored with the PDF.
+    :return: True if the PDF was stored, False otherwise.
+    """
+    try:
+        cosmos_container = connect_to_cosmos("PDFs")
+        stored = upsert_booking_pdf_bytes_to_cosmos(cosmos_container, pdf_bytes, booking.booking_id, booking.campground_id,
+                                                    content_hash=content_hash)
+        booking_logger.info("Successfully inserted PDF (%d bytes) into Cosmos DB for booking %s.", len(pdf_bytes), booking.booking_id)
+        return stored
+    except Exception as e:
+        logger.error(f"Failed to insert PDF into Cosmos DB: {e}")
+        raise
+
+
+def confirmation_hash(booking):
+    """
+    Hashes the booking fields printed on the confirmation, so an unchanged booking maps to the same PDF.
 
     :param booking: Booking object containing the booking details.
+    :return: Hex SHA-256 digest.
+    """
+    booking_data = booking.to_dict()
+    fields = {field: booking_data[field] for field in BOOKING_CONFIRMATION_FIELDS}
+    fields['layout_version'] = CONFIRMATION_LAYOUT_VERSION
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _confirmation_cache_path(pdf_path):
+    """
+    Returns the path of the file recording the hash and upload state of a saved confirmation.
+
+    :param pdf_path: Path to the PDF file.
+    """
+    return f"{pdf_path}.cache.json"
+
+
+def read_confirmation_cache(pdf_path, content_hash):
+    """
+    Checks whether a saved confirmation was rendered from the same booking fields.
+
+    :param pdf_path: Path to the PDF file.
+    :param content_hash: confirmation_hash of the booking.
+    :return: Dictionary with the 'uploaded' flag if the PDF can be reused, None otherwise.
     """
     try:
-        pdf_generator = BookingPDFGenerator(booking)
-        pdf_directory = "pdfs"
-        pdf_path = pdf_generator.save_pdf(pdf_directory)
+        with open(_confirmation_cache_path(pdf_path)) as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    if cache.get('hash') != content_hash or not os.path.exists(pdf_path):
+        return None
+    return cache
+
+
+def write_confirmation_cache(pdf_path, content_hash, uploaded):
+    """
+    Records the hash and upload state of a saved confirmation.
+
+    :param pdf_path: Path to the PDF file.
+    :param content_hash: confirmation_hash of the booking.
+    :param uploaded: True once Cosmos DB holds the PDF for this hash.
+    """
+    with open(_confirmation_cache_path(pdf_path), 'w') as cache_file:
+        json.dump({'hash': content_hash, 'uploaded': bool(uploaded)}, cache_file)
+
+
+def prepare_confirmation(booking, pdf_directory=PDF_DIRECTORY):
+    """
+    Renders a booking confirmation unless an identical one is already saved. Does no network I/O.
+
+    :param booking: Booking object containing the booking details.
+    :param pdf_directory: Directory to keep a copy of the PDF in (None skips the disk entirely).
+    :return: Tuple of (file path or None, PDF bytes or None if reused from disk, content hash, uploaded flag).
+    """
+    pdf_generator = BookingPDFGenerator(booking)
+    content_hash = confirmation_hash(booking)
+    pdf_path = os.path.join(pdf_directory, f"confirmation_{booking.booking_id}.pdf") if pdf_directory else None
+
+    cache = read_confirmation_cache(pdf_path, content_hash) if pdf_path else None
+    if cache is not None:
+        booking_logger.info("Confirmation for booking %s is unchanged, reusing %s.", booking.booking_id, pdf_path)
+        return pdf_path, None, content_hash, cache['uploaded']
+
+    pdf_bytes = pdf_generator.render_bytes()
+    if pdf_path:
+        pdf_generator.save_pdf(pdf_directory, pdf_bytes)
+        write_confirmation_cache(pdf_path, content_hash, uploaded=False)
+    return pdf_path, pdf_bytes, content_hash, False
+
+
+def publish_confirmation(booking, pdf_path, pdf_bytes, content_hash):
+    """
+    Uploads a confirmation to Cosmos DB unless the stored PDF already has the same content hash.
+
+    :param booking: The booking object to associate with the PDF.
+    :param pdf_path: Path to the saved PDF, used when pdf_bytes is None.
+    :param pdf_bytes: The PDF content, or None to read it from pdf_path.
+    :param content_hash: confirmation_hash of the booking.
+    :return: True if Cosmos DB holds the PDF for this hash, False otherwise.
+    """
+    cosmos_container = connect_to_cosmos("PDFs")
+    if fetch_booking_pdf_hash(cosmos_container, booking.booking_id, booking.campground_id) == content_hash:
+        booking_logger.info("PDF for booking %s is unchanged in Cosmos DB, skipping upload.", booking.booking_id)
+        stored = True
+    else:
+        if pdf_bytes is None:
+            with open(pdf_path, 'rb') as pdf_file:
+                pdf_bytes = pdf_file.read()
+        stored = insert_pdf_bytes_to_cosmos(pdf_bytes, booking, content_hash)
+    if pdf_path and stored:
+        write_confirmation_cache(pdf_path, content_hash, uploaded=True)
+    return stored
+
+
+def generate_booking_confirmation(booking, pdf_directory=PDF_DIRECTORY):
+    """
+    Generates a booking confirmation PDF and inserts it into Cosmos DB.
 
-        # Insert the PDF into Cosmos DB
-        insert_pdf_to_cosmos(pdf_path, booking)
+    The PDF is rendered once into memory and uploaded from there; writing a copy
+    to disk is optional, so this also works on read-only or ephemeral containers.
+    Confirmations are keyed by a hash of the booking fields they print: an
+    unchanged booking reuses its saved PDF, and the upload is skipped when
+    Cosmos DB already holds the PDF for the same hash.
+
+    :param booking: Booking object containing the booking details.
+    :param pdf_directory: Directory to keep a copy of the PDF in (None skips the disk entirely).
+    :return: The file path of the saved PDF, or None if it was not written to disk.
+    """
+    try:
+        pdf_path, pdf_bytes, content_hash, uploaded = prepare_confirmation(booking, pdf_directory)
+        if not uploaded:
+            publish_confirmation(booking, pdf_path, pdf_bytes, content_hash)
+        return pdf_path
 
     except Exception as e:
         logger.error(f"An error occurred during confirmation generation for booking {booking.booking_id}: {e}")
+        return None
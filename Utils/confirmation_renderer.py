@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from Utils.confirm_booking import prepare_confirmation, publish_confirmation, PDF_DIRECTORY
+from Utils.logger_config import logger
+
+
+def render_confirmation(booking, directory=PDF_DIRECTORY):
+    """
+    Renders a booking confirmation PDF in memory and optionally saves it. Runs inside a worker process.
+
+    :param booking: Booking object containing the booking details.
+    :param directory: The directory where the PDF will be saved (None keeps it in memory only).
+    :return: Tuple of (file path or None, PDF bytes or None if reused from disk, content hash, uploaded flag).
+    """
+    return prepare_confirmation(booking, directory)
+
+
+class ConfirmationRenderer:
+    """
+    Renders booking confirmations on a pool of worker processes.
+
+    FPDF rendering is CPU-bound Python, so threads would only take turns on the
+    GIL; separate processes let it scale with the number of cores. submit()
+    returns immediately, so the allocation loop never waits on PDF output.
+    Each finished PDF comes back as bytes and is uploaded to Cosmos DB from a
+    small thread pool in this process, keeping the Cosmos client out of the workers.
+    Confirmations already saved and uploaded for the same booking fields are
+    neither rendered nor uploaded again.
+    """
+
+    def __init__(self, workers=None, directory=PDF_DIRECTORY, upload=True, upload_workers=4):
+        """
+        Starts the worker pools.
+
+        :param workers: Number of rendering processes (defaults to the number of CPUs).
+        :param directory: The directory where the PDFs will be saved (None keeps them in memory only).
+        :param upload: If True, upload each rendered PDF to Cosmos DB.
+        :param upload_workers: Number of threads uploading rendered PDFs.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.directory = directory
+        self.upload = upload
+        self.render_pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.upload_pool = ThreadPoolExecutor(max_workers=upload_workers) if upload else None
+        self.submitted = 0
+        self.rendered = 0
+        self.uploaded = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    def submit(self, booking):
+        """
+        Queues a booking confirmation for rendering.
+
+        :param booking: Booking object containing the booking details.
+        :return: Future resolving to a tuple of (file path or None, PDF bytes or None, content hash, uploaded flag).
+        """
+        future = self.render_pool.submit(render_confirmation, booking, self.directory)
+        self.submitted += 1
+        future.add_done_callback(lambda done: self._rendered(done, booking))
+        return future
+
+    def _rendered(self, future, booking):
+        """
+        Counts a finished render and hands the PDF to the upload pool.
+
+        :param future: The finished rendering future.
+        :param booking: The booking the PDF belongs to.
+        """
+        error = future.exception()
+        if error is not None:
+            with self.lock:
+                self.failed += 1
+            logger.error(f"An error occurred during confirmation generation for booking {booking.booking_id}: {error}")
+            return
+        pdf_path, pdf_bytes, content_hash, uploaded = future.result()
+        with self.lock:
+            if uploaded:
+                self.unchanged += 1
+            else:
+                self.rendered += 1
+        if self.upload_pool is not None and not uploaded:
+            self.upload_pool.submit(self._upload, booking, pdf_path, pdf_bytes, content_hash)
+
+    def _upload(self, booking, pdf_path, pdf_bytes, content_hash):
+        """
+        Uploads a rendered PDF to Cosmos DB unless it is already stored for the same content hash.
+
+        :param booking: The booking the PDF belongs to.
+        :param pdf_path: Path to the saved PDF, or None.
+        :param pdf_bytes: The PDF content returned by the worker, or None if reused from disk.
+        :param content_hash: confirmation_hash of the booking.
+        """
+        try:
+            stored = publish_confirmation(booking, pdf_path, pdf_bytes, content_hash)
+            with self.lock:
+                if stored:
+                    self.uploaded += 1
+                else:
+                    self.failed += 1
+        except Exception as e:
+            with self.lock:
+                self.failed += 1
+            logger.error(f"Failed to upload the confirmation for booking {booking.booking_id}: {e}")
+
+    def close(self):
+        """
+        Waits for every queued confirmation to be rendered and uploaded, then stops the pools.
+
+        :return: Report dictionary with the confirmation counts and elapsed time.
+        """
+        self.render_pool.shutdown(wait=True)
+        if self.upload_pool is not None:
+            self.upload_pool.shutdown(wait=True)
+        elapsed = time.perf_counter() - self.started
+        report = {
+            'submitted': self.submitted,
+            'rendered': self.rendered,
+            'uploaded': self.uploaded,
+            'unchanged': self.unchanged,
+            'failed': self.failed,
+            'elapsed_seconds': elapsed
+        }
+        logger.info(f"Rendered {self.rendered}/{self.submitted} confirmations on {self.workers} processes "
+                    f"in {elapsed:.3f}s ({self.unchanged} unchanged, {self.failed} failed).")
+        return report
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,5 +1,11 @@
+import atexit
 import logging
+import multiprocessing
 import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
 
 # Ensure the Logs directory exists
 log_dir = os.path.join(os.path.dirname(__file__), 'Logs')
@@ -20,15 +26,125 @@ console_handler.setLevel(logging.WARNING)  # Logs WARNING and above to the conso
 console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 console_handler.setFormatter(console_formatter)
 
+# Asynchronous logging: the application only puts records on a queue and a background thread
+# writes them to the file and console. Set CAMPGROUND_ASYNC_LOGGING=0 to write synchronously.
+ASYNC_LOGGING = os.environ.get('CAMPGROUND_ASYNC_LOGGING', '1') != '0'
+
+# Our log format does not use the caller's file and line or the thread and process names.
+# Set CAMPGROUND_LOG_MINIMAL_RECORDS=1 to skip collecting them for every record. The switches
+# are process-wide, so only use it when no other library's handlers print those fields.
+if os.environ.get('CAMPGROUND_LOG_MINIMAL_RECORDS', '0') == '1':
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+# Per-booking messages: each message is logged at most BOOKING_LOG_BURST times every
+# BOOKING_LOG_INTERVAL seconds, then one in BOOKING_LOG_SAMPLE_EVERY is kept
+BOOKING_LOG_BURST = 200
+BOOKING_LOG_INTERVAL = 60.0
+BOOKING_LOG_SAMPLE_EVERY = 100
+
+log_queue = queue.SimpleQueue()
+log_listener = None
+
+
+def stop_logging():
+    """
+    Writes out the queued log records and stops the background writer thread.
+    """
+    global log_listener
+    if log_listener is not None:
+        listener, log_listener = log_listener, None
+        listener.stop()
+
+
+def _write_directly():
+    """
+    Switches this process to writing log records synchronously.
+
+    A forked child inherits the queue handler but not the writer thread, so
+    records it queued would never be written.
+    """
+    global log_listener
+    log_listener = None
+    logging.getLogger().handlers = [file_handler, console_handler]
+
+
+# Worker processes write directly; only the main process runs the writer thread
+if ASYNC_LOGGING and multiprocessing.parent_process() is None:
+    log_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(stop_logging)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Timestamps and levels are added by the writer's handlers
+    log_handlers = [queue_handler]
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_write_directly)
+else:
+    log_handlers = [file_handler, console_handler]
+
 # Configure the logging system
 logging.basicConfig(
     level=logging.INFO,  # Base logging level, INFO and above will be captured
-    handlers=[file_handler, console_handler]  # Add both file and console handlers
+    handlers=log_handlers  # The queue handler, or both file and console handlers
 )
 
+
+class SamplingFilter(logging.Filter):
+    """
+    Rate-limits messages that are logged once per booking.
+
+    Records are grouped by their unformatted message, so all "Booking %s
+    inserted" lines share one budget whatever the booking. Each message
+    passes BOOKING_LOG_BURST times per interval; after that only every
+    sample_every-th record is kept, noting how many were dropped. Warnings
+    and errors always pass. Dropped records are never formatted.
+    """
+
+    def __init__(self, burst=BOOKING_LOG_BURST, interval=BOOKING_LOG_INTERVAL, sample_every=BOOKING_LOG_SAMPLE_EVERY,
+                 clock=time.monotonic):
+        """
+        Initializes the filter.
+
+        :param burst: Records of each message passed per interval.
+        :param interval: Length of the interval in seconds.
+        :param sample_every: Past the burst, one record in this many is passed.
+        :param clock: Function returning the current time in seconds.
+        """
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.sample_every = sample_every
+        self.clock = clock
+        self.windows = {}  # (logger name, message) -> [interval start, records seen, records dropped]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        now = self.clock()
+        with self.lock:
+            window = self.windows.get((record.name, record.msg))
+            if window is None or now - window[0] >= self.interval:
+                window = self.windows[(record.name, record.msg)] = [now, 0, window[2] if window else 0]
+            window[1] += 1
+            if window[1] > self.burst and (window[1] - self.burst) % self.sample_every:
+                window[2] += 1
+                return False
+            dropped, window[2] = window[2], 0
+        if dropped:
+            record.msg = f"{record.msg} [{dropped} similar messages suppressed]"
+        return True
+
+
 # Create a logger instance for the application
 logger = logging.getLogger('CampgroundAppLogger')
 
+# Logger for messages repeated for every booking in a run, sampled once a message gets frequent
+booking_logger = logging.getLogger('CampgroundAppLogger.bookings')
+booking_logger.addFilter(SamplingFilter())
+
 # Suppress verbose logs from external libraries (e.g., Azure SDK, urllib3)
 logging.getLogger('azure.core.pipeline.policies.http_logging_policy').setLevel(logging.WARNING)
 logging.getLogger('azure.cosmos').setLevel(logging.WARNING)
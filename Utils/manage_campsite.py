@@ -1,4 +1,6 @@
+from datetime import datetime, timedelta
 from azure.cosmos import exceptions
+from models.booking import Booking
 from models.campsite import Campsite
 from Utils.logger_config import logger
 
@@ -35,4 +37,29 @@ def initialize_campsites():
     return campsites
 
 
+def seed_campsite_allocations(campsites, allocations):
+    """
+    Marks campsites as booked for allocations made in earlier runs.
+
+    Periods a campsite already holds are left as they are, so seeding the same
+    allocations twice is harmless.
+
+    :param campsites: List of Campsite objects.
+    :param allocations: List of (arrival_date, list of campsite numbers) tuples, e.g. from fetch_campsite_allocations.
+    :return: Number of campsite periods added.
+    """
+    campsites_by_number = {campsite.site_number: campsite for campsite in campsites}
+    seeded = 0
+    for arrival_date, site_numbers in allocations:
+        if isinstance(arrival_date, str):
+            arrival_date = datetime.strptime(arrival_date, '%Y-%m-%d')
+        start_date = Booking.adjust_to_saturday(arrival_date)
+        end_date = start_date + timedelta(days=7)
+        for site_number in site_numbers:
+            campsite = campsites_by_number.get(site_number)
+            if campsite and campsite.is_available(start_date, end_date):
+                campsite.book_campsite(start_date, end_date)
+                seeded += 1
 
+    logger.info(f"Seeded {seeded} existing campsite allocations.")
+    return seeded
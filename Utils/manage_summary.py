@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, date
 import logging
 import sys
 import os
@@ -7,20 +7,25 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from Database.sqlDB import connect_to_sql
 from Database.headOfficeDB import connect_to_head_office
 from models.summary import Summary
+from models.booking_batch import BookingBatch, SIZE_NAMES, UNALLOCATED, saturday_ordinal
 from Utils.pdf_generator import PDFGenerator
 from Database.cosmosDB import connect_to_cosmos, upsert_booking_pdf_to_cosmos
 from Utils.logger_config import logger
 
 
-def create_summary_object(bookings):
+def create_summary_object(bookings=None, summary_data=None):
     """
     Creates a Summary object from the provided bookings.
 
-    :param bookings: List of processed Booking objects.
+    :param bookings: List of processed Booking objects (or a BookingBatch); not needed when summary_data is given.
+    :param summary_data: Optional result of aggregate_bookings/generate_summary_report (or RunningSummary.report)
+                         for the same bookings, reused instead of aggregating again.
     :return: A Summary object containing total sales and booking count.
     """
-    total_sales = sum(booking.total_cost for booking in bookings if booking.campsite_id is not None)
-    total_bookings = len([booking for booking in bookings if booking.campsite_id is not None])
+    if summary_data is None:
+        summary_data = aggregate_bookings(bookings)
+    total_sales = summary_data['total_sales']
+    total_bookings = summary_data['successful_allocations']
 
     summary = Summary(
         campground_id=1159010,  # Your student ID as campground ID
@@ -170,24 +175,41 @@ def upload_summary_to_cosmos(pdf_path, summary):
         raise e
 
 
-def generate_summary_report(bookings, campsites):
+def _booking_rows(bookings):
     """
-    Generates a report summarizing booking allocations and campsite utilization.
+    Yields the fields the aggregation needs from either Booking objects or a BookingBatch.
 
-    :param bookings: List of Booking objects.
-    :param campsites: List of Campsite objects.
-    :return: Dictionary containing summary data.
+    :param bookings: List of Booking objects or a BookingBatch.
+    :return: Generator of (allocated campsites, total cost, size, arrival date ordinal) tuples.
     """
-    logger.info("Generating summary report from booking data.")
-
-    # Calculate total sales (only for successfully allocated bookings)
-    total_sales = sum(booking.total_cost for booking in bookings if booking.campsite_id is not None)
+    if isinstance(bookings, BookingBatch):
+        for row, (campsite_id, total_cost, size_code, arrival) in enumerate(
+                zip(bookings.campsite_ids, bookings.total_costs, bookings.size_codes, bookings.arrival_dates)):
+            allocations = () if campsite_id == UNALLOCATED else bookings.campsite_allocations(row)
+            yield allocations, total_cost, SIZE_NAMES.get(size_code), arrival
+    else:
+        for booking in bookings:
+            if booking.campsite_id is None:
+                allocations = ()
+            else:
+                allocations = booking.campsite_allocations or [booking.campsite_id]
+            yield allocations, booking.total_cost, booking.campsite_size, booking.arrival_date.toordinal()
+
+
+def aggregate_bookings(bookings, campsites=()):
+    """
+    Computes every summary figure in a single pass over the bookings.
 
-    # Count successful allocations (bookings with campsite_id) and failed allocations
-    successful_allocations = len([b for b in bookings if b.campsite_id is not None])
-    failed_allocations = len(bookings) - successful_allocations
+    Besides the totals, bookings are broken down by arrival day, by the week
+    (starting Saturday) their stay covers, by campsite size and by campsite.
 
-    # Initialize campsite utilization dictionary
+    :param bookings: List of Booking objects or a BookingBatch.
+    :param campsites: List of Campsite objects to report utilization for (optional).
+    :return: Dictionary containing summary data.
+    """
+    total_sales = 0
+    total_bookings = 0
+    successful_allocations = 0
     campsite_utilization = {
         campsite.site_number: {
             'size': campsite.size,
@@ -196,25 +218,66 @@ def generate_summary_report(bookings, campsites):
         }
         for campsite in campsites
     }
-
-    # Update campsite utilization based on bookings
-    for booking in bookings:
-        if booking.campsite_id is not None:  # Using dot notation
-            if booking.campsite_id in campsite_utilization:
-                campsite_utilization[booking.campsite_id]['bookings_count'] += 1
-
-
-    # Prepare summary data to be returned
-    summary_data = {
+    size_utilization = {}
+    for campsite in campsites:
+        totals = size_utilization.setdefault(campsite.size, {'campsites': 0, 'bookings': 0, 'sites_booked': 0, 'sales': 0})
+        totals['campsites'] += 1
+    daily = {}  # Arrival day ordinal -> totals
+    weekly = {}  # Week start ordinal -> totals
+
+    for allocations, total_cost, size, arrival in _booking_rows(bookings):
+        total_bookings += 1
+        if not allocations:
+            continue
+        successful_allocations += 1
+        total_sales += total_cost
+
+        for campsite_id in allocations:
+            site = campsite_utilization.get(campsite_id)
+            if site is not None:
+                site['bookings_count'] += 1
+
+        size_totals = size_utilization.setdefault(size, {'campsites': 0, 'bookings': 0, 'sites_booked': 0, 'sales': 0})
+        size_totals['bookings'] += 1
+        size_totals['sites_booked'] += len(allocations)
+        size_totals['sales'] += total_cost
+
+        for breakdown, key in ((daily, arrival), (weekly, saturday_ordinal(arrival))):
+            totals = breakdown.get(key)
+            if totals is None:
+                totals = breakdown[key] = {'bookings': 0, 'sites_booked': 0, 'sales': 0}
+            totals['bookings'] += 1
+            totals['sites_booked'] += len(allocations)
+            totals['sales'] += total_cost
+
+    return {
         'date': datetime.now().date(),
         'total_sales': total_sales,
-        'total_bookings': len(bookings),
+        'total_bookings': total_bookings,
         'successful_allocations': successful_allocations,
-        'failed_allocations': failed_allocations,
-        'campsite_utilization': campsite_utilization
+        'failed_allocations': total_bookings - successful_allocations,
+        'campsite_utilization': campsite_utilization,
+        'size_utilization': size_utilization,
+        'daily': {date.fromordinal(day): totals for day, totals in sorted(daily.items())},
+        'weekly': {date.fromordinal(week): totals for week, totals in sorted(weekly.items())}
     }
 
-    logger.info(f"Summary Data: {summary_data}")
+
+def generate_summary_report(bookings, campsites):
+    """
+    Generates a report summarizing booking allocations and campsite utilization.
+
+    :param bookings: List of Booking objects (or a BookingBatch).
+    :param campsites: List of Campsite objects.
+    :return: Dictionary containing summary data, including per-day, per-week and per-size breakdowns.
+    """
+    logger.info("Generating summary report from booking data.")
+
+    summary_data = aggregate_bookings(bookings, campsites)
+
+    logger.info(f"Summary Data: total sales {summary_data['total_sales']}, "
+                f"{summary_data['successful_allocations']} allocated, {summary_data['failed_allocations']} failed, "
+                f"{len(summary_data['weekly'])} weeks.")
     return summary_data
 
 def display_summary(summary_data):
@@ -0,0 +1,51 @@
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.booking import Booking
+from Utils.confirm_booking import BookingPDFGenerator
+
+
+def sample_bookings(count):
+    """
+    Creates bookings with varied names, dates and sizes for benchmarking.
+
+    :param count: Number of bookings.
+    :return: List of Booking objects.
+    """
+    sizes = ['Small', 'Medium', 'Large']
+    return [Booking(booking_id=100000 + n, customer_id=n, booking_date=datetime(2024, 1, 1),
+                    arrival_date=datetime(2024, 6, 1) + timedelta(days=n % 120), campsite_size=sizes[n % 3],
+                    num_campsites=1 + n % 3, customer_name=f"Customer {n} O'Brien-Smith")
+            for n in range(count)]
+
+
+def benchmark_confirmations(count=1000):
+    """
+    Times confirmation rendering with a full FPDF layout per document and with the cached template.
+
+    :param count: Number of confirmations to render each way.
+    :return: Dictionary with the per-document time of each approach in milliseconds and the speedup.
+    """
+    generators = [BookingPDFGenerator(booking) for booking in sample_bookings(count)]
+
+    started = time.perf_counter()
+    for generator in generators:
+        generator.create_pdf().output(dest='S')
+    full_ms = (time.perf_counter() - started) * 1000 / count
+
+    generators[0].render_bytes()  # Build the template outside the timed loop
+    started = time.perf_counter()
+    for generator in generators:
+        generator.render_bytes()
+    template_ms = (time.perf_counter() - started) * 1000 / count
+
+    return {'documents': count, 'full_ms': full_ms, 'template_ms': template_ms,
+            'speedup': full_ms / template_ms if template_ms else 0.0}
+
+
+if __name__ == '__main__':
+    results = benchmark_confirmations(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+    print(f"{results['documents']} confirmations: full render {results['full_ms']:.3f} ms/doc, "
+          f"template {results['template_ms']:.3f} ms/doc ({results['speedup']:.1f}x faster)")
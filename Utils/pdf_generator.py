@@ -1,10 +1,15 @@
 import os
 from fpdf import FPDF
 from Utils.logger_config import logger
+from Utils.pdf_template import cached_template
 
 # Define the folder to save PDFs
 PDF_FOLDER = "pdfs"
 
+# Variable fields of the confirmation and summary layouts
+CONFIRMATION_FIELDS = ('customer_name', 'booking_id', 'arrival_date', 'campsite_size', 'num_campsites', 'total_cost')
+SUMMARY_FIELDS = ('campground_id', 'summary_date', 'total_sales', 'total_bookings')
+
 # Ensure the folder exists
 def ensure_pdf_folder_exists():
     """
@@ -71,6 +76,46 @@ class PDFGenerator(FPDF):
         logger.info(f"PDF saved as {filename}")
         return filename
 
+    def save_bytes(self, filename, pdf_bytes):
+        """
+        Saves a PDF rendered from a template to a specified file.
+
+        :param filename: The full path where the PDF will be saved.
+        :param pdf_bytes: The PDF content.
+        """
+        with open(filename, 'wb') as pdf_file:
+            pdf_file.write(pdf_bytes)
+        logger.info(f"PDF saved as {filename}")
+        return filename
+
+    def _template(self, kind, draw, fields):
+        """
+        Returns the cached template for one of this generator's layouts.
+
+        :param kind: Name of the layout.
+        :param draw: Unbound drawing method, e.g. PDFGenerator.draw_summary.
+        :param fields: Names of the variable fields.
+        :return: PDFTemplate object, or None if the layout cannot be templated.
+        """
+        return cached_template((kind, self.title), lambda values: draw(PDFGenerator(self.title), values), fields)
+
+    def draw_confirmation(self, fields):
+        """
+        Adds the booking confirmation lines to the page.
+
+        :param fields: Dictionary of field -> value, keyed by CONFIRMATION_FIELDS.
+        :return: The PDFGenerator itself.
+        """
+        self.set_title("Booking Confirmation")
+        self.add_content_line("Booking Confirmation", fields['customer_name'])
+        self.add_content_line("Booking ID", fields['booking_id'])
+        self.add_content_line("Customer", fields['customer_name'])
+        self.add_content_line("Arrival Date", fields['arrival_date'])
+        self.add_content_line("Campsite Size", fields['campsite_size'])
+        self.add_content_line("Total Sites Booked", fields['num_campsites'])
+        self.add_content_line("Total Cost", fields['total_cost'])
+        return self
+
     def generate_confirmation(self, booking):
         """
         Generates a booking confirmation PDF.
@@ -78,19 +123,38 @@ class PDFGenerator(FPDF):
         :param booking: The Booking object containing booking details.
         :return: The file path to the saved confirmation PDF.
         """
-        self.set_title("Booking Confirmation")
-        self.add_content_line("Booking Confirmation", booking.customer_name)
-        self.add_content_line("Booking ID", booking.booking_id)
-        self.add_content_line("Customer", booking.customer_name)
-        self.add_content_line("Arrival Date", booking.arrival_date.strftime('%Y-%m-%d'))
-        self.add_content_line("Campsite Size", booking.campsite_size)
-        self.add_content_line("Total Sites Booked", booking.num_campsites)
-        self.add_content_line("Total Cost", booking.total_cost, currency=True)
-
-        # Define the filename and save the PDF
+        fields = {
+            'customer_name': booking.customer_name,
+            'booking_id': booking.booking_id,
+            'arrival_date': booking.arrival_date.strftime('%Y-%m-%d'),
+            'campsite_size': booking.campsite_size,
+            'num_campsites': booking.num_campsites,
+            'total_cost': f"${booking.total_cost:.2f}"
+        }
+
+        # Define the filename and save the PDF, filling the cached template when it is available
         filename = os.path.join(PDF_FOLDER, f"confirmation_{booking.booking_id}.pdf")
+        template = self._template('confirmation', PDFGenerator.draw_confirmation, CONFIRMATION_FIELDS)
+        if template is not None:
+            return self.save_bytes(filename, template.render(fields))
+        self.draw_confirmation(fields)
         return self.save_pdf(filename)
 
+    def draw_summary(self, fields):
+        """
+        Adds the daily summary lines to the page.
+
+        :param fields: Dictionary of field -> value, keyed by SUMMARY_FIELDS.
+        :return: The PDFGenerator itself.
+        """
+        self.set_title("Daily Summary Report")
+        self.add_content_line("Daily Summary Report", "")
+        self.add_content_line("Campground ID", fields['campground_id'])
+        self.add_content_line("Summary Date", fields['summary_date'])
+        self.add_content_line("Total Sales", fields['total_sales'])
+        self.add_content_line("Total Bookings", fields['total_bookings'])
+        return self
+
     def generate_summary(self, summary):
         """
         Generates a summary PDF for a day's bookings.
@@ -98,18 +162,22 @@ class PDFGenerator(FPDF):
         :param summary: The Summary object containing summary details.
         :return: The file path to the saved summary PDF.
         """
-        self.set_title("Daily Summary Report")
-        self.add_content_line("Daily Summary Report", "")
-        self.add_content_line("Campground ID", summary.campground_id)
-        self.add_content_line("Summary Date", summary.summary_date)
-        self.add_content_line("Total Sales", summary.total_sales, currency=True)
-        self.add_content_line("Total Bookings", summary.total_bookings)
+        fields = {
+            'campground_id': summary.campground_id,
+            'summary_date': summary.summary_date,
+            'total_sales': f"${summary.total_sales:.2f}",
+            'total_bookings': summary.total_bookings
+        }
     
         # Properly format the summary date to avoid invalid characters
         formatted_date = summary.summary_date.strftime('%Y-%m-%d')  # Remove time or format it correctly if necessary
     
-        # Define the filename and save the PDF
+        # Define the filename and save the PDF, filling the cached template when it is available
         filename = os.path.join(PDF_FOLDER, f"summary_{formatted_date}.pdf")
+        template = self._template('summary', PDFGenerator.draw_summary, SUMMARY_FIELDS)
+        if template is not None:
+            return self.save_bytes(filename, template.render(fields))
+        self.draw_summary(fields)
         return self.save_pdf(filename)
 
 
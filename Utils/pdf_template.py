@@ -0,0 +1,326 @@
+"""
+Fills a confirmation-style PDF layout without laying it out again with FPDF.
+
+A PDFTemplate is drawn once with placeholder fields. Each render only swaps
+the field text into the saved page content stream. Two trade-offs come from
+patching the bytes rather than rendering:
+
+- The template is built uncompressed, because the placeholders must be
+  readable in the content stream. render() deflates the patched stream again
+  by default (compress=True), so the output is about the size of a full FPDF
+  render. The extra zlib pass per document is the price. Pass compress=False
+  to skip it and produce larger files. Fonts and other objects are copied
+  as FPDF wrote them.
+- Each render stamps the current time into /CreationDate. The timestamp keeps
+  its width, so no offsets move. Every other byte outside the content stream
+  is the template's, including the document /ID that fpdf2 writes. Documents
+  from one template therefore share that ID.
+
+Each template is checked once when it is built: a compressed render is parsed
+back (cross-reference offsets, stream lengths, deflated content) and the
+layout falls back to full FPDF rendering if anything does not line up.
+"""
+import re
+import threading
+import zlib
+from datetime import datetime, timezone
+from Utils.logger_config import logger
+
+# Text drawn by FPDF's cell(): "BT <x> <y> Td (<escaped text>) Tj ET"
+_TEXT_OP = re.compile(rb"BT ([\d.]+) ([\d.]+) Td \(((?:[^()\\]|\\.)*)\) Tj ET")
+_FONT_OP = re.compile(rb"/F(\d+) ([\d.]+) Tf")
+_STREAM = re.compile(rb"/Length (\d+)\s*>>\s*stream\r?\n")
+_XREF = re.compile(rb"\nxref\n0 (\d+)\n")
+_STARTXREF = re.compile(rb"startxref\n(\d+)")
+_FIELD = re.compile(rb"@@(\w+)@@")
+# FPDF writes the date as D:YYYYMMDDHHMMSS, followed by Z when it is in UTC (fpdf2)
+_CREATION_DATE = re.compile(rb"/CreationDate \(D:(\d{14})(Z?)")
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def _placeholder(field, padding=0):
+    """
+    Returns the token drawn in place of a field while building a template.
+
+    :param field: Field name.
+    :param padding: Extra characters used to tell left, centred and right aligned text apart.
+    :return: Placeholder text.
+    """
+    return f"@@{field}@@" + "@" * padding
+
+
+def escape_pdf_text(text):
+    """
+    Escapes text for a PDF literal string, as FPDF does.
+
+    :param text: The text to escape.
+    :return: Escaped text encoded as latin-1 bytes.
+    """
+    text = str(text).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)').replace('\r', '\\r')
+    return text.encode('latin-1', 'replace')
+
+
+def _unescape_pdf_text(data):
+    """
+    Reverses escape_pdf_text.
+
+    :param data: Escaped latin-1 bytes.
+    :return: The text.
+    """
+    return re.sub(rb"\\(.)", lambda match: b"\r" if match.group(1) == b"r" else match.group(1), data).decode('latin-1')
+
+
+def _measure(text, widths, size):
+    """
+    Measures text set in a core font.
+
+    :param text: The text.
+    :param widths: Character widths of the font, in thousandths of the font size.
+    :param size: Font size in points.
+    :return: Width of the text in points.
+    """
+    return sum(widths.get(char, 0) for char in text) * size / 1000
+
+
+def _output_uncompressed(pdf):
+    """
+    Serializes an FPDF document without compressing the page content.
+
+    :param pdf: FPDF object.
+    :return: The PDF as bytes.
+    """
+    pdf.set_compression(False)
+    data = pdf.output(dest='S')
+    if isinstance(data, str):
+        data = data.encode('latin-1')  # PyFPDF 1.7 returns the document as a latin-1 string
+    return bytes(data)
+
+
+def _check_document(data, content):
+    """
+    Parses a rendered document back to make sure PDF readers can open it.
+
+    :param data: The rendered PDF as bytes.
+    :param content: The uncompressed page content stream the document should hold.
+    :raises ValueError: If an offset, a stream length or the page content does not line up.
+    """
+    xref = _XREF.search(data)
+    startxref = _STARTXREF.search(data)
+    if xref is None or startxref is None or not data.startswith(b"xref\n", int(startxref.group(1))):
+        raise ValueError("startxref does not point at the cross-reference table")
+    for n in range(1, int(xref.group(1))):
+        entry = data[xref.end() + 20 * n:xref.end() + 20 * (n + 1)]
+        if entry[17:18] == b"n" and not data.startswith(b"%d 0 obj" % n, int(entry[:10])):
+            raise ValueError(f"cross-reference offset of object {n} is wrong")
+
+    found = False
+    for match in _STREAM.finditer(data):
+        start = match.end()
+        end = start + int(match.group(1))
+        if not data[end:end + 20].lstrip().startswith(b"endstream"):
+            raise ValueError("stream length does not match its data")
+        stream = data[start:end]
+        if b"/FlateDecode" in data[data.rfind(b"<<", 0, match.start()):match.start()]:
+            try:
+                stream = zlib.decompress(stream)
+            except zlib.error:
+                raise ValueError("compressed stream does not inflate")
+        found = found or stream == content
+    if not found:
+        raise ValueError("page content is missing from the rendered document")
+
+
+class PDFTemplate:
+    """
+    A document rendered once with placeholder fields, then filled in per document.
+
+    The build function draws the document with FPDF as usual. The result is
+    kept as bytes, and render() only substitutes the variable text into the
+    page content stream and fixes up the stream length and cross-reference
+    offsets. Fonts, page setup, header, footer and static labels are never
+    laid out again. Centred and right-aligned lines are re-positioned from the
+    font metrics, so the output matches a full FPDF render.
+    """
+
+    def __init__(self, build, fields, compress=True):
+        """
+        Builds and parses the template.
+
+        :param build: Function taking a dictionary of field -> text and returning the drawn FPDF object.
+        :param fields: Names of the variable fields.
+        :param compress: If True, render() deflates the page content stream as FPDF does by default.
+        :raises ValueError: If the document does not have the single-page layout the template relies on.
+        """
+        self.fields = tuple(fields)
+        self.compress = compress
+        pdf = build({field: _placeholder(field) for field in self.fields})
+        font_widths = {}
+        for font in pdf.fonts.values():
+            index, widths = (font['i'], font['cw']) if isinstance(font, dict) else (font.i, font.cw)
+            font_widths[index] = widths
+        document = _output_uncompressed(pdf)
+        padded = _output_uncompressed(build({field: _placeholder(field, 8) for field in self.fields}))
+
+        self._parse(document, padded, font_widths)
+        placeholders = {field: _placeholder(field) for field in self.fields}
+        if self._render(placeholders, False, False) != document:
+            raise ValueError("template does not reproduce the original document")
+        stream_start, stream_end = self._content_stream(document)[2:]
+        _check_document(self._render(placeholders, compress, True), document[stream_start:stream_end])
+
+    def _content_stream(self, document):
+        """
+        Locates the page content stream holding the placeholders.
+
+        :param document: The PDF as bytes.
+        :return: Tuple of (length digits start, length digits end, stream start, stream end).
+        """
+        for match in _STREAM.finditer(document):
+            start = match.end()
+            end = start + int(match.group(1))
+            if _FIELD.search(document, start, end):
+                return match.start(1), match.end(1), start, end
+        raise ValueError("no content stream with placeholders")
+
+    def _parse(self, document, padded, font_widths):
+        """
+        Splits the template document into static bytes and variable text operations.
+
+        :param document: The template rendered with the placeholders.
+        :param padded: The template rendered with longer placeholders.
+        :param font_widths: Dictionary of font index -> character widths.
+        """
+        length_start, length_end, stream_start, stream_end = self._content_stream(document)
+        padded_start, padded_end = self._content_stream(padded)[2:]
+        stream = document[stream_start:stream_end]
+        padded_ops = list(_TEXT_OP.finditer(padded[padded_start:padded_end]))
+        ops = list(_TEXT_OP.finditer(stream))
+        if len(ops) != len(padded_ops):
+            raise ValueError("page layout changes with the field values")
+
+        self.pieces = []  # Static bytes and (x, ratio, y, widths, size, static width, parts) text operations
+        position = 0
+        for op, padded_op in zip(ops, padded_ops):
+            parts = _FIELD.split(op.group(3))
+            if len(parts) == 1:
+                continue  # Static text stays in the surrounding bytes
+            fonts = list(_FONT_OP.finditer(stream, 0, op.start()))
+            if not fonts:
+                raise ValueError("text drawn before a font was selected")
+            widths, size = font_widths[int(fonts[-1].group(1))], float(fonts[-1].group(2))
+            width = self._text_width(parts, {field: _placeholder(field) for field in self.fields}, widths, size)
+            padded_width = self._text_width(parts, {field: _placeholder(field, 8) for field in self.fields}, widths, size)
+            # 0 for left aligned, -0.5 for centred, -1 for right aligned text
+            ratio = (float(padded_op.group(1)) - float(op.group(1))) / (padded_width - width) if padded_width != width else 0.0
+            self.pieces.append(stream[position:op.start()])
+            static_width = self._text_width(parts, {field: "" for field in self.fields}, widths, size)
+            self.pieces.append((float(op.group(1)) - ratio * width, ratio, op.group(2), widths, size, static_width, parts))
+            position = op.end()
+        self.pieces.append(stream[position:])
+
+        self.head = document[:length_start]
+        self.between = document[length_end:stream_start]
+        xref = _XREF.search(document)
+        startxref = _STARTXREF.search(document)
+        if xref is None or startxref is None:
+            raise ValueError("no cross-reference table")
+        count = int(xref.group(1))
+        entries_start = xref.end()
+        self.body = document[stream_end:xref.start() + 1]  # Objects after the content stream
+        creation_date = _CREATION_DATE.search(self.body)
+        # Span of the date digits in the body and whether they are in UTC, or None if there is no date
+        self.creation_date = (creation_date.span(1), bool(creation_date.group(2))) if creation_date else None
+        self.xref_header = document[xref.start() + 1:entries_start]
+        self.entries = []  # Fixed entry bytes, or (offset, rest of entry) for objects after the content stream
+        for n in range(count):
+            entry = document[entries_start + 20 * n:entries_start + 20 * (n + 1)]
+            self.entries.append((int(entry[:10]), entry[10:]) if int(entry[:10]) > length_start else entry)
+        self.trailer = document[entries_start + 20 * count:startxref.start(1)]
+        self.startxref = int(startxref.group(1))
+        self.tail = document[startxref.end(1):]
+
+    @staticmethod
+    def _text_width(parts, values, widths, size):
+        """
+        Measures a line of text in points.
+
+        :param parts: Escaped static text alternating with field names, as split by _FIELD.
+        :param values: Dictionary of field -> text.
+        :param widths: Character widths of the font, in thousandths of the font size.
+        :param size: Font size in points.
+        :return: Width of the text in points.
+        """
+        text = "".join(str(values[part.decode()]) if n % 2 else _unescape_pdf_text(part) for n, part in enumerate(parts))
+        return _measure(text, widths, size)
+
+    def render(self, values):
+        """
+        Fills the template with one document's field values.
+
+        :param values: Dictionary of field -> value (converted with str()).
+        :return: The PDF as bytes.
+        """
+        return self._render(values, self.compress, True)
+
+    def _render(self, values, compress, refresh_date):
+        """
+        Fills the template with one document's field values.
+
+        :param values: Dictionary of field -> value (converted with str()).
+        :param compress: If True, deflate the page content stream.
+        :param refresh_date: If True, set /CreationDate to the current time instead of the template's.
+        :return: The PDF as bytes.
+        """
+        escaped = {field.encode(): escape_pdf_text(value) for field, value in values.items()}
+        chunks = []
+        for piece in self.pieces:
+            if isinstance(piece, bytes):
+                chunks.append(piece)
+                continue
+            x, ratio, y, widths, size, static_width, parts = piece
+            if ratio:
+                field_text = "".join(str(values[field.decode()]) for field in parts[1::2])
+                x += ratio * (static_width + _measure(field_text, widths, size))
+            text = b"".join(escaped[part] if n % 2 else part for n, part in enumerate(parts))
+            chunks.append(b"BT %.2f %s Td (%s) Tj ET" % (x, y, text))
+        stream = b"".join(chunks)
+
+        head = self.head
+        if compress:
+            stream = zlib.compress(stream)
+            head = head[:-len(b"/Length ")] + b"/Filter /FlateDecode /Length "
+        head += str(len(stream)).encode() + self.between + stream
+
+        body = self.body
+        if refresh_date and self.creation_date is not None:
+            (start, end), utc = self.creation_date
+            now = datetime.now(timezone.utc) if utc else datetime.now()
+            body = body[:start] + now.strftime('%Y%m%d%H%M%S').encode() + body[end:]  # Same width, offsets hold
+
+        startxref = len(head) + len(body)
+        shift = startxref - self.startxref  # Objects after the content stream move by this much
+        entries = b"".join(entry if isinstance(entry, bytes) else b"%010d%s" % (entry[0] + shift, entry[1])
+                           for entry in self.entries)
+        return b"".join((head, body, self.xref_header, entries, self.trailer, str(startxref).encode(), self.tail))
+
+
+def cached_template(key, build, fields):
+    """
+    Returns the template for a document layout, building it on first use.
+
+    :param key: Hashable name of the layout.
+    :param build: Function taking a dictionary of field -> text and returning the drawn FPDF object.
+    :param fields: Names of the variable fields.
+    :return: PDFTemplate object, or None if the layout cannot be templated (callers render in full).
+    """
+    if key not in _templates:
+        with _templates_lock:
+            if key not in _templates:
+                try:
+                    _templates[key] = PDFTemplate(build, fields)
+                except Exception as e:
+                    logger.warning(f"PDF template {key} unavailable, rendering documents in full: {e}")
+                    _templates[key] = None
+    return _templates[key]
@@ -1,7 +1,23 @@
+import csv
+import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from azure.cosmos import CosmosClient, exceptions
 from Utils.logger_config import logger
-from resources.db_config import get_cosmos_client  # Import the connection setup from db_config
+from resources.db_config import get_cosmos_container, close_cosmos_client  # Shared Cosmos DB client from db_config
+from Database.cosmosDB import read_booking_document, booking_partition_key
+from Database.name_index import get_booking_name_index
+
+# Most bookings shown for one customer name search
+MAX_NAME_RESULTS = 50
+
+# Batch mode: identifiers resolved per Cosmos DB query, and queries in flight at once
+BATCH_QUERY_SIZE = 100
+BATCH_QUERY_CONCURRENCY = 8
+
+# Columns written for each booking in batch mode
+BATCH_OUTPUT_FIELDS = ('query', 'found', 'booking_id', 'customer_name', 'arrival_date', 'campsite_size',
+                       'num_campsites', 'total_cost', 'campsite_allocations')
 
 # Connects to the Cosmos DB container using db_config
 def connect_to_cosmos(container_name):
@@ -12,9 +28,7 @@ def connect_to_cosmos(container_name):
     :return: The Cosmos DB container client.
     """
     try:
-        client = get_cosmos_client()  # Get the Cosmos client from db_config
-        database = client.get_database_client("CampsiteBookingsDB")  # Specify the database name here
-        container = database.get_container_client(container_name)
+        container = get_cosmos_container(container_name)  # Cached container from the shared client
         logger.info(f"Connected to Cosmos DB container: {container_name}")
         return container
     except exceptions.CosmosHttpResponseError as e:
@@ -22,20 +36,46 @@ def connect_to_cosmos(container_name):
         print("Failed to connect to Cosmos DB. Please check your configuration.")
         sys.exit(1)
 
+# Function to find bookings by customer name
+def search_bookings_by_name(cosmos_container, name, name_index=None):
+    """
+    Finds bookings whose customer name contains the given text, ignoring case.
+
+    Matching bookings are looked up in the local name index and then fetched
+    with point reads. Until the index has been built (see --rebuild-index),
+    the search falls back to scanning Cosmos DB.
+
+    :param cosmos_container: The Cosmos DB Bookings container.
+    :param name: Part of a customer name.
+    :param name_index: BookingNameIndex to search (defaults to the shared one).
+    :return: List of booking documents.
+    """
+    name_index = name_index or get_booking_name_index()
+    if name_index.count() == 0:
+        logger.warning("The booking name index is empty, searching Cosmos DB instead. Run with --rebuild-index to build it.")
+        query = "SELECT * FROM c WHERE CONTAINS(c.customer_name, @customer_name, true)"
+        parameters = [{"name": "@customer_name", "value": name}]
+        return list(cosmos_container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
+
+    items = []
+    for booking_id, campground_id in name_index.search(name, limit=MAX_NAME_RESULTS):
+        booking = read_booking_document(cosmos_container, booking_id, campground_id)
+        if booking:
+            items.append(booking)
+        else:
+            name_index.remove(booking_id, campground_id)  # Deleted elsewhere, drop the stale entry
+    return items
+
 # Function to retrieve booking details by booking ID or customer name
 def retrieve_booking(cosmos_container, identifier):
     try:
         if identifier.isdigit():
-            # Search by booking ID
-            query = "SELECT * FROM c WHERE c.booking_id = @booking_id"
-            parameters = [{"name": "@booking_id", "value": int(identifier)}]
+            # Look up by booking ID with a point read
+            booking = read_booking_document(cosmos_container, int(identifier))
+            items = [booking] if booking else []
         else:
-            # Search by customer name
-            query = "SELECT * FROM c WHERE CONTAINS(c.customer_name, @customer_name)"
-            parameters = [{"name": "@customer_name", "value": identifier}]
-
-        # Execute the query and retrieve the results
-        items = list(cosmos_container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
+            # Search by customer name through the local index
+            items = search_bookings_by_name(cosmos_container, identifier)
 
         if items:
             logger.info(f"Found {len(items)} bookings for identifier: {identifier}")
@@ -62,16 +102,208 @@ def retrieve_booking(cosmos_container, identifier):
         logger.error(f"An unexpected error occurred: {e}")
         print(f"An unexpected error occurred: {e}")
 
+def read_identifiers(lines):
+    """
+    Reads booking IDs and customer names, one per line, dropping blanks, # comments and duplicates.
+
+    :param lines: Iterable of lines, e.g. an open file or sys.stdin.
+    :return: List of unique identifiers in input order (IDs normalised, names compared ignoring case).
+    """
+    identifiers = []
+    seen = set()
+    for line in lines:
+        identifier = line.strip()
+        if not identifier or identifier.startswith('#'):
+            continue
+        if identifier.isdigit():
+            identifier = str(int(identifier))
+        key = identifier.casefold()
+        if key not in seen:
+            seen.add(key)
+            identifiers.append(identifier)
+    return identifiers
+
+def _query_booking_chunk(cosmos_container, campground_id, booking_ids):
+    """
+    Reads up to BATCH_QUERY_SIZE bookings of one campground with a single IN query on its partition.
+
+    :param cosmos_container: The Cosmos DB Bookings container.
+    :param campground_id: The campground (partition) the bookings are stored in.
+    :param booking_ids: List of booking IDs.
+    :return: List of booking documents found.
+    """
+    placeholders = ", ".join(f"@id{n}" for n in range(len(booking_ids)))
+    query = f"SELECT * FROM c WHERE c.booking_id IN ({placeholders})"
+    parameters = [{"name": f"@id{n}", "value": booking_id} for n, booking_id in enumerate(booking_ids)]
+    return list(cosmos_container.query_items(query=query, parameters=parameters, partition_key=campground_id))
+
+def fetch_bookings_by_keys(cosmos_container, keys):
+    """
+    Reads many bookings with batched IN queries, one partition at a time, several queries in flight.
+
+    :param cosmos_container: The Cosmos DB Bookings container.
+    :param keys: Iterable of (booking_id, campground_id) tuples.
+    :return: Dictionary of (booking_id, campground_id) -> booking document for the bookings found.
+    """
+    by_campground = {}
+    for booking_id, campground_id in keys:
+        by_campground.setdefault(booking_partition_key(campground_id), set()).add(booking_id)
+    chunks = []
+    for campground_id, booking_ids in by_campground.items():
+        booking_ids = sorted(booking_ids)
+        chunks.extend((campground_id, booking_ids[start:start + BATCH_QUERY_SIZE])
+                      for start in range(0, len(booking_ids), BATCH_QUERY_SIZE))
+
+    documents = {}
+    with ThreadPoolExecutor(max_workers=BATCH_QUERY_CONCURRENCY) as executor:
+        results = executor.map(lambda chunk: (chunk[0], _query_booking_chunk(cosmos_container, *chunk)), chunks)
+        for campground_id, items in results:
+            for item in items:
+                documents[(item['booking_id'], campground_id)] = item
+    logger.info(f"Read {len(documents)} bookings with {len(chunks)} batched queries.")
+    return documents
+
+def _match_names_in_cosmos(cosmos_container, names):
+    """
+    Finds the bookings of many customer names with grouped CONTAINS queries (used while the name index is empty).
+
+    :param cosmos_container: The Cosmos DB Bookings container.
+    :param names: List of customer names or parts of names.
+    :return: Dictionary of name -> list of (booking_id, campground_id) tuples.
+    """
+    matches = {name: [] for name in names}
+    for start in range(0, len(names), BATCH_QUERY_SIZE):
+        chunk = names[start:start + BATCH_QUERY_SIZE]
+        conditions = " OR ".join(f"CONTAINS(c.customer_name, @name{n}, true)" for n in range(len(chunk)))
+        query = f"SELECT c.booking_id, c.customer_name, c.campground_id FROM c WHERE {conditions}"
+        parameters = [{"name": f"@name{n}", "value": name} for n, name in enumerate(chunk)]
+        for item in cosmos_container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True):
+            customer_name = (item.get('customer_name') or '').casefold()
+            for name in chunk:
+                if name.casefold() in customer_name and len(matches[name]) < MAX_NAME_RESULTS:
+                    matches[name].append((item['booking_id'], item.get('campground_id')))
+    return matches
+
+def retrieve_bookings_batch(cosmos_container, identifiers, name_index=None):
+    """
+    Resolves many booking IDs and customer names with as few Cosmos DB round trips as possible.
+
+    Names are looked up in the local name index, then every booking, whether
+    asked for by ID or found by name, is read with batched IN queries.
+
+    :param cosmos_container: The Cosmos DB Bookings container.
+    :param identifiers: List of unique identifiers from read_identifiers.
+    :param name_index: BookingNameIndex to search (defaults to the shared one).
+    :return: List of (identifier, list of booking documents) tuples in input order.
+    """
+    names = [identifier for identifier in identifiers if not identifier.isdigit()]
+    name_index = name_index or get_booking_name_index()
+    if not names:
+        name_matches = {}
+    elif name_index.count():
+        name_matches = {name: name_index.search(name, limit=MAX_NAME_RESULTS) for name in names}
+    else:
+        logger.warning("The booking name index is empty, searching Cosmos DB instead. Run with --rebuild-index to build it.")
+        name_matches = _match_names_in_cosmos(cosmos_container, names)
+
+    wanted = {identifier: name_matches[identifier] if identifier in name_matches
+              else [(int(identifier), booking_partition_key())]
+              for identifier in identifiers}
+    documents = fetch_bookings_by_keys(cosmos_container, {key for keys in wanted.values() for key in keys})
+    return [(identifier, [documents[(booking_id, booking_partition_key(campground_id))]
+                          for booking_id, campground_id in wanted[identifier]
+                          if (booking_id, booking_partition_key(campground_id)) in documents])
+            for identifier in identifiers]
+
+def batch_output_rows(results):
+    """
+    Flattens batch results into one row per booking found, plus a row for each identifier with no bookings.
+
+    :param results: List of (identifier, list of booking documents) tuples.
+    :return: Generator of dictionaries keyed by BATCH_OUTPUT_FIELDS.
+    """
+    for identifier, items in results:
+        if not items:
+            yield dict(dict.fromkeys(BATCH_OUTPUT_FIELDS), query=identifier, found=False)
+        for item in items:
+            row = {field: item.get(field) for field in BATCH_OUTPUT_FIELDS}
+            row.update(query=identifier, found=True)
+            yield row
+
+def write_batch_results(results, output, output_format='jsonl'):
+    """
+    Writes batch results as JSON Lines or CSV.
+
+    :param results: List of (identifier, list of booking documents) tuples.
+    :param output: Writable text stream.
+    :param output_format: 'jsonl' or 'csv'.
+    :return: Number of rows written.
+    """
+    rows = 0
+    if output_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=BATCH_OUTPUT_FIELDS)
+        writer.writeheader()
+        for row in batch_output_rows(results):
+            if isinstance(row['campsite_allocations'], list):
+                row['campsite_allocations'] = ";".join(map(str, row['campsite_allocations']))
+            writer.writerow(row)
+            rows += 1
+    elif output_format == 'jsonl':
+        for row in batch_output_rows(results):
+            output.write(json.dumps(row, default=str) + "\n")
+            rows += 1
+    else:
+        raise ValueError(f"Unknown output format {output_format!r}, expected 'jsonl' or 'csv'")
+    return rows
+
+def run_batch(cosmos_container, source='-', output_path=None, output_format='jsonl'):
+    """
+    Looks up every identifier in a file (or stdin) and writes the bookings found.
+
+    :param cosmos_container: The Cosmos DB Bookings container.
+    :param source: Path of the identifier file, or '-' for stdin.
+    :param output_path: Path of the output file, or None for stdout.
+    :param output_format: 'jsonl' or 'csv'.
+    :return: Number of rows written.
+    """
+    if source == '-':
+        identifiers = read_identifiers(sys.stdin)
+    else:
+        with open(source) as identifier_file:
+            identifiers = read_identifiers(identifier_file)
+
+    results = retrieve_bookings_batch(cosmos_container, identifiers)
+    found = sum(1 for _, items in results if items)
+    if output_path:
+        with open(output_path, 'w', newline='') as output:
+            rows = write_batch_results(results, output, output_format)
+    else:
+        rows = write_batch_results(results, sys.stdout, output_format)
+    logger.info(f"Batch lookup: {len(identifiers)} identifiers, {found} with bookings, {rows} rows written.")
+    return rows
+
 def main():
     # Connect to the Cosmos DB container
     container_name = "Bookings"
     cosmos_container = connect_to_cosmos(container_name)
 
+    if "--rebuild-index" in sys.argv[1:]:
+        indexed = get_booking_name_index().rebuild(cosmos_container)
+        print(f"Indexed {indexed} bookings by customer name.", file=sys.stderr)
+
+    # Non-interactive mode: --batch[=FILE] [--format=jsonl|csv] [--output=FILE], identifiers read from stdin by default
+    options = dict(arg[2:].split('=', 1) if '=' in arg else (arg[2:], None) for arg in sys.argv[1:] if arg.startswith('--'))
+    if 'batch' in options:
+        run_batch(cosmos_container, options['batch'] or '-', options.get('output'), options.get('format') or 'jsonl')
+        close_cosmos_client()
+        return
+
     print("Welcome to the Booking Retrieval System!")
     while True:
         identifier = input("Enter Booking ID or Customer Name (or type 'exit' to quit): ").strip()
         if identifier.lower() == 'exit':
             print("Exiting the Booking Retrieval System.")
+            close_cosmos_client()
             break
 
         # Retrieve and display booking details
@@ -1,23 +1,36 @@
+import atexit
 import os
 import logging
 import sys
 import uuid
+from datetime import datetime, timedelta
 from flask import Flask, request, jsonify, send_from_directory, render_template, flash, redirect, url_for
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from models.booking import Booking
+from models.occupancy import OccupancyCalendar
+from models.summary import RunningSummary
 from Utils.logger_config import logger
 from Utils.Booking_Process import process_bookings
 from Utils.confirm_booking import generate_booking_confirmation
 from Utils.manage_campsite import initialize_campsites
-from Database.cosmosDB import connect_to_cosmos, fetch_cosmos_bookings, find_booking_by_id
+from Database.cosmosDB import connect_to_cosmos, fetch_cosmos_bookings_page, find_booking_by_id
+from Database.booking_cache import get_booking_cache
 from Utils.manage_summary import generate_summary_report, process_summary, create_summary_object, display_summary
 from Utils.pdf_generator import PDFGenerator
 from Database.headOfficeDB import connect_to_head_office, fetch_bookings
+from Database.sqlDB import connect_to_sql
+from Utils.booking_sync import fetch_bookings_to_sync, restore_existing_allocations, save_sync_watermark, SyncProgress, \
+    refresh_occupancy_calendar
+from resources.db_config import close_cosmos_client, close_sql_pools
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.urandom(24)
 
+# Release the shared Cosmos DB connection pool when the server shuts down
+atexit.register(close_cosmos_client)
+atexit.register(close_sql_pools)
+
 # Initialize campsites once, as this data won't change between requests
 campsites = initialize_campsites()
 logger.info(f"Initialized {len(campsites)} campsites.")
@@ -29,6 +42,14 @@ if not os.path.exists(PDF_FOLDER):
 
 processed_bookings = []
 
+# Summary figures kept up to date as bookings are processed, checkpointed so they survive restarts
+SUMMARY_CHECKPOINT = os.path.join(PDF_FOLDER, "running_summary.json")
+running_summary = RunningSummary.load(SUMMARY_CHECKPOINT)
+
+# Site by week occupancy matrix, updated after each processing run and cached for dashboards
+OCCUPANCY_CACHE = os.path.join(PDF_FOLDER, "occupancy_calendar.json")
+occupancy_calendar = OccupancyCalendar.load(OCCUPANCY_CACHE) or OccupancyCalendar.from_campsites(campsites)
+
 @app.route('/')
 def home():
     return render_template('home.html')
@@ -36,25 +57,48 @@ def home():
 # Route to process bookings from the Head Office SQL database and allocate campsites
 @app.route('/process-bookings', methods=['POST'])
 def handle_bookings():
+    global occupancy_calendar, running_summary
+    conn = None
+    stream_conn = None
+    sql_conn = None
     try:
-        # Connect to the Head Office SQL database
+        # Check out pooled connections to the Head Office SQL database: one streams the bookings, one takes the inserts
         conn = connect_to_head_office()
-        if not conn:
+        stream_conn = connect_to_head_office()
+        if not conn or not stream_conn:
             return jsonify({"error": "Failed to connect to Head Office database"}), 500
 
-        # Fetch bookings from the Head Office SQL database
-        booking_data = fetch_bookings(conn)
+        # Stream only the bookings added since the last sync, unless ?full_resync=1 is given
+        full_resync = request.args.get('full_resync', '').lower() in ('1', 'true', 'yes')
+        sql_conn = connect_to_sql()
+        if full_resync:
+            running_summary = RunningSummary()  # Every booking is processed again, so start the figures over
+        progress = SyncProgress(summary=running_summary)
+        bookings, since_booking_id, earliest_arrival = fetch_bookings_to_sync(
+            conn, sql_conn, full_resync=full_resync, progress=progress, stream_conn=stream_conn)
+        if since_booking_id is not None:
+            restore_existing_allocations(campsites, cosmos_client, earliest_arrival)
 
-        # Convert pyodbc.Row to Booking objects directly
-        bookings = [Booking.from_db_record(record) for record in booking_data]
+        # Process and allocate campsites, then advance the sync watermark
+        process_bookings(progress.track(bookings), campsites, cosmos_client, conn, 1159010, running_summary,
+                         progress=progress)  # Example campground ID
+        save_sync_watermark(sql_conn, 1, progress)
+        running_summary.save(SUMMARY_CHECKPOINT)
+        occupancy_calendar = refresh_occupancy_calendar(campsites, cosmos_client, OCCUPANCY_CACHE, full_resync) \
+            or occupancy_calendar
 
-        # Process and allocate campsites
-        process_bookings(bookings, campsites, cosmos_client, conn, 1159010)  # Example campground ID
-
-        return jsonify({"message": "Bookings processed successfully"}), 200
+        return jsonify({"message": "Bookings processed successfully", "processed": progress.fetched,
+                        "failed": len(progress.failed)}), 200
     except Exception as e:
         logger.error(f"Error processing bookings: {e}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()  # Return the connection to the pool
+        if stream_conn:
+            stream_conn.close()
+        if sql_conn:
+            sql_conn.close()
 
 # Route to generate and download booking confirmation PDF
 @app.route('/generate-confirmation/<int:booking_id>', methods=['GET'])
@@ -77,18 +121,73 @@ def generate_confirmation(booking_id):
         logger.error(f"Error generating confirmation for booking {booking_id}: {e}")
         return jsonify({"error": str(e)}), 500
 
-# Route to view all bookings stored in Cosmos DB
+# Route to report the hit/miss metrics of the booking lookup cache
+@app.route('/booking-cache', methods=['GET'])
+def booking_cache_stats():
+    return jsonify(get_booking_cache().stats()), 200
+
+# Page sizes accepted by /view-bookings
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def booking_list_row(item):
+    """
+    Converts a projected booking document into the columns shown on the bookings page.
+
+    Documents written by older versions may lack some fields (or hold malformed
+    values); those columns are left blank rather than failing the whole page.
+
+    :param item: Booking dictionary from fetch_cosmos_bookings_page.
+    :return: Dictionary keyed by the template's column names.
+    """
+    arrival_date = item.get('arrival_date')
+    departure_date = ''
+    if arrival_date:
+        try:
+            # Stays run Saturday to Saturday
+            departure = Booking.adjust_to_saturday(datetime.strptime(arrival_date, '%Y-%m-%d')) + timedelta(days=7)
+            departure_date = departure.strftime('%Y-%m-%d')
+        except (TypeError, ValueError):
+            logger.warning(f"Booking {item.get('booking_id')} has an invalid arrival date {arrival_date!r}.")
+
+    rate_per_night = ''
+    total_cost = item.get('total_cost')
+    if total_cost:
+        try:
+            rate_per_night = f"{total_cost / (7 * (item.get('num_campsites') or 1)):.2f}"
+        except TypeError:
+            logger.warning(f"Booking {item.get('booking_id')} has an invalid total cost {total_cost!r}.")
+
+    return {
+        'booking_id': item.get('booking_id', ''),
+        'customer_name': item.get('customer_name') or '',
+        'arrival_date': arrival_date or '',
+        'departure_date': departure_date,
+        'campsite_number': item.get('campsite_id') or '',
+        'rate_per_night': rate_per_night
+    }
+
+
+# Route to view the bookings stored in Cosmos DB, one page at a time:
+# /view-bookings?size=50 for the first page, then the continuation token returned with each page
 @app.route('/view-bookings', methods=['GET'])
 def view_bookings():
     try:
-        logger.info("Fetching bookings from Cosmos DB.")
+        page = max(request.args.get('page', 1, type=int), 1)
+        page_size = min(max(request.args.get('size', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        continuation = request.args.get('continuation') or None
+        logger.info(f"Fetching page {page} of bookings from Cosmos DB.")
 
-        # Fetch all bookings from Cosmos DB
-        bookings = fetch_cosmos_bookings(cosmos_client)
+        # Fetch one page of bookings from Cosmos DB
+        items, next_continuation = fetch_cosmos_bookings_page(cosmos_client, page_size, continuation)
 
-        # Convert each booking object to a dictionary for JSON response
-        booking_dicts = [booking.to_dict() for booking in bookings]
-        return render_template('view_bookings.html', bookings = booking_dicts)
+        booking_dicts = [booking_list_row(item) for item in items]
+        next_url = url_for('view_bookings', page=page + 1, size=page_size,
+                           continuation=next_continuation) if next_continuation else None
+        first_url = url_for('view_bookings', size=page_size) if page > 1 else None
+        return render_template('view_bookings.html', bookings=booking_dicts, page=page,
+                               next_url=next_url, first_url=first_url)
     except Exception as e:
         logger.error(f"Error fetching bookings: {e}")
         return jsonify({"error": str(e)}), 500
@@ -96,21 +195,22 @@ def view_bookings():
 # Route to generate and process daily summary based on bookings
 @app.route('/generate-summary', methods=['GET'])
 def daily_summary():
+    conn = None
     try:
-        # Fetch bookings from Head Office SQL database
-        conn = connect_to_head_office()
-        cosmos_conn = connect_to_cosmos('Bookings')
-        raw_bookings = fetch_bookings(conn)
-
-        # Convert raw bookings to Booking objects
-        bookings = [Booking.from_db_record(record) for record in raw_bookings]
+        if running_summary.total_bookings == 0:
+            # Nothing processed yet: fetch and process the bookings once to populate the running summary
+            conn = connect_to_head_office()
+            cosmos_conn = connect_to_cosmos('Bookings')
+            raw_bookings = fetch_bookings(conn)
+            bookings = [Booking.from_db_record(record) for record in raw_bookings]
+            process_bookings(bookings, campsites, cosmos_conn, conn, 1159010, running_summary,
+                             progress=SyncProgress(summary=running_summary))  # Example campground ID
+            running_summary.save(SUMMARY_CHECKPOINT)
 
-        if bookings:
-            # Process bookings
-            process_bookings(bookings, campsites, cosmos_conn, conn, 1159010)  # Example campground ID
-
-            # Create a summary object based on processed bookings
-            summary = create_summary_object(bookings)
+        if running_summary.total_bookings:
+            # Create a summary object from the figures kept during processing
+            summary = running_summary.to_summary(1159010)
+            summary.validate()
 
             # Process the summary (insert into DB, generate PDF, upload to Cosmos DB)
             process_summary(summary)
@@ -131,6 +231,36 @@ def daily_summary():
         logger.error(f"Error generating daily summary: {e}")
         flash(f"Error generating summary: {e}", 'danger')
         return redirect(url_for('list_summaries'))  # Redirect to the list summaries page on error
+    finally:
+        if conn:
+            conn.close()  # Return the connection to the pool
+
+
+# Route to query the occupancy calendar, e.g. /occupancy?start=2024-06-01&end=2024-09-01&size=Small&view=weekly
+@app.route('/occupancy', methods=['GET'])
+def occupancy():
+    try:
+        start_date = datetime.strptime(request.args['start'], '%Y-%m-%d')
+        end_date = datetime.strptime(request.args['end'], '%Y-%m-%d')
+    except (KeyError, ValueError):
+        return jsonify({"error": "start and end are required as YYYY-MM-DD"}), 400
+
+    try:
+        size = request.args.get('size')
+        site_number = request.args.get('site', type=int)
+        view = request.args.get('view', 'summary')
+
+        if view == 'weekly':
+            weekly = occupancy_calendar.weekly_occupancy(start_date, end_date, size)
+            return jsonify({week.strftime('%Y-%m-%d'): figures for week, figures in weekly.items()}), 200
+        if view == 'heatmap':
+            heatmap = occupancy_calendar.heatmap(start_date, end_date, size)
+            heatmap['weeks'] = [week.strftime('%Y-%m-%d') for week in heatmap['weeks']]
+            return jsonify(heatmap), 200
+        return jsonify(occupancy_calendar.occupancy(start_date, end_date, size, site_number)), 200
+    except Exception as e:
+        logger.error(f"Error querying occupancy: {e}")
+        return jsonify({"error": str(e)}), 500
 
 
 @app.route('/list-summaries', methods=['GET'])
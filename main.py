@@ -1,10 +1,17 @@
 from datetime import datetime
 import logging
+import os
+import sys
 from Database.sqlDB import connect_to_sql
 from Database.headOfficeDB import connect_to_head_office, fetch_bookings
 from Database.cosmosDB import connect_to_cosmos
+from resources.db_config import close_cosmos_client, close_sql_pools
 from models.booking import Booking
-from Utils.Booking_Process import process_bookings
+from models.summary import RunningSummary
+from Utils.Booking_Process import process_bookings, process_bookings_batch
+from Utils.booking_pipeline import process_bookings_pipelined
+from Utils.booking_sync import fetch_bookings_to_sync, restore_existing_allocations, save_sync_watermark, SyncProgress, \
+    refresh_occupancy_calendar
 from Utils.manage_campsite import initialize_campsites
 from Utils.manage_summary import *
 from Utils.logger_config import logger
@@ -16,6 +23,9 @@ logging.basicConfig(level=logging.INFO, format='%(message)s')
 logging.getLogger('azure.cosmos').setLevel(logging.WARNING)  # Suppress detailed Cosmos DB logs
 logging.getLogger('urllib3').setLevel(logging.WARNING)       # Suppress urllib3 logs
 
+# Site by week occupancy matrix updated after every run, for dashboards and capacity planning
+OCCUPANCY_CACHE = os.path.join("pdfs", "occupancy_calendar.json")
+
 
 def connect_to_databases():
     sql_conn, head_office_conn, cosmos_conn = None, None, None  # Initialize variables
@@ -59,33 +69,57 @@ def fetch_and_prepare_bookings(head_office_conn):
     return bookings
 
 
-def process_all_bookings(bookings, campsites, cosmos_conn,head_office_conn, campground_id):
+def process_all_bookings(bookings, campsites, cosmos_conn,head_office_conn, campground_id, mode='serial', summary=None,
+                         pdf_workers=None, progress=None):
     """
     Processes all bookings by allocating campsites and updating databases.
 
-    :param bookings: List of Booking objects.
+    :param bookings: Iterable of Booking objects (a list or a stream such as stream_and_prepare_bookings).
     :param campsites: List of Campsite objects.
     :param head_office_conn: Connection to the Head Office database.
     :param cosmos_conn: Connection to the Cosmos DB.
+    :param mode: 'serial' (one booking at a time), 'batch' (solve the allocation per arrival week
+                 before any side effects run) or 'pipeline' (I/O stages run concurrently).
+    :param summary: Optional RunningSummary updated as each booking is allocated.
+    :param pdf_workers: Optional number of confirmation workers: processes in serial and batch modes,
+                        threads of the confirmation stage in pipeline mode (0 uses the number of CPUs).
+    :param progress: Optional SyncProgress told whether each booking was stored.
     """
     campground_id = 1159010  # Student ID as campground ID
-    process_bookings(bookings, campsites, cosmos_conn, head_office_conn, campground_id)
+    if mode == 'batch':
+        process_bookings_batch(bookings, campsites, cosmos_conn, head_office_conn, campground_id, summary, pdf_workers,
+                               progress)
+    elif mode == 'pipeline':
+        if pdf_workers is None:
+            process_bookings_pipelined(bookings, campsites, cosmos_conn, head_office_conn, campground_id, summary=summary,
+                                       progress=progress)
+        else:
+            process_bookings_pipelined(bookings, campsites, cosmos_conn, head_office_conn, campground_id,
+                                       pdf_workers=pdf_workers or os.cpu_count() or 1, summary=summary,
+                                       progress=progress)
+    else:
+        process_bookings(bookings, campsites, cosmos_conn, head_office_conn, campground_id, summary, pdf_workers,
+                         progress)
     logger.info("Processed all bookings and allocated campsites.")
 
 
-def process_and_display_summary(bookings, campsites):
+def process_and_display_summary(campsites, running_summary=None, bookings=None):
     """
     Generates and processes the summary for the bookings and campsite utilization.
 
-    :param bookings: List of Booking objects.
     :param campsites: List of Campsite objects.
+    :param running_summary: Optional RunningSummary kept during allocation; the bookings are not needed when given.
+    :param bookings: List of Booking objects, aggregated when no running_summary is given.
     """
     try:
         # Step 1: Generate Summary Data (booking allocations and campsite utilization)
-        summary_data = generate_summary_report(bookings, campsites)
+        if running_summary is not None:
+            summary_data = running_summary.report(campsites)
+        else:
+            summary_data = generate_summary_report(bookings, campsites)
 
         # Step 2: Create the Summary object for further processing (database insertion, PDF generation)
-        summary = create_summary_object(bookings)
+        summary = create_summary_object(summary_data=summary_data)
 
         # Step 3: Process the summary, including database insertion and PDF generation
         process_summary(summary)
@@ -107,40 +141,77 @@ def close_connections(sql_conn, head_office_conn, cosmos_conn):
     if head_office_conn:
         head_office_conn.close()
         logger.info("Head Office connection closed.")
+    if cosmos_conn:
+        close_cosmos_client()
+        logger.info("Cosmos DB client closed.")
+    close_sql_pools()
 
 
 
-def main_workflow():
+def main_workflow(mode='serial', full_resync=False, pdf_workers=None):
     """
     Main workflow function that orchestrates database connections, booking processing,
     campsite initialization, summary generation, and final cleanup.
+
+    :param mode: Booking processing mode: 'serial', 'batch' or 'pipeline'.
+    :param full_resync: If True, reprocess every Head Office booking instead of only those since the last run.
+    :param pdf_workers: Optional number of confirmation workers (see process_all_bookings).
     """
     try:
         # Step 1: Connect to databases
         sql_conn, head_office_conn, cosmos_conn = connect_to_databases()
+        stream_conn = None
 
         # Step 2: Initialize campsites
         campsites = initialize_campsites()
         logger.info(f"Initialized {len(campsites)} campsites.")
 
-        # Step 3: Fetch and prepare bookings
-        bookings = fetch_and_prepare_bookings(head_office_conn)
-
-        # Step 4: Process bookings and allocate campsites
+        # Step 3: Stream the bookings not yet processed (every booking on a full resync) over a second
+        # Head Office connection, so the first stays free for the inserts while the stream is open
+        running_summary = RunningSummary()
+        progress = SyncProgress(summary=running_summary)
+        stream_conn = connect_to_head_office()
+        bookings, since_booking_id, earliest_arrival = fetch_bookings_to_sync(
+            head_office_conn, sql_conn, full_resync=full_resync, progress=progress, stream_conn=stream_conn)
+        if since_booking_id is not None:
+            # Keep the campsites allocated by earlier runs off limits for the new bookings
+            restore_existing_allocations(campsites, cosmos_conn, earliest_arrival)
+
+        # Step 4: Process bookings and allocate campsites, then advance the sync watermark
         campground_id = 1159010
-        process_all_bookings(bookings, campsites, cosmos_conn, head_office_conn, campground_id)
+        process_all_bookings(progress.track(bookings), campsites, cosmos_conn, head_office_conn, campground_id, mode,
+                             running_summary, pdf_workers, progress)
+        save_sync_watermark(sql_conn, 1, progress)
+
+        # Step 5: Generate, display, and process the summary from the figures kept during allocation
+        process_and_display_summary(campsites, running_summary)
 
-        # Step 5: Generate, display, and process the summary
-        process_and_display_summary(bookings, campsites)
+        # Step 6: Add this run's allocations to the cached occupancy calendar (rebuilt from Cosmos DB on a full resync)
+        refresh_occupancy_calendar(campsites, cosmos_conn, OCCUPANCY_CACHE, full_resync)
 
     except Exception as e:
         logger.error(f"An error occurred during the main workflow: {e}")
     finally:
-        # Step 6: Close all connections
+        # Step 7: Close all connections
+        if stream_conn:
+            stream_conn.close()
         close_connections(sql_conn, head_office_conn, cosmos_conn)
 
 
 if __name__ == '__main__':
     # Set logger to INFO level to suppress DEBUG-level messages
     logger.setLevel(logging.INFO)
-    main_workflow()
+    full_resync = '--full-resync' in sys.argv
+    # --pdf-workers=N renders confirmations on N workers (--pdf-workers alone uses every CPU)
+    pdf_workers = None
+    for arg in sys.argv:
+        if arg == '--pdf-workers':
+            pdf_workers = 0
+        elif arg.startswith('--pdf-workers='):
+            pdf_workers = int(arg.split('=', 1)[1])
+    if '--batch' in sys.argv:
+        main_workflow(mode='batch', full_resync=full_resync, pdf_workers=pdf_workers)
+    elif '--pipeline' in sys.argv:
+        main_workflow(mode='pipeline', full_resync=full_resync, pdf_workers=pdf_workers)
+    else:
+        main_workflow(full_resync=full_resync, pdf_workers=pdf_workers)
@@ -1,9 +1,14 @@
 from datetime import datetime, timedelta, date
-from models.campsite import allocate_campsite
-from Utils.logger_config import logger
+from models.campsite import allocate_campsites
+from Utils.logger_config import logger, booking_logger
 
 
 class Booking:
+    # Fixed attribute set: no per-instance __dict__, which keeps large in-memory backlogs small
+    __slots__ = ('booking_id', 'customer_id', 'booking_date', 'arrival_date', 'campsite_size', 'num_campsites',
+                 'campground_id', 'campsite_id', 'campsite_allocations', 'campsite_allocated', 'total_cost',
+                 'customer_name')
+
     def __init__(self, booking_id, customer_id, booking_date, arrival_date, campsite_size, num_campsites, campground_id=None, customer_name=None):
         """
         Initializes a Booking object with relevant details.
@@ -25,6 +30,8 @@ class Booking:
         self.num_campsites = num_campsites
         self.campground_id = campground_id
         self.campsite_id = None  # Initially set campsite_id to None until allocated
+        self.campsite_allocations = []  # Site numbers of every campsite allocated to the booking
+        self.campsite_allocated = None  # First campsite allocated, set by the allocator
         self.total_cost = 0  # Default total cost set to zero
         self.customer_name = customer_name
 
@@ -61,14 +68,16 @@ class Booking:
         """
         return self.arrival_date.date() == datetime.now().date()
 
-    def update_campsite_info(self, campsite_id, rate_per_night):
+    def update_campsite_info(self, campsite_id, rate_per_night, campsite_allocations=None):
         """
         Updates campsite information and calculates the total cost.
 
         :param campsite_id: The campsite ID allocated.
         :param rate_per_night: The nightly rate for the campsite.
+        :param campsite_allocations: Site numbers of all campsites allocated (defaults to just campsite_id).
         """
         self.campsite_id = campsite_id
+        self.campsite_allocations = list(campsite_allocations) if campsite_allocations else [campsite_id]
         self.total_cost = rate_per_night * 7 * self.num_campsites  # Calculate cost based on the 7-day booking duration
 
 
@@ -101,30 +110,32 @@ class Booking:
         days_to_saturday = (5 - start_date.weekday() + 7) % 7  # Calculate days to next Saturday
         return start_date if days_to_saturday == 0 else start_date + timedelta(days=days_to_saturday)
 
-    def allocate_campsite(self, campsites, head_office_conn, update_booking_campground_func):
+    def allocate_campsite(self, campsites, head_office_conn, update_booking_campground_func, index=None):
         """
         Attempts to allocate a campsite for the booking.
 
         :param campsites: List of available campsites.
         :param head_office_conn: Connection to the head office database.
         :param update_booking_campground_func: Function to update the campground in the database.
-        :return: Allocated campsite object or None.
+        :param index: Optional AvailabilityIndex over the campsites.
+        :return: List of allocated campsite objects (empty if the booking could not be satisfied).
         """
         # Adjust booking dates to start and end on a Saturday
         adjusted_start_date = Booking.adjust_to_saturday(self.arrival_date)
         adjusted_end_date = adjusted_start_date + timedelta(days=7)
 
-        # Attempt to allocate a campsite
-        allocated_campsite = allocate_campsite(campsites, adjusted_start_date, adjusted_end_date, self)
-        if allocated_campsite:
+        # Attempt to allocate num_campsites campsites of the requested size
+        allocated_campsites = allocate_campsites(campsites, adjusted_start_date, adjusted_end_date, self, index)
+        if allocated_campsites:
             # Update campsite info and log the successful allocation
-            self.update_campsite_info(allocated_campsite.site_number, allocated_campsite.rate_per_night)
+            site_numbers = [campsite.site_number for campsite in allocated_campsites]
+            self.update_campsite_info(site_numbers[0], allocated_campsites[0].rate_per_night, site_numbers)
             update_booking_campground_func(head_office_conn, self.booking_id, self.campground_id)
-            logger.info(f"Booking {self.booking_id} successfully allocated to Campsite {allocated_campsite.site_number}.")
+            booking_logger.info("Booking %s successfully allocated to Campsite(s) %s.", self.booking_id, site_numbers)
         else:
             # Log if no campsite is available
-            logger.warning(f"No available campsites for Booking {self.booking_id} from {adjusted_start_date} to {adjusted_end_date}.")
-        return allocated_campsite
+            booking_logger.warning("No available campsites for Booking %s from %s to %s.", self.booking_id, adjusted_start_date, adjusted_end_date)
+        return allocated_campsites
 
     @staticmethod
     def from_dict(data):
@@ -134,7 +145,7 @@ class Booking:
         :param data: Dictionary containing booking data.
         :return: Booking object.
         """
-        logger.debug(f"Converting the following dictionary into Booking object: {data}")
+        logger.debug("Converting the following dictionary into Booking object: %s", data)
 
         return Booking(
             booking_id=data['booking_id'],
@@ -145,7 +156,7 @@ class Booking:
             num_campsites=data['num_campsites'],
             campground_id=data.get('campground_id', None),
             customer_name=data.get('customer_name', None)
-        ).set_total_cost(data.get('total_cost', 0))
+        ).set_total_cost(data.get('total_cost', 0)).set_campsite_allocations(data.get('campsite_id'), data.get('campsite_allocations'))
 
     def to_dict(self):
         """Converts the Booking object to a dictionary for JSON serialization."""
@@ -158,6 +169,7 @@ class Booking:
             'num_campsites': self.num_campsites,
             'campground_id': self.campground_id,
             'campsite_id': self.campsite_id,
+            'campsite_allocations': self.campsite_allocations,
             'total_cost': self.total_cost,
             'customer_name': self.customer_name
         }
@@ -173,6 +185,21 @@ class Booking:
         self.total_cost = total_cost
         return self
 
+    def set_campsite_allocations(self, campsite_id, campsite_allocations=None):
+        """
+        Restores the allocated campsites for the booking without recalculating the cost.
+
+        :param campsite_id: The primary campsite ID allocated (None if unallocated).
+        :param campsite_allocations: Site numbers of all campsites allocated.
+        :return: Self for chaining.
+        """
+        self.campsite_id = campsite_id
+        if campsite_allocations:
+            self.campsite_allocations = list(campsite_allocations)
+        elif campsite_id is not None:
+            self.campsite_allocations = [campsite_id]
+        return self
+
 
 def create_booking_data(booking):
     """
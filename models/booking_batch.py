@@ -0,0 +1,177 @@
+from array import array
+from datetime import datetime, timedelta
+from models.booking import Booking
+from models.campsite import AvailabilityIndex
+from Utils.logger_config import logger
+
+# Compact codes for the campsite size categories
+SIZE_CODES = {'Small': 0, 'Medium': 1, 'Large': 2}
+SIZE_NAMES = {code: size for size, code in SIZE_CODES.items()}
+UNKNOWN_SIZE = -1
+
+# Marks a booking without an allocated campsite in the campsite_ids column
+UNALLOCATED = -1
+
+
+def saturday_ordinal(day_ordinal):
+    """
+    Moves a date ordinal forward to the next Saturday (same rule as Booking.adjust_to_saturday).
+
+    :param day_ordinal: Date as returned by date.toordinal().
+    :return: Ordinal of the Saturday on or after the date.
+    """
+    weekday = (day_ordinal - 1) % 7  # Ordinal 1 (0001-01-01) is a Monday
+    return day_ordinal + (5 - weekday) % 7
+
+
+class BookingBatch:
+    """
+    Column-oriented store for large numbers of bookings.
+
+    Each field lives in its own typed array: ids as integers, dates as day
+    ordinals, sizes as one-byte codes and costs as doubles. A million bookings
+    take a few tens of megabytes instead of a Booking object each, and loops
+    over a single column avoid attribute lookups entirely.
+    """
+
+    __slots__ = ('booking_ids', 'customer_ids', 'booking_dates', 'arrival_dates', 'size_codes',
+                 'num_campsites', 'campsite_ids', 'total_costs', 'extra_allocations', 'customer_names')
+
+    def __init__(self):
+        """
+        Initializes an empty batch.
+        """
+        self.booking_ids = array('q')
+        self.customer_ids = array('q')
+        self.booking_dates = array('l')  # Day ordinals
+        self.arrival_dates = array('l')  # Day ordinals
+        self.size_codes = array('b')
+        self.num_campsites = array('h')
+        self.campsite_ids = array('l')  # First allocated campsite, or UNALLOCATED
+        self.total_costs = array('d')
+        self.extra_allocations = {}  # Row -> further campsites for multi-site bookings
+        self.customer_names = []
+
+    def __len__(self):
+        return len(self.booking_ids)
+
+    def append(self, booking):
+        """
+        Adds a booking as a new row.
+
+        :param booking: The Booking object.
+        """
+        self.booking_ids.append(booking.booking_id)
+        self.customer_ids.append(booking.customer_id or 0)
+        self.booking_dates.append(booking.booking_date.toordinal())
+        self.arrival_dates.append(booking.arrival_date.toordinal())
+        self.size_codes.append(SIZE_CODES.get(booking.campsite_size, UNKNOWN_SIZE))
+        self.num_campsites.append(booking.num_campsites or 1)
+        self.campsite_ids.append(UNALLOCATED if booking.campsite_id is None else booking.campsite_id)
+        self.total_costs.append(booking.total_cost or 0)
+        self.customer_names.append(booking.customer_name)
+        if len(booking.campsite_allocations) > 1:
+            self.extra_allocations[len(self.booking_ids) - 1] = list(booking.campsite_allocations[1:])
+
+    @staticmethod
+    def from_bookings(bookings):
+        """
+        Builds a batch from an iterable of Booking objects (a list or a stream).
+
+        :param bookings: Iterable of Booking objects.
+        :return: BookingBatch object.
+        """
+        batch = BookingBatch()
+        for booking in bookings:
+            batch.append(booking)
+        logger.info(f"Built booking batch with {len(batch)} rows.")
+        return batch
+
+    def campsite_allocations(self, row):
+        """
+        Returns every campsite allocated to a row.
+
+        :param row: Row number.
+        :return: List of site numbers (empty if unallocated).
+        """
+        first = self.campsite_ids[row]
+        if first == UNALLOCATED:
+            return []
+        return [first] + self.extra_allocations.get(row, [])
+
+    def booking(self, row, campground_id=None):
+        """
+        Materializes one row as a Booking object.
+
+        :param row: Row number.
+        :param campground_id: Campground ID to set on the booking (optional).
+        :return: Booking object.
+        """
+        booking = Booking(
+            booking_id=self.booking_ids[row],
+            customer_id=self.customer_ids[row],
+            booking_date=datetime.fromordinal(self.booking_dates[row]),
+            arrival_date=datetime.fromordinal(self.arrival_dates[row]),
+            campsite_size=SIZE_NAMES.get(self.size_codes[row]),
+            num_campsites=self.num_campsites[row],
+            campground_id=campground_id,
+            customer_name=self.customer_names[row]
+        ).set_total_cost(self.total_costs[row])
+        allocations = self.campsite_allocations(row)
+        return booking.set_campsite_allocations(allocations[0] if allocations else None, allocations)
+
+    def to_bookings(self, campground_id=None):
+        """
+        Materializes every row as a Booking object.
+
+        :param campground_id: Campground ID to set on the bookings (optional).
+        :return: Generator of Booking objects.
+        """
+        return (self.booking(row, campground_id) for row in range(len(self)))
+
+    def week_start_ordinals(self):
+        """
+        Returns the Saturday each booking's stay starts on.
+
+        :return: Array of day ordinals.
+        """
+        return array('l', (saturday_ordinal(day) for day in self.arrival_dates))
+
+
+def allocate_booking_batch(batch, campsites, index=None):
+    """
+    Allocates campsites for every unallocated row of a batch, in row order, without creating Booking objects.
+
+    Each row gets num_campsites campsites of its size, all or none, exactly as allocate_campsites does.
+
+    :param batch: BookingBatch to allocate; campsite_ids and total_costs are filled in place.
+    :param campsites: List of Campsite objects.
+    :param index: Optional AvailabilityIndex built over the campsites; one is built if not supplied.
+    :return: Number of rows allocated.
+    """
+    if index is None:
+        index = AvailabilityIndex(campsites)
+
+    allocated = 0
+    stays = {}  # Week start ordinal -> (start datetime, end datetime), built once per week
+    week_starts = batch.week_start_ordinals()
+    for row in range(len(batch)):
+        if batch.campsite_ids[row] != UNALLOCATED:
+            continue
+        week_start = week_starts[row]
+        stay = stays.get(week_start)
+        if stay is None:
+            start_date = datetime.fromordinal(week_start)
+            stay = stays[week_start] = (start_date, start_date + timedelta(days=7))
+
+        num_campsites = batch.num_campsites[row]
+        candidates = index.available_campsites(stay[0], stay[1], SIZE_NAMES.get(batch.size_codes[row]), count=num_campsites)
+        if len(candidates) == num_campsites and index.reserve_all(candidates, stay[0], stay[1]):
+            batch.campsite_ids[row] = candidates[0].site_number
+            if num_campsites > 1:
+                batch.extra_allocations[row] = [campsite.site_number for campsite in candidates[1:]]
+            batch.total_costs[row] = candidates[0].rate_per_night * 7 * num_campsites
+            allocated += 1
+
+    logger.info(f"Allocated {allocated} of {len(batch)} batch rows.")
+    return allocated
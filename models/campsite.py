@@ -1,7 +1,10 @@
+import bisect
 from datetime import datetime, timedelta
-from Utils.logger_config import logger 
+from Utils.logger_config import logger, booking_logger
 
 class Campsite:
+    __slots__ = ('site_number', 'size', 'rate_per_night', 'bookings')
+
     def __init__(self, site_number, size, rate_per_night):
         """
         Initializes a Campsite object.
@@ -13,20 +16,24 @@ class Campsite:
         self.site_number = site_number
         self.size = size
         self.rate_per_night = rate_per_night
-        self.bookings = []  # List of booked periods as tuples (start_date, end_date)
+        self.bookings = []  # Booked periods as (start_date, end_date) tuples, kept sorted by start date
 
     def is_available(self, start_date, end_date):
         """
         Checks if the campsite is available for the given date range.
 
+        Booked periods never overlap and are kept sorted, so only the neighbours
+        of the insertion point need to be checked.
+
         :param start_date: Start date of the booking.
         :param end_date: End date of the booking.
         :return: True if the campsite is available, False otherwise.
         """
-        for existing_start, existing_end in self.bookings:
-            # Check if the new booking overlaps with any existing booking
-            if start_date < existing_end and end_date > existing_start:
-                return False  # Overlap detected, campsite is not available
+        position = bisect.bisect_left(self.bookings, (start_date, end_date))
+        if position > 0 and self.bookings[position - 1][1] > start_date:
+            return False  # Overlaps the booking that starts before this one
+        if position < len(self.bookings) and self.bookings[position][0] < end_date:
+            return False  # Overlaps the booking that starts at or after this one
         return True  # No overlap, campsite is available
 
     def book_campsite(self, start_date, end_date):
@@ -38,13 +45,226 @@ class Campsite:
         :return: True if booking is successful, False otherwise.
         """
         if self.is_available(start_date, end_date):
-            self.bookings.append((start_date, end_date))  # Add the full booking period
-            logger.info(f"Campsite {self.site_number} successfully booked from {start_date.date()} to {end_date.date()}.")
+            bisect.insort(self.bookings, (start_date, end_date))  # Add the full booking period in date order
+            booking_logger.info("Campsite %s successfully booked from %s to %s.", self.site_number, start_date.date(), end_date.date())
             return True
-        logger.warning(f"Campsite {self.site_number} is not available from {start_date.date()} to {end_date.date()}.")
+        booking_logger.warning("Campsite %s is not available from %s to %s.", self.site_number, start_date.date(), end_date.date())
         return False  # Booking failed because the campsite is not available
 
-def allocate_campsite(campsites, start_date, end_date, booking):
+    def cancel_booking(self, start_date, end_date):
+        """
+        Removes a booked period from the campsite.
+
+        :param start_date: Start date of the booking.
+        :param end_date: End date of the booking.
+        :return: True if the period was found and removed, False otherwise.
+        """
+        position = bisect.bisect_left(self.bookings, (start_date, end_date))
+        if position < len(self.bookings) and self.bookings[position] == (start_date, end_date):
+            del self.bookings[position]
+            booking_logger.info("Campsite %s booking from %s to %s cancelled.", self.site_number, start_date.date(), end_date.date())
+            return True
+        return False
+
+
+def _stay_days(start_date, end_date):
+    """
+    Returns the day ordinals covered by a stay (the end date is the departure day).
+
+    :param start_date: Start date of the stay.
+    :param end_date: End date of the stay.
+    :return: Range of day ordinals.
+    """
+    return range(start_date.toordinal(), end_date.toordinal())
+
+
+class CampsitePool:
+    """
+    Day-bucketed occupancy bitmap over the campsites of one size category.
+
+    Every campsite in the pool is given a bit position (its place in the pool)
+    and every booked day maps to an integer whose set bits are the occupied
+    campsites. The complement of a stay's occupancy is the pool's free-list,
+    so lookups never touch campsites of another size.
+    """
+
+    def __init__(self, size, campsites):
+        """
+        Builds the pool from the campsites and the bookings they already hold.
+
+        :param size: The size category shared by the campsites.
+        :param campsites: List of Campsite objects of that size, in allocation order.
+        """
+        self.size = size
+        self.campsites = list(campsites)
+        self.positions = {campsite.site_number: position for position, campsite in enumerate(self.campsites)}
+        self.all_sites_mask = (1 << len(self.campsites)) - 1
+        self.occupancy = {}  # Day ordinal -> bitmask of the campsites booked on that day
+
+        for campsite in self.campsites:
+            for start_date, end_date in campsite.bookings:
+                self.mark(campsite, start_date, end_date)
+
+    def mark(self, campsite, start_date, end_date):
+        """
+        Marks the campsite as occupied for the stay.
+
+        :param campsite: Campsite object belonging to this pool.
+        :param start_date: Start date of the stay.
+        :param end_date: End date of the stay.
+        """
+        bit = 1 << self.positions[campsite.site_number]
+        for day in _stay_days(start_date, end_date):
+            self.occupancy[day] = self.occupancy.get(day, 0) | bit
+
+    def unmark(self, campsite, start_date, end_date):
+        """
+        Clears the campsite's occupancy for the stay.
+
+        :param campsite: Campsite object belonging to this pool.
+        :param start_date: Start date of the stay.
+        :param end_date: End date of the stay.
+        """
+        bit = 1 << self.positions[campsite.site_number]
+        for day in _stay_days(start_date, end_date):
+            remaining = self.occupancy.get(day, 0) & ~bit
+            if remaining:
+                self.occupancy[day] = remaining
+            else:
+                self.occupancy.pop(day, None)
+
+    def free_mask(self, start_date, end_date):
+        """
+        Returns a bitmask of the campsites free for the whole stay.
+
+        :param start_date: Start date of the stay.
+        :param end_date: End date of the stay.
+        :return: Integer bitmask of free campsites.
+        """
+        occupied = 0
+        for day in _stay_days(start_date, end_date):
+            occupied |= self.occupancy.get(day, 0)
+        return self.all_sites_mask & ~occupied
+
+    def free_campsites(self, start_date, end_date, count=None):
+        """
+        Lists the campsites free for the whole stay, lowest position first.
+
+        :param start_date: Start date of the stay.
+        :param end_date: End date of the stay.
+        :param count: Optional maximum number of campsites to return.
+        :return: List of Campsite objects.
+        """
+        free = self.free_mask(start_date, end_date)
+        campsites = []
+        while free and (count is None or len(campsites) < count):
+            lowest = free & -free  # Lowest set bit is the next free campsite
+            campsites.append(self.campsites[lowest.bit_length() - 1])
+            free ^= lowest
+        return campsites
+
+
+class AvailabilityIndex:
+    """
+    Availability index over a fixed list of campsites, partitioned into one
+    CampsitePool per size category.
+
+    A Saturday-to-Saturday stay touches seven day buckets of a single pool, so
+    finding free campsites costs the same no matter how many bookings already
+    exist or how many campsites of other sizes there are.
+    """
+
+    def __init__(self, campsites):
+        """
+        Builds the per-size pools from the campsites and the bookings they already hold.
+
+        :param campsites: List of Campsite objects, in allocation order.
+        """
+        self.campsites = list(campsites)
+        self.order = {campsite.site_number: position for position, campsite in enumerate(self.campsites)}
+
+        sites_by_size = {}
+        for campsite in self.campsites:
+            sites_by_size.setdefault(campsite.size, []).append(campsite)
+        self.pools = {size: CampsitePool(size, sites) for size, sites in sites_by_size.items()}
+
+    def available_campsites(self, start_date, end_date, size=None, count=None):
+        """
+        Lists the campsites free for the whole stay, in list order.
+
+        :param start_date: Start date of the stay.
+        :param end_date: End date of the stay.
+        :param size: Optional size category the campsites must match; None searches every pool.
+        :param count: Optional maximum number of campsites to return.
+        :return: List of Campsite objects.
+        """
+        if size is not None:
+            pool = self.pools.get(size)
+            return pool.free_campsites(start_date, end_date, count) if pool else []
+
+        campsites = []
+        for pool in self.pools.values():
+            campsites.extend(pool.free_campsites(start_date, end_date, count))
+        campsites.sort(key=lambda campsite: self.order[campsite.site_number])
+        return campsites if count is None else campsites[:count]
+
+    def first_available(self, start_date, end_date, size=None):
+        """
+        Finds the first campsite (in list order) that is free for the whole stay.
+
+        :param start_date: Start date of the stay.
+        :param end_date: End date of the stay.
+        :param size: Optional size category the campsite must match.
+        :return: The Campsite object, or None if every candidate is taken.
+        """
+        campsites = self.available_campsites(start_date, end_date, size, count=1)
+        return campsites[0] if campsites else None
+
+    def reserve(self, campsite, start_date, end_date):
+        """
+        Books the campsite for the stay and records it in its pool.
+
+        :param campsite: Campsite object belonging to this index.
+        :param start_date: Start date of the stay.
+        :param end_date: End date of the stay.
+        :return: True if the campsite was booked, False otherwise.
+        """
+        if not campsite.book_campsite(start_date, end_date):
+            return False
+        self.pools[campsite.size].mark(campsite, start_date, end_date)
+        return True
+
+    def release(self, campsite, start_date, end_date):
+        """
+        Cancels the campsite's booking for the stay and clears it from its pool.
+
+        :param campsite: Campsite object belonging to this index.
+        :param start_date: Start date of the stay.
+        :param end_date: End date of the stay.
+        """
+        campsite.cancel_booking(start_date, end_date)
+        self.pools[campsite.size].unmark(campsite, start_date, end_date)
+
+    def reserve_all(self, campsites, start_date, end_date):
+        """
+        Books every campsite for the stay, or none of them.
+
+        :param campsites: List of Campsite objects belonging to this index.
+        :param start_date: Start date of the stay.
+        :param end_date: End date of the stay.
+        :return: True if all campsites were booked, False otherwise (nothing is left booked).
+        """
+        reserved = []
+        for campsite in campsites:
+            if not self.reserve(campsite, start_date, end_date):
+                for booked_campsite in reserved:
+                    self.release(booked_campsite, start_date, end_date)  # Roll back the partial reservation
+                return False
+            reserved.append(campsite)
+        return True
+
+
+def allocate_campsite(campsites, start_date, end_date, booking, index=None):
     """
     Allocates a campsite based on the availability between the start and end dates.
 
@@ -52,16 +272,53 @@ def allocate_campsite(campsites, start_date, end_date, booking):
     :param start_date: Start date of the booking.
     :param end_date: End date of the booking.
     :param booking: Booking object containing booking details.
+    :param index: Optional AvailabilityIndex built over the campsites; avoids scanning every campsite.
     :return: The allocated campsite object or None if no campsite is available.
     """
-    logger.info(f"Attempting to allocate Booking {booking.booking_id} from {start_date.date()} to {end_date.date()}...")
-    
-    for campsite in campsites:
-        if campsite.is_available(start_date, end_date):
-            # Try to book the campsite
-            if campsite.book_campsite(start_date, end_date):
-                logger.info(f"Booking {booking.booking_id} successfully allocated to Campsite {campsite.site_number} ({campsite.size}).")
-                booking.campsite_allocated = campsite.site_number  # Assign campsite to booking
-                return campsite
-    logger.warning(f"No available campsites for Booking {booking.booking_id} from {start_date.date()} to {end_date.date()}.")
+    booking_logger.info("Attempting to allocate Booking %s from %s to %s...", booking.booking_id, start_date.date(), end_date.date())
+
+    if index is not None:
+        campsite = index.first_available(start_date, end_date)
+        candidates = [campsite] if campsite is not None else []
+    else:
+        candidates = (campsite for campsite in campsites if campsite.is_available(start_date, end_date))
+
+    for campsite in candidates:
+        # Try to book the campsite
+        booked = index.reserve(campsite, start_date, end_date) if index is not None else campsite.book_campsite(start_date, end_date)
+        if booked:
+            booking_logger.info("Booking %s successfully allocated to Campsite %s (%s).", booking.booking_id, campsite.site_number, campsite.size)
+            booking.campsite_allocated = campsite.site_number  # Assign campsite to booking
+            return campsite
+    booking_logger.warning("No available campsites for Booking %s from %s to %s.", booking.booking_id, start_date.date(), end_date.date())
     return None  # Return None if no campsites are available
+
+
+def allocate_campsites(campsites, start_date, end_date, booking, index=None):
+    """
+    Allocates booking.num_campsites campsites of booking.campsite_size for the stay, all or none.
+
+    :param campsites: List of Campsite objects.
+    :param start_date: Start date of the booking.
+    :param end_date: End date of the booking.
+    :param booking: Booking object containing booking details.
+    :param index: Optional AvailabilityIndex built over the campsites; one is built if not supplied.
+    :return: List of allocated Campsite objects, or an empty list if the booking cannot be satisfied.
+    """
+    if index is None:
+        index = AvailabilityIndex(campsites)
+
+    num_campsites = booking.num_campsites or 1
+    booking_logger.info("Attempting to allocate %s %s campsite(s) for Booking %s from %s to %s...",
+                        num_campsites, booking.campsite_size, booking.booking_id, start_date.date(), end_date.date())
+
+    candidates = index.available_campsites(start_date, end_date, booking.campsite_size, count=num_campsites)
+    if len(candidates) == num_campsites and index.reserve_all(candidates, start_date, end_date):
+        site_numbers = [campsite.site_number for campsite in candidates]
+        booking_logger.info("Booking %s successfully allocated to Campsite(s) %s (%s).", booking.booking_id, site_numbers, booking.campsite_size)
+        booking.campsite_allocated = site_numbers[0]  # Assign the first campsite to the booking
+        return candidates
+
+    booking_logger.warning("Only %s of %s %s campsite(s) available for Booking %s from %s to %s.", len(candidates),
+                           num_campsites, booking.campsite_size, booking.booking_id, start_date.date(), end_date.date())
+    return []
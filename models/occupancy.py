@@ -0,0 +1,257 @@
+import json
+import os
+from datetime import datetime, date, timedelta
+from models.booking import Booking
+from Utils.logger_config import logger
+
+
+def _week_floor(day_ordinal):
+    """
+    Moves a date ordinal back to the Saturday that starts its week.
+
+    :param day_ordinal: Date as returned by date.toordinal().
+    :return: Ordinal of the Saturday on or before the date.
+    """
+    weekday = (day_ordinal - 1) % 7  # Ordinal 1 (0001-01-01) is a Monday
+    return day_ordinal - (weekday - 5) % 7
+
+
+def _count_sites(mask):
+    """
+    Counts the campsites set in a bitmask.
+
+    :param mask: Integer bitmask of campsites.
+    :return: Number of set bits.
+    """
+    return bin(mask).count("1")
+
+
+class OccupancyCalendar:
+    """
+    Site by week occupancy matrix built from campsite allocations.
+
+    Each week (starting Saturday) holds one integer whose set bits are the
+    campsites booked that week, so "how full is week W" or "how full was the
+    Small pool over a season" is answered from the matrix without rescanning
+    any bookings.
+    """
+
+    def __init__(self, sites):
+        """
+        Initializes an empty calendar.
+
+        :param sites: List of (site_number, size) tuples, in campsite order.
+        """
+        self.site_numbers = [site_number for site_number, _ in sites]
+        self.sizes = [size for _, size in sites]
+        self.positions = {site_number: position for position, site_number in enumerate(self.site_numbers)}
+        self.all_sites_mask = (1 << len(self.site_numbers)) - 1
+        self.size_masks = {}
+        for position, size in enumerate(self.sizes):
+            self.size_masks[size] = self.size_masks.get(size, 0) | (1 << position)
+        self.weeks = {}  # Week start ordinal -> bitmask of campsites booked that week
+
+    @staticmethod
+    def from_campsites(campsites):
+        """
+        Builds the calendar from the periods booked on each campsite.
+
+        :param campsites: List of Campsite objects.
+        :return: OccupancyCalendar object.
+        """
+        calendar = OccupancyCalendar([(campsite.site_number, campsite.size) for campsite in campsites])
+        calendar.mark_campsites(campsites)
+        logger.info(f"Built occupancy calendar for {len(campsites)} campsites over {len(calendar.weeks)} weeks.")
+        return calendar
+
+    @staticmethod
+    def _week_ordinals(start_date, end_date):
+        """
+        Returns the week start ordinals of every week overlapping a date range (end date exclusive).
+
+        :param start_date: Start of the range.
+        :param end_date: End of the range.
+        :return: Range of week start ordinals.
+        """
+        return range(_week_floor(start_date.toordinal()), end_date.toordinal(), 7)
+
+    def mark(self, site_number, start_date, end_date):
+        """
+        Marks a campsite as booked for every week its stay overlaps.
+
+        :param site_number: The campsite number.
+        :param start_date: Start date of the stay.
+        :param end_date: End date of the stay.
+        """
+        bit = 1 << self.positions[site_number]
+        for week in self._week_ordinals(start_date, end_date):
+            self.weeks[week] = self.weeks.get(week, 0) | bit
+
+    def mark_campsites(self, campsites):
+        """
+        Marks the periods booked on each campsite. Weeks already marked stay marked.
+
+        :param campsites: List of Campsite objects; campsites the calendar does not know are skipped.
+        """
+        for campsite in campsites:
+            if campsite.site_number not in self.positions:
+                continue
+            for start_date, end_date in campsite.bookings:
+                self.mark(campsite.site_number, start_date, end_date)
+
+    def mark_allocations(self, allocations):
+        """
+        Marks stored allocations, each for the week starting on the Saturday of its arrival.
+
+        :param allocations: List of (arrival_date, list of campsite numbers) tuples, e.g. from fetch_campsite_allocations.
+        :return: Number of campsite periods marked.
+        """
+        marked = 0
+        for arrival_date, site_numbers in allocations:
+            if isinstance(arrival_date, str):
+                arrival_date = datetime.strptime(arrival_date, '%Y-%m-%d')
+            start_date = Booking.adjust_to_saturday(arrival_date)
+            end_date = start_date + timedelta(days=7)
+            for site_number in site_numbers:
+                if site_number in self.positions:
+                    self.mark(site_number, start_date, end_date)
+                    marked += 1
+        return marked
+
+    def _sites_mask(self, size=None, site_number=None):
+        """
+        Returns the bitmask of campsites a query covers.
+
+        :param size: Optional size category.
+        :param site_number: Optional single campsite.
+        :return: Integer bitmask of campsites.
+        """
+        mask = self.all_sites_mask if size is None else self.size_masks.get(size, 0)
+        if site_number is not None:
+            position = self.positions.get(site_number)
+            mask &= 0 if position is None else 1 << position
+        return mask
+
+    def occupancy(self, start_date, end_date, size=None, site_number=None):
+        """
+        Returns how full the selected campsites are over a date range.
+
+        :param start_date: Start of the range.
+        :param end_date: End of the range (exclusive).
+        :param size: Optional size category to restrict to.
+        :param site_number: Optional single campsite to restrict to.
+        :return: Dictionary with weeks, booked and available site-weeks and the occupancy rate.
+        """
+        mask = self._sites_mask(size, site_number)
+        weeks = self._week_ordinals(start_date, end_date)
+        booked = sum(_count_sites(self.weeks.get(week, 0) & mask) for week in weeks)
+        capacity = _count_sites(mask) * len(weeks)
+        return {
+            'weeks': len(weeks),
+            'site_weeks_booked': booked,
+            'site_weeks_available': capacity - booked,
+            'occupancy_rate': booked / capacity if capacity else 0.0
+        }
+
+    def weekly_occupancy(self, start_date, end_date, size=None):
+        """
+        Returns the occupancy of each week in a date range.
+
+        :param start_date: Start of the range.
+        :param end_date: End of the range (exclusive).
+        :param size: Optional size category to restrict to.
+        :return: Dictionary of week start date -> {'booked', 'capacity', 'occupancy_rate'}.
+        """
+        mask = self._sites_mask(size)
+        capacity = _count_sites(mask)
+        weekly = {}
+        for week in self._week_ordinals(start_date, end_date):
+            booked = _count_sites(self.weeks.get(week, 0) & mask)
+            weekly[date.fromordinal(week)] = {
+                'booked': booked,
+                'capacity': capacity,
+                'occupancy_rate': booked / capacity if capacity else 0.0
+            }
+        return weekly
+
+    def heatmap(self, start_date, end_date, size=None):
+        """
+        Returns the site by week matrix for a date range, ready for a dashboard.
+
+        :param start_date: Start of the range.
+        :param end_date: End of the range (exclusive).
+        :param size: Optional size category to restrict to.
+        :return: Dictionary with the week start dates and one row of 0/1 flags per campsite.
+        """
+        weeks = list(self._week_ordinals(start_date, end_date))
+        week_masks = [self.weeks.get(week, 0) for week in weeks]
+        rows = []
+        for position, site_number in enumerate(self.site_numbers):
+            if size is not None and self.sizes[position] != size:
+                continue
+            rows.append({
+                'site_number': site_number,
+                'size': self.sizes[position],
+                'occupied': [(mask >> position) & 1 for mask in week_masks]
+            })
+        return {'weeks': [date.fromordinal(week) for week in weeks], 'sites': rows}
+
+    def to_dict(self):
+        """
+        Converts the calendar into a JSON-serializable dictionary.
+
+        :return: Dictionary containing the sites and the occupied campsites of each week.
+        """
+        return {
+            'sites': [[site_number, size] for site_number, size in zip(self.site_numbers, self.sizes)],
+            'weeks': {date.fromordinal(week).strftime('%Y-%m-%d'): [self.site_numbers[position]
+                                                                  for position in range(len(self.site_numbers))
+                                                                  if mask >> position & 1]
+                      for week, mask in sorted(self.weeks.items())}
+        }
+
+    @staticmethod
+    def from_dict(data):
+        """
+        Creates an OccupancyCalendar object from a dictionary produced by to_dict.
+
+        :param data: Dictionary containing calendar data.
+        :return: OccupancyCalendar object.
+        """
+        calendar = OccupancyCalendar([tuple(site) for site in data.get('sites', [])])
+        for week, site_numbers in data.get('weeks', {}).items():
+            mask = 0
+            for site_number in site_numbers:
+                mask |= 1 << calendar.positions[site_number]
+            calendar.weeks[datetime.strptime(week, '%Y-%m-%d').toordinal()] = mask
+        return calendar
+
+    def save(self, path):
+        """
+        Writes the calendar to a JSON cache file.
+
+        :param path: Path of the cache file.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as cache:
+            json.dump(self.to_dict(), cache)
+        os.replace(temp_path, path)
+        logger.info(f"Occupancy calendar cached to {path}.")
+
+    @staticmethod
+    def load(path):
+        """
+        Reads a calendar from a JSON cache file.
+
+        :param path: Path of the cache file.
+        :return: OccupancyCalendar object, or None if the file does not exist.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path) as cache:
+            calendar = OccupancyCalendar.from_dict(json.load(cache))
+        logger.info(f"Occupancy calendar loaded from {path} ({len(calendar.weeks)} weeks).")
+        return calendar
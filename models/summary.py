@@ -1,4 +1,8 @@
+import json
+import os
+import threading
 from datetime import datetime, date
+from models.booking_batch import saturday_ordinal
 from Utils.logger_config import logger
 
 class Summary:
@@ -93,3 +97,217 @@ class Summary:
             total_bookings=data.get('total_bookings', 0)
         )
 
+
+class RunningSummary:
+    """
+    Summary figures kept up to date while bookings are being allocated.
+
+    Each booking is recorded right after its allocation attempt, so the
+    current totals and breakdowns can be read at any point of a long run
+    without revisiting the bookings. Only the figures of bookings still in
+    flight are kept per booking_id: recording such a booking again (a booking
+    whose write is retried by a later run) replaces its earlier contribution
+    instead of counting it twice. Once a booking is settled (stored, or failed
+    for good) only the totals keep it, so memory stays flat however many
+    bookings are processed. The state can be checkpointed to a JSON file and
+    restored later.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty running summary.
+        """
+        self.total_sales = 0
+        self.total_bookings = 0
+        self.successful_allocations = 0
+        self.campsite_bookings = {}  # Campsite number -> number of bookings allocated to it
+        self.size_totals = {}  # Campsite size -> {'bookings', 'sites_booked', 'sales'}
+        self.daily = {}  # Arrival day ordinal -> {'bookings', 'sites_booked', 'sales'}
+        self.weekly = {}  # Week start ordinal -> {'bookings', 'sites_booked', 'sales'}
+        self.contributions = {}  # Unsettled booking ID -> (campsite numbers, total cost, campsite size, arrival day ordinal)
+        self.lock = threading.Lock()
+
+    def record(self, booking):
+        """
+        Adds one processed booking (allocated or not) to the running figures,
+        replacing what an earlier record of the same booking added.
+
+        :param booking: The Booking object after its allocation attempt.
+        """
+        if booking.campsite_id is None:
+            allocations = ()
+        else:
+            allocations = tuple(booking.campsite_allocations or [booking.campsite_id])
+        contribution = (allocations, booking.total_cost if allocations else 0, booking.campsite_size,
+                        booking.arrival_date.toordinal())
+
+        with self.lock:
+            previous = self.contributions.get(booking.booking_id)
+            if previous is not None:
+                self._apply(previous, -1)
+            self._apply(contribution, 1)
+            self.contributions[booking.booking_id] = contribution
+
+    def settle(self, booking_id):
+        """
+        Forgets the per-booking figures of a booking that will not be recorded again; the totals keep it.
+
+        :param booking_id: ID of the booking that was stored, or failed for good.
+        """
+        with self.lock:
+            self.contributions.pop(booking_id, None)
+
+    def _apply(self, contribution, sign):
+        """
+        Adds (sign 1) or removes (sign -1) one booking's contribution. The caller holds the lock.
+
+        :param contribution: Tuple of (campsite numbers, total cost, campsite size, arrival day ordinal).
+        :param sign: 1 to add the contribution, -1 to remove it.
+        """
+        allocations, total_cost, size, arrival = contribution
+        self.total_bookings += sign
+        if not allocations:
+            return
+        self.successful_allocations += sign
+        self.total_sales += sign * total_cost
+
+        for campsite_id in allocations:
+            self.campsite_bookings[campsite_id] = self.campsite_bookings.get(campsite_id, 0) + sign
+            if not self.campsite_bookings[campsite_id]:
+                del self.campsite_bookings[campsite_id]
+
+        for breakdown, key in ((self.size_totals, size), (self.daily, arrival), (self.weekly, saturday_ordinal(arrival))):
+            totals = breakdown.setdefault(key, {'bookings': 0, 'sites_booked': 0, 'sales': 0})
+            totals['bookings'] += sign
+            totals['sites_booked'] += sign * len(allocations)
+            totals['sales'] += sign * total_cost
+            if not totals['bookings']:
+                del breakdown[key]
+
+    def to_summary(self, campground_id, summary_date=None):
+        """
+        Creates a Summary object from the current figures.
+
+        :param campground_id: ID of the campground.
+        :param summary_date: Date of the summary (defaults to today).
+        :return: Summary object.
+        """
+        with self.lock:
+            return Summary(
+                campground_id=campground_id,
+                summary_date=summary_date or datetime.now().date(),
+                total_sales=self.total_sales,
+                total_bookings=self.successful_allocations
+            )
+
+    def report(self, campsites=()):
+        """
+        Returns the current figures in the same form as generate_summary_report.
+
+        :param campsites: List of Campsite objects to report utilization for (optional).
+        :return: Dictionary containing summary data.
+        """
+        with self.lock:
+            size_utilization = {size: dict(totals, campsites=0) for size, totals in self.size_totals.items()}
+            for campsite in campsites:
+                totals = size_utilization.setdefault(campsite.size, {'bookings': 0, 'sites_booked': 0, 'sales': 0, 'campsites': 0})
+                totals['campsites'] += 1
+            return {
+                'date': datetime.now().date(),
+                'total_sales': self.total_sales,
+                'total_bookings': self.total_bookings,
+                'successful_allocations': self.successful_allocations,
+                'failed_allocations': self.total_bookings - self.successful_allocations,
+                'campsite_utilization': {
+                    campsite.site_number: {
+                        'size': campsite.size,
+                        'rate_per_night': campsite.rate_per_night,
+                        'bookings_count': self.campsite_bookings.get(campsite.site_number, 0)
+                    }
+                    for campsite in campsites
+                },
+                'size_utilization': size_utilization,
+                'daily': {date.fromordinal(day): dict(totals) for day, totals in sorted(self.daily.items())},
+                'weekly': {date.fromordinal(week): dict(totals) for week, totals in sorted(self.weekly.items())}
+            }
+
+    def to_dict(self):
+        """
+        Converts the running summary into a JSON-serializable dictionary.
+
+        :return: Dictionary containing the running figures.
+        """
+        with self.lock:
+            return {
+                'total_sales': self.total_sales,
+                'total_bookings': self.total_bookings,
+                'successful_allocations': self.successful_allocations,
+                'campsite_bookings': {str(campsite_id): count for campsite_id, count in self.campsite_bookings.items()},
+                'size_totals': {size: dict(totals) for size, totals in self.size_totals.items() if size is not None},
+                'daily': {date.fromordinal(day).strftime('%Y-%m-%d'): dict(totals) for day, totals in self.daily.items()},
+                'weekly': {date.fromordinal(week).strftime('%Y-%m-%d'): dict(totals) for week, totals in self.weekly.items()},
+                'pending': {str(booking_id): [list(allocations), total_cost, size, date.fromordinal(arrival).strftime('%Y-%m-%d')]
+                            for booking_id, (allocations, total_cost, size, arrival) in self.contributions.items()}
+            }
+
+    @staticmethod
+    def from_dict(data):
+        """
+        Creates a RunningSummary object from a dictionary produced by to_dict.
+
+        The totals are restored as they are, together with the figures of the
+        bookings that were still unsettled. Checkpoints that kept every booking
+        under 'bookings' are replayed into the totals and treated as settled.
+
+        :param data: Dictionary containing the running figures.
+        :return: RunningSummary object.
+        """
+        running = RunningSummary()
+        if 'bookings' in data:
+            for allocations, total_cost, size, arrival in data['bookings'].values():
+                running._apply((tuple(allocations), total_cost, size, datetime.strptime(arrival, '%Y-%m-%d').toordinal()), 1)
+            return running
+
+        running.total_sales = data.get('total_sales', 0)
+        running.total_bookings = data.get('total_bookings', 0)
+        running.successful_allocations = data.get('successful_allocations', 0)
+        running.campsite_bookings = {int(campsite_id): count for campsite_id, count in data.get('campsite_bookings', {}).items()}
+        running.size_totals = {size: dict(totals) for size, totals in data.get('size_totals', {}).items()}
+        running.daily = {datetime.strptime(day, '%Y-%m-%d').toordinal(): dict(totals)
+                         for day, totals in data.get('daily', {}).items()}
+        running.weekly = {datetime.strptime(week, '%Y-%m-%d').toordinal(): dict(totals)
+                          for week, totals in data.get('weekly', {}).items()}
+        for booking_id, (allocations, total_cost, size, arrival) in data.get('pending', {}).items():
+            running.contributions[int(booking_id)] = (tuple(allocations), total_cost, size,
+                                                      datetime.strptime(arrival, '%Y-%m-%d').toordinal())
+        return running
+
+    def save(self, path):
+        """
+        Checkpoints the running summary to a JSON file.
+
+        The file is written next to its destination first and then moved into
+        place, so an interrupted save never leaves a truncated checkpoint.
+
+        :param path: Path of the checkpoint file.
+        """
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as checkpoint:
+            json.dump(self.to_dict(), checkpoint)
+        os.replace(temp_path, path)
+        logger.info(f"Running summary checkpointed to {path}.")
+
+    @staticmethod
+    def load(path):
+        """
+        Restores a running summary from a checkpoint file.
+
+        :param path: Path of the checkpoint file.
+        :return: RunningSummary object (empty if the file does not exist).
+        """
+        if not os.path.exists(path):
+            return RunningSummary()
+        with open(path) as checkpoint:
+            running = RunningSummary.from_dict(json.load(checkpoint))
+        logger.info(f"Running summary restored from {path} ({running.total_bookings} bookings).")
+        return running
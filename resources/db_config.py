@@ -1,3 +1,9 @@
+import threading
+import time
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
 from azure.cosmos import CosmosClient
 import pyodbc
 
@@ -8,15 +14,79 @@ COSMOS_URI = "https://findacampsitebookings.documents.azure.com:443/"
 COSMOS_KEY = "WA3cA5mSjNEwYoPxHJKt3LJ6XMEYvkyUcPK08kxo5eQ4qWrrjG3ItOD1v5L1fHJgsxYcaHSIoBpIACDbhCWAdA=="
 DATABASE_NAME = "CampsiteBookingsDB"
 
-def get_cosmos_client():
+# Size of the shared HTTP connection pool used by the Cosmos DB client
+COSMOS_CONNECTION_POOL_SIZE = 32
+
+# Campground managed by this deployment. Booking and PDF documents are partitioned
+# on /campground_id and use the booking_id as their item id, so a booking is one point read away.
+CAMPGROUND_ID = 1159010
+
+# Process-wide Cosmos DB client and cached container handles
+_cosmos_client = None
+_cosmos_session = None
+_cosmos_containers = {}
+_cosmos_lock = threading.Lock()
+
+def get_cosmos_client(pool_size=None):
     """
-    Establishes a connection to the Cosmos DB instance and returns a database client.
-    
+    Returns the process-wide Cosmos DB client, creating it on first use.
+
+    The client and its HTTP connection pool are reused by every caller, so account
+    metadata discovery and TLS handshakes only happen once per process.
+
+    Args:
+        pool_size (int, optional): Connection pool size used when the client is first created.
+            Defaults to COSMOS_CONNECTION_POOL_SIZE.
+
     Returns:
         CosmosClient: The client to interact with the Cosmos DB database.
     """
-    client = CosmosClient(COSMOS_URI, COSMOS_KEY)
-    return client
+    global _cosmos_client, _cosmos_session
+    with _cosmos_lock:
+        if _cosmos_client is None:
+            pool_size = pool_size or COSMOS_CONNECTION_POOL_SIZE
+            _cosmos_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _cosmos_session.mount('https://', adapter)
+            transport = RequestsTransport(session=_cosmos_session, session_owner=False)
+            _cosmos_client = CosmosClient(COSMOS_URI, COSMOS_KEY, transport=transport)
+        return _cosmos_client
+
+def get_cosmos_container(container_name, database_name=DATABASE_NAME):
+    """
+    Returns a cached container client from the shared Cosmos DB client.
+
+    Args:
+        container_name (str): Name of the container.
+        database_name (str, optional): Name of the database. Defaults to DATABASE_NAME.
+
+    Returns:
+        ContainerProxy: The container client.
+    """
+    key = (database_name, container_name)
+    container = _cosmos_containers.get(key)
+    if container is None:
+        client = get_cosmos_client()
+        container = client.get_database_client(database_name).get_container_client(container_name)
+        with _cosmos_lock:
+            container = _cosmos_containers.setdefault(key, container)
+    return container
+
+def close_cosmos_client():
+    """
+    Closes the shared Cosmos DB client and its connection pool.
+
+    The next call to get_cosmos_client() creates a fresh client.
+    """
+    global _cosmos_client, _cosmos_session
+    with _cosmos_lock:
+        if _cosmos_client is not None:
+            _cosmos_client.close()
+        if _cosmos_session is not None:
+            _cosmos_session.close()
+        _cosmos_client = None
+        _cosmos_session = None
+        _cosmos_containers.clear()
     
 
 
@@ -73,4 +143,201 @@ def get_sql_connection_local():
         'Connection Timeout=30;'
         )
     return conn
-    
+
+
+
+class PooledConnection:
+    """
+    Wrapper around a pooled pyodbc connection.
+
+    Behaves like the underlying connection, except close() hands it back to the
+    pool, and using it as a context manager commits (or rolls back on error)
+    and then returns it to the pool.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise pyodbc.ProgrammingError("Attempt to use a connection that was returned to the pool.")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._conn is not None:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        self.close()
+        return False
+
+    def close(self):
+        """Returns the connection to the pool (safe to call more than once)."""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+
+class SQLConnectionPool:
+    """
+    A bounded pool of pyodbc connections.
+
+    Idle connections are kept in last-in-first-out order so the warmest one is
+    reused first. A connection idle for longer than health_check_after is
+    checked with a trivial query before being handed out, and every one idle
+    for longer than max_idle is closed the next time a connection is checked
+    out or returned.
+    """
+
+    def __init__(self, connect, max_size=10, max_idle=300, health_check_after=30, checkout_timeout=30):
+        """
+        Initializes the pool.
+
+        Args:
+            connect (callable): Function that opens a new pyodbc connection.
+            max_size (int): Maximum number of connections open at once.
+            max_idle (float): Seconds an idle connection is kept before it is closed.
+            health_check_after (float): Seconds of idleness after which a connection is checked before reuse.
+            checkout_timeout (float): Seconds to wait for a free connection before giving up.
+        """
+        self.connect = connect
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.checkout_timeout = checkout_timeout
+        self._idle = []  # (connection, time it was returned) pairs
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    def _evict_expired(self):
+        """Closes every idle connection kept for longer than max_idle, not just the most recently returned one."""
+        cutoff = time.monotonic() - self.max_idle
+        with self._lock:
+            expired = [conn for conn, returned_at in self._idle if returned_at < cutoff]
+            if expired:
+                self._idle = [(conn, returned_at) for conn, returned_at in self._idle if returned_at >= cutoff]
+        for conn in expired:
+            self._close_quietly(conn)  # Closed outside the lock so a slow close does not block other checkouts
+
+    def acquire(self):
+        """
+        Checks out a connection, reusing an idle one when possible.
+
+        Returns:
+            PooledConnection: The connection; call close() to return it to the pool.
+
+        Raises:
+            TimeoutError: If no connection becomes free within checkout_timeout seconds.
+        """
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise TimeoutError(f"No pooled SQL connection became available within {self.checkout_timeout}s.")
+
+        try:
+            self._evict_expired()
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    conn, returned_at = self._idle.pop()
+                idle_for = time.monotonic() - returned_at
+                if idle_for > self.max_idle:
+                    self._close_quietly(conn)  # Evict connections idle for too long
+                elif idle_for > self.health_check_after and not self._is_healthy(conn):
+                    self._close_quietly(conn)  # Drop connections that fail the health check
+                else:
+                    return PooledConnection(self, conn)
+            return PooledConnection(self, self.connect())
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        """
+        Returns a connection to the pool, discarding any uncommitted work.
+
+        Args:
+            conn (pyodbc.Connection): The raw connection being returned.
+        """
+        try:
+            conn.rollback()
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        except pyodbc.Error:
+            self._close_quietly(conn)  # Broken connection, do not reuse it
+        finally:
+            self._slots.release()
+        self._evict_expired()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that checks out a connection and checks it back in afterwards.
+
+        Yields:
+            PooledConnection: The checked-out connection.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close_all(self):
+        """Closes every idle connection in the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+
+# Process-wide connection pools for the Head Office and local SQL databases
+SQL_POOL_MAX_SIZE = 10
+SQL_POOL_MAX_IDLE = 300
+
+head_office_pool = SQLConnectionPool(get_sql_connection, max_size=SQL_POOL_MAX_SIZE, max_idle=SQL_POOL_MAX_IDLE)
+local_sql_pool = SQLConnectionPool(get_sql_connection_local, max_size=SQL_POOL_MAX_SIZE, max_idle=SQL_POOL_MAX_IDLE)
+
+def close_sql_pools():
+    """
+    Closes the idle connections held by both SQL connection pools.
+    """
+    head_office_pool.close_all()
+    local_sql_pool.close_all()
+
+
+# PDF blob storage: "local" keeps PDFs under PDF_BLOB_ROOT (testing), "azure" uploads them to Azure Blob Storage
+PDF_BLOB_STORE = "local"
+PDF_BLOB_ROOT = "blobs"
+AZURE_STORAGE_CONNECTION_STRING = ""
+PDF_BLOB_CONTAINER = "booking-pdfs"
+
+# Compression applied to PDFs before they are stored ("gzip" or None)
+PDF_BLOB_COMPRESSION = "gzip"
+
+# Local SQLite index of customer names used to search bookings by name without scanning Cosmos DB
+BOOKING_NAME_INDEX_PATH = "booking_name_index.db"
+
+# In-memory read-through cache for booking lookups: maximum number of bookings kept and seconds each stays valid
+BOOKING_CACHE_SIZE = 1024
+BOOKING_CACHE_TTL = 300